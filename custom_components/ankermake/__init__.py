@@ -9,23 +9,35 @@ from __future__ import annotations
 
 import asyncio
 import datetime
-import json
+import importlib
 import logging
+import time
 from datetime import timedelta
+from typing import TYPE_CHECKING
 
-import aiohttp
-import pytz
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.const import Platform
 from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers import entity_registry as er
+from homeassistant.helpers.dispatcher import async_dispatcher_send
 from homeassistant.helpers.entity import DeviceInfo, EntityDescription
 from homeassistant.helpers.typing import ConfigType
 from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, CoordinatorEntity
+from homeassistant.util import slugify
 
-from .anker_models import AnkerException
-from .ankerctl_util import get_api_status
-from .ankermake_mqtt_adapter import AnkerData
-from .const import DOMAIN, STARTUP, UPDATE_FREQUENCY_SECONDS
+from .anker_models import AnkerException, CommandTypes
+from .const import (DOMAIN, STARTUP, ERROR_CODES_FILE, CONF_INGEST_WORKER, EVENT_UPLOAD_PROGRESS,
+                    EVENT_PRINT_STARTED, EVENT_PRINT_FINISHED, EVENT_PRINT_ERROR, TELEMETRY_DIR)
+
+if TYPE_CHECKING:
+    from .gcode_analyzer import GcodeMetadata
+    from .tuning import Tuning
+
+# Imported (in the executor) when the integration is set up, not when it is loaded (e.g. for the config flow). The
+# functions using them import them locally, which is only a lookup once they are loaded.
+RUNTIME_MODULES = ['ankerctl_util', 'ankermake_mqtt_adapter', 'anomaly', 'api_status', 'errors', 'events', 'ingest',
+                   'jobs', 'metrics', 'print_queue', 'profiler', 'services', 'subscriptions', 'telemetry',
+                   'transport', 'tuning', 'websocket_api']
 
 PLATFORMS = [
     Platform.SENSOR,
@@ -35,80 +47,412 @@ PLATFORMS = [
     Platform.IMAGE,
     Platform.BUTTON
 ]
+# Platforms with at least one entity that is enabled by default (the video quality select is disabled by default)
+DEFAULT_ENABLED_PLATFORMS = {Platform.SENSOR, Platform.BINARY_SENSOR, Platform.LIGHT, Platform.IMAGE, Platform.BUTTON}
 
 _LOGGER = logging.getLogger(__name__)
 
 
+def _import_runtime_modules():
+    for module in RUNTIME_MODULES:
+        importlib.import_module(f'.{module}', __name__)
+
+
+def _timezone(name: str) -> datetime.tzinfo:
+    """Imports pytz on first use (in the executor, with the timezone data)."""
+    import pytz
+    return pytz.timezone(name)
+
+
+@callback
+def enabled_platforms(hass: HomeAssistant, entry: ConfigEntry) -> list[Platform]:
+    """
+    The platforms to forward the entry to: those with an entity that is enabled by default (so entities added in a
+    new version are created), and the others if one of their entities is enabled or if they haven't registered their
+    entities yet (first setup). Enabling an entity reloads the entry, which forwards its platform.
+    """
+    registered, enabled = set(), set()
+    for entity in er.async_entries_for_config_entry(er.async_get(hass), entry.entry_id):
+        registered.add(entity.domain)
+        if not entity.disabled:
+            enabled.add(entity.domain)
+    return [platform for platform in PLATFORMS if platform in DEFAULT_ENABLED_PLATFORMS
+            or platform.value not in registered or platform.value in enabled]
+
+
 async def async_setup(hass: HomeAssistant, config: ConfigType) -> bool:
     """Set up integration."""
     if DOMAIN in hass.data:
         _LOGGER.info("Delete ankermake from your yaml")
+    await hass.async_add_import_executor_job(_import_runtime_modules)
+    from .errors import ERROR_REGISTRY
+    from .print_queue import DATA_PRINT_QUEUE, PrintQueue
+    from .services import async_setup_services
+    from .websocket_api import async_setup_websocket
+    try:
+        if loaded := await hass.async_add_executor_job(ERROR_REGISTRY.load, hass.config.path(ERROR_CODES_FILE)):
+            _LOGGER.info(f"[AnkerMake] Loaded {loaded} error codes from {ERROR_CODES_FILE}")
+    except (OSError, ValueError) as e:
+        _LOGGER.error(f"[AnkerMake] Failed to load {ERROR_CODES_FILE}: {e}")
+    hass.data[DATA_PRINT_QUEUE] = PrintQueue(hass)
+    await hass.data[DATA_PRINT_QUEUE].async_load()
+    await async_setup_services(hass)
+    async_setup_websocket(hass)
     return True
 
 
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Set up ankermake as config entry."""
+    from .print_queue import DATA_PRINT_QUEUE
 
     _LOGGER.info(STARTUP)
     _LOGGER.debug("Setting up entry %s: %s", entry.entry_id, entry.data)
 
-    tz = await hass.async_add_executor_job(pytz.timezone, hass.config.time_zone)
+    tz = await hass.async_add_executor_job(_timezone, hass.config.time_zone)
     coordinator = AnkerMakeUpdateCoordinator(
         hass,
         entry=entry,
         tz=tz
     )
+    await coordinator.jobs.async_load()
     await coordinator.async_config_entry_first_refresh()
 
     hass.data.setdefault(DOMAIN, {})
     hass.data[DOMAIN][entry.entry_id] = coordinator
+    hass.data[DATA_PRINT_QUEUE].add_printer(coordinator)
+
+    # Setup the platforms that have enabled entities
+    coordinator.platforms = enabled_platforms(hass, entry)
+    await hass.config_entries.async_forward_entry_setups(entry, coordinator.platforms)
+    entry.async_on_unload(entry.add_update_listener(async_update_options))
 
-    # Setup all platforms
-    await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
+    # Backfill the statistics of jobs that weren't imported yet
+    await coordinator.jobs.async_import_statistics()
 
     return True
 
 
+async def async_update_options(hass: HomeAssistant, entry: ConfigEntry):
+    """Apply the performance profile of the options flow live (switching the ingest worker reloads the entry)."""
+    from .tuning import Tuning
+    coordinator = hass.data[DOMAIN][entry.entry_id]
+    if bool(entry.options.get(CONF_INGEST_WORKER)) != (coordinator.worker is not None):
+        await hass.config_entries.async_reload(entry.entry_id)
+    else:
+        coordinator.apply_tuning(Tuning.from_options(entry.options))
+
+
+async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
+    """Unload a config entry."""
+    from .print_queue import DATA_PRINT_QUEUE
+    platforms = hass.data[DOMAIN][entry.entry_id].platforms
+    unloaded = await hass.config_entries.async_unload_platforms(entry, platforms)
+    if unloaded:
+        coordinator = hass.data[DOMAIN].pop(entry.entry_id)
+        hass.data[DATA_PRINT_QUEUE].remove_printer(entry.entry_id)
+        await coordinator.async_shutdown()
+    return unloaded
+
+
 class AnkerMakeUpdateCoordinator(DataUpdateCoordinator[None]):
     def __init__(self, hass: HomeAssistant, entry: ConfigEntry, tz: datetime.tzinfo = None):
-        super().__init__(hass, _LOGGER, name=DOMAIN, update_interval=timedelta(seconds=UPDATE_FREQUENCY_SECONDS))
+        from .anomaly import AnkerAnomalyMonitor
+        from .ankerctl_util import AnkerCtrlChannel, counting_session
+        from .ankermake_mqtt_adapter import AnkerData
+        from .api_status import ApiStatusTracker
+        from .events import AnkerEventTracker
+        from .ingest import CoalescingQueue
+        from .jobs import JobStore
+        from .metrics import AnkerMetrics
+        from .profiler import PROFILER
+        from .subscriptions import AnkerDataBroadcaster
+        from .telemetry import TelemetryRecorder
+        from .transport import create_transport
+        from .tuning import Tuning
+
+        self.tuning = Tuning.from_options(entry.options)
+        super().__init__(hass, _LOGGER, name=DOMAIN, update_interval=timedelta(seconds=self.tuning.poll_interval))
 
         self.config = entry.data
-        self.ankerdata = AnkerData(_timezone=tz)
         self.entry = entry
+        self.worker = None  # Off-loop ingestion (see worker.py)
+        if entry.options.get(CONF_INGEST_WORKER):
+            from .worker import ReplicaAnkerData
+            self.ankerdata = ReplicaAnkerData(_timezone=tz)
+        else:
+            self.ankerdata = AnkerData(_timezone=tz)
+        self.metrics = AnkerMetrics()
+        self.profiler = PROFILER  # Checked in the hot paths
+        self.events = AnkerEventTracker(self.ankerdata)
+        self.anomalies = AnkerAnomalyMonitor(self.ankerdata)
+        self.ctrl = AnkerCtrlChannel(self.config['host'], latency=self.metrics.ctrl_latency,
+                                     traffic=self.metrics.traffic['ctrl'])
+        # Kept open between status polls (and used for uploads, so their traffic is counted)
+        self.api_session = counting_session(self.metrics.traffic['api'])
+        self.upload_task: asyncio.Task | None = None
+        self.ingest = CoalescingQueue(metrics=self.metrics)
+        self.transport = create_transport(self.config, self.metrics)
+        self.add_captured_field_sensor = None  # Set by the sensor platform
+        self.platforms: list[Platform] = PLATFORMS  # Forwarded platforms (see enabled_platforms)
+        self.telemetry = TelemetryRecorder(hass.config.path(TELEMETRY_DIR, slugify(self.config['printer_name'])),
+                                           hass.async_add_executor_job)
+        self.jobs = JobStore(hass, entry.entry_id, self.config['printer_name'])
+        self.subscribers = AnkerDataBroadcaster(self.ankerdata)
+        self.api_status = ApiStatusTracker()
+        self._reconnect_delay = self.tuning.reconnect_min
+        self._reconnect_at = 0.0  # time.monotonic() at which the transport may be restarted
+        self.apply_tuning(self.tuning)
+
+        if entry.options.get(CONF_INGEST_WORKER):
+            self._start_worker(tz)
+            self._apply_messages_task = self._listen_task = None
+        else:
+            self._apply_messages_task = asyncio.create_task(self._apply_messages())
+            self._listen_task = asyncio.create_task(self._listen())
+
+    def _start_worker(self, tz: datetime.tzinfo):
+        """Run the transport and AnkerData.update in the ingest worker thread, shared by the printers using it."""
+        from .worker import DATA_INGEST_WORKER, IngestWorker, ShadowAnkerData, WorkerPrinter
+        self.worker = self.hass.data.get(DATA_INGEST_WORKER)
+        if self.worker is None:
+            self.worker = self.hass.data[DATA_INGEST_WORKER] = IngestWorker(self.hass.loop)
+        key = self.entry.entry_id
+        self.ankerdata._on_reset = lambda method: self.worker.call(key, 'mirror', method)
+        self.worker.add(WorkerPrinter(key, self.transport, ShadowAnkerData(_timezone=tz), self.metrics,
+                                      self._apply_worker_batch,
+                                      lambda: (self.tuning.reconnect_min, self.tuning.reconnect_max)))
 
-        self._listen_to_ws_task = asyncio.create_task(self._listen_to_ws())
+    @callback
+    def apply_tuning(self, tuning: Tuning):
+        """Apply a performance profile (see tuning.py)."""
+        interval_changed = tuning.poll_interval != self.tuning.poll_interval
+        self.tuning = tuning
+        self.update_interval = timedelta(seconds=tuning.poll_interval)
+        self.ankerdata._liveness_timeout = tuning.liveness_timeout
+        self.ankerdata._hotend_deadband = tuning.hotend_deadband
+        self.ankerdata._bed_deadband = tuning.bed_deadband
+        self._reconnect_delay = min(max(self._reconnect_delay, tuning.reconnect_min), tuning.reconnect_max)
+        if interval_changed:
+            # Reschedules the next poll with the new interval
+            self.hass.async_create_task(self.async_request_refresh())
+
+    async def _listen(self):
+        """Reader: queues the messages of the transport for _apply_messages."""
+        received = False
+
+        def on_message(message: dict):
+            nonlocal received
+            received = True
+            profiling = self.profiler.active
+            if profiling:
+                self.profiler.start()
+            self.metrics.count_frame(message.get("commandType"))
+            self.ingest.put(message)
+            if profiling:
+                self.profiler.stop()
 
-    async def _listen_to_ws(self):
-        def on_message(message):
-            try:
-                self.ankerdata.update(message)
-            except AnkerException:
-                _LOGGER.error(f"[AnkerMake] Error updating data (Received message: {message})")
+        try:
+            await self.transport.run(on_message)
+        except (Exception, AnkerException) as e:
+            _LOGGER.debug(f"[AnkerMake] Error connecting to the {self.transport.name} transport: {e}")
+        # Back off while the transport keeps failing, reconnect quickly after a connection that delivered messages
+        if received:
+            self._reconnect_delay = self.tuning.reconnect_min
+            self._reconnect_at = 0.0
+        else:
+            self._reconnect_at = time.monotonic() + self._reconnect_delay
+            self._reconnect_delay = min(self._reconnect_delay * 2, self.tuning.reconnect_max)
+
+    async def _apply_messages(self):
+        """Applier: applies queued messages to AnkerData (runs for the lifetime of the coordinator)."""
+        while True:
+            for message in await self.ingest.get_batch():
+                try:
+                    self._apply_message(message)
+                except Exception as e:
+                    _LOGGER.error(f"[AnkerMake] Error applying message: {e} (Received message: {message})")
+            # Give the reader (and everything else) a chance to run between batches
+            await asyncio.sleep(0)
 
-        session = aiohttp.ClientSession()
+    @callback
+    def _apply_message(self, message: dict):
+        profiling = self.profiler.active
+        if profiling:
+            self.profiler.start()
+        start = time.perf_counter()
+        if message.get("commandType") == CommandTypes.ZZ_MQTT_CMD_GCODE_COMMAND.value:
+            self.ctrl.handle_reply(message)
         try:
-            async with session.ws_connect(f"{self.config['host']}/ws/mqtt") as ws:
-                async for msg in ws:
-                    if msg.type == aiohttp.WSMsgType.TEXT:
-                        on_message(json.loads(msg.data))
-                    elif msg.type == aiohttp.WSMsgType.CLOSED:
-                        break
-                    elif msg.type == aiohttp.WSMsgType.ERROR:
-                        break
-        except Exception as e:
-            _LOGGER.debug(f"[AnkerMake] Error connecting to WS: {e}")
-        finally:
-            await session.close()
+            self.ankerdata.update(message)
+        except AnkerException:
+            _LOGGER.error(f"[AnkerMake] Error updating data (Received message: {message})")
+        self.metrics.apply_time.observe(time.perf_counter() - start)
+        self._after_update()
+        if profiling:
+            self.profiler.stop()
+
+    @callback
+    def _apply_worker_batch(self, fields: dict, accumulators: dict, replies: list):
+        """Apply the changes the ingest worker collected since its last flush (see worker.py)."""
+        for message in replies:
+            self.ctrl.handle_reply(message)
+        for name, value in accumulators.items():
+            setattr(self.ankerdata, name, value)
+        for name, value in fields.items():
+            setattr(self.ankerdata, name, value)
+        self._after_update()
+
+    @callback
+    def _after_update(self):
+        self._fire_events()
+        # A job that was stopped (instead of finished) resets the job name
+        if self.telemetry.recording and not self.ankerdata.job_name:
+            self.telemetry.finish()
+        if self.jobs.active and not self.ankerdata.job_name:
+            from .jobs import OUTCOME_CANCELLED
+            self._finish_job(OUTCOME_CANCELLED)
+        self.telemetry.sample(self.ankerdata)
+        self.jobs.sample(self.ankerdata)
+        self.subscribers.changed()
 
     async def _async_update_data(self):
+        from .ankerctl_util import get_api_status_body
+        from .api_status import SIGNAL_API_SERVICES
+        start = time.perf_counter()
         try:
-            self.ankerdata._api_status = await get_api_status(self.config['host'])
+            body = await get_api_status_body(self.config['host'], self.api_session)
+            services = self.api_status.services
+            # Only an actual change is parsed and invalidates the derived values of the status
+            if self.api_status.update(body):
+                self.ankerdata._api_status = self.api_status.data
+                if self.api_status.services != services:
+                    async_dispatcher_send(self.hass, SIGNAL_API_SERVICES.format(self.entry.entry_id))
         except AnkerException as e:
             _LOGGER.debug(f"[AnkerMake] Error updating API data: {e}")
-        # Ensure task is still running
-        if self._listen_to_ws_task.done():
-            self._listen_to_ws_task = asyncio.create_task(self._listen_to_ws())
+        except ValueError as e:
+            _LOGGER.debug(f"[AnkerMake] Invalid API data: {e}")
+        self.metrics.api_poll_latency.observe(time.perf_counter() - start)
+        self._fire_events()
+        self.subscribers.changed()
+        # Ensure task is still running (restarted once the reconnect backoff has passed)
+        if self.worker is None and self._listen_task.done() and time.monotonic() >= self._reconnect_at:
+            self.metrics.ws_reconnects += 1
+            self._listen_task = asyncio.create_task(self._listen())
+
+    @callback
+    def _fire_events(self):
+        """Fire an event on the bus for every print transition (and anomaly) since the last check."""
+        for event_type, event_data in self.events.check() + self.anomalies.check():
+            if event_type == EVENT_PRINT_STARTED:
+                self.telemetry.start(event_data['job_name'], {'printer_name': self.config['printer_name']})
+                self.jobs.start(self.ankerdata)
+            elif event_type == EVENT_PRINT_FINISHED:
+                from .jobs import OUTCOME_FINISHED
+                event_data['telemetry_path'] = self.telemetry.finish()
+                self._finish_job(OUTCOME_FINISHED)
+            elif event_type == EVENT_PRINT_ERROR:
+                self.jobs.error()
+            self.hass.bus.async_fire(event_type, {
+                'entry_id': self.entry.entry_id,
+                'printer_name': self.config['printer_name'],
+                **event_data,
+            })
+
+    @callback
+    def _finish_job(self, outcome: str):
+        """Store the summary of the running job and import it into the long-term statistics."""
+        self.jobs.finish(outcome, self.ankerdata)
+        self.hass.async_create_task(self.jobs.async_import_statistics())
+
+    def start_upload(self, path: str, start_print: bool = False):
+        """Start streaming a gcode file to ankerctl in the background (progress is reported on the event bus)."""
+        if self.upload_task and not self.upload_task.done():
+            from .ankerctl_util import AnkerUtilException
+            raise AnkerUtilException("An upload is already in progress for this printer")
+        self.upload_task = self.hass.async_create_background_task(
+            self._upload(path, start_print), name=f"{DOMAIN}_upload_{self.entry.entry_id}")
+
+    def cancel_upload(self) -> bool:
+        if self.upload_task and not self.upload_task.done():
+            self.upload_task.cancel()
+            return True
+        return False
+
+    async def _upload(self, path: str, start_print: bool):
+        from .ankerctl_util import AnkerUtilException, upload_gcode
+        last_percent = -1
+        progress = (0, 0)
+
+        def fire(state: str, sent: int = 0, total: int = 0, error: str = None):
+            self.hass.bus.async_fire(EVENT_UPLOAD_PROGRESS, {
+                'entry_id': self.entry.entry_id,
+                'printer_name': self.config['printer_name'],
+                'path': path,
+                'state': state,
+                'sent': sent,
+                'total': total,
+                'percent': int(sent * 100 / total) if total else 0,
+                'error': error,
+            })
+
+        def on_progress(sent: int, total: int):
+            nonlocal last_percent, progress
+            progress = (sent, total)
+            # Only report whole percentages, chunks are far too frequent for the event bus
+            percent = int(sent * 100 / total) if total else 100
+            if percent != last_percent:
+                last_percent = percent
+                fire('uploading', sent, total)
+
+        # Analyze the file while it is being uploaded, so the job metadata is known once the printer starts it
+        analysis = self.hass.async_create_task(self.async_analyze_gcode(path))
+
+        def discard_analysis():
+            # Retrieves the exception of an analysis that already failed, it is never awaited
+            analysis.add_done_callback(lambda task: task.cancelled() or task.exception())
+            analysis.cancel()
+
+        try:
+            await upload_gcode(self.config['host'], path, start_print, on_progress, session=self.api_session)
+        except asyncio.CancelledError:
+            discard_analysis()
+            fire('cancelled', *progress)
+            raise
+        except AnkerUtilException as e:
+            discard_analysis()
+            _LOGGER.error(f"[AnkerMake] {e}")
+            fire('failed', *progress, error=str(e))
+            return
+        fire('finished', *progress)
+        try:
+            await analysis
+        except (OSError, ValueError) as e:
+            _LOGGER.warning(f"[AnkerMake] Failed to analyze {path}: {e}")
+
+    async def async_analyze_gcode(self, path: str) -> GcodeMetadata:
+        """Analyze a gcode file in the executor and register its metadata for when the job starts."""
+        from .gcode_analyzer import analyze_gcode
+        metadata = await self.hass.async_add_executor_job(analyze_gcode, path)
+        self.ankerdata.register_job_metadata(path, metadata)
+        if self.worker is not None:
+            self.worker.call(self.entry.entry_id, 'register_job_metadata', path, metadata)
+        return metadata
+
+    async def async_shutdown(self) -> None:
+        await super().async_shutdown()
+        if self.worker is not None:
+            if self.worker.remove(self.entry.entry_id):
+                from .worker import DATA_INGEST_WORKER
+                self.hass.data.pop(DATA_INGEST_WORKER, None)
+                await self.hass.async_add_executor_job(self.worker.stop)
+        else:
+            self._listen_task.cancel()
+            self._apply_messages_task.cancel()
+        self.cancel_upload()
+        await self.ctrl.close()
+        await self.api_session.close()
+        await self.telemetry.close()
+        self.subscribers.close()
 
 
 class AnkerMakeBaseEntity(CoordinatorEntity[AnkerMakeUpdateCoordinator]):
@@ -128,8 +472,15 @@ class AnkerMakeBaseEntity(CoordinatorEntity[AnkerMakeUpdateCoordinator]):
 
     @callback
     def _handle_coordinator_update(self) -> None:
+        profiler = self.coordinator.profiler
+        profiling = profiler.active
+        if profiling:
+            profiler.start()
         super()._handle_coordinator_update()
         self._update_from_anker()
+        self.coordinator.metrics.entity_writes.mark()
+        if profiling:
+            profiler.stop()
 
     def _update_from_anker(self) -> None:
         """Update the entity. (Used by sensor.py)"""
@@ -151,5 +502,18 @@ class AnkerMakeBaseEntity(CoordinatorEntity[AnkerMakeUpdateCoordinator]):
             return self.coordinator.ankerdata.get_api_version_value(key.split('=')[1])
         elif key.startswith('%CFG='):
             return self.coordinator.config[key.split('=')[1]]
+        elif key.startswith('%METRIC='):
+            return self.coordinator.metrics.value(key.split('=')[1])
+        elif key.startswith('%LAYERS='):
+            return self.coordinator.ankerdata._layer_timings.value(key.split('=')[1])
+        elif key.startswith('%QUEUE='):
+            from .print_queue import DATA_PRINT_QUEUE
+            return self.coordinator.hass.data[DATA_PRINT_QUEUE].value(self.coordinator.entry.entry_id,
+                                                                      key.split('=')[1])
+        elif key.startswith('%ANOMALY='):
+            return self.coordinator.anomalies.value(key.split('=')[1])
+        elif key.startswith('%CAPTURE='):
+            command_type, field = key.split('=')[1].split('.', 1)
+            return self.coordinator.ankerdata._capture.value(int(command_type), field)
 
         return getattr(self.coordinator.ankerdata, key)
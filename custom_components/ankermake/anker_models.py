@@ -152,8 +152,9 @@ FILAMENT_DENSITY = {
 NOZZLE_TYPES = {
     '0': 'Standard',
 }
+FILAMENT_BROKEN_CODE = '0xFF01030001'
 ERROR_CODES = {
-    '0xFF01030001': 'Filament Broken',  # P1 The filament is broken. Please replace the filament and try again.
+    FILAMENT_BROKEN_CODE: 'Filament Broken',  # P1 The filament is broken. Please replace the filament and try again.
     '0xFF01030005': 'Failed to transfer Gcode, please try again.',  # As shown in the app.
 }
 
@@ -2,12 +2,25 @@
 A simple utility module to control the light and video quality settings on the AnkerMake printer via ankerctls mqtt websocket.
 """
 
+import asyncio
 import json
+import os
+import time
+from collections import deque
 from enum import Enum
 
 import aiohttp
 
-from .anker_models import AnkerException
+from .anker_models import AnkerException, CommandTypes
+from .metrics import ByteCounter, Histogram
+
+# Size of the chunks read from disk when uploading gcode files
+UPLOAD_CHUNK_SIZE = 256 * 1024
+# permessage-deflate window bits offered on the websockets (15 = the largest window, best compression)
+WS_COMPRESS = 15
+ACCEPT_COMPRESSED = {'Accept-Encoding': 'gzip, deflate'}
+# Seconds after which the reply to a gcode command that timed out is assumed lost
+LATE_REPLY_TIMEOUT = 60
 
 
 class AnkerUtilException(AnkerException):
@@ -19,12 +32,47 @@ class VideoQuality(Enum):
     SD = 0
 
 
+class CountingConnector(aiohttp.TCPConnector):
+    """Counts the bytes sent and received on every connection of a session (see ByteCounter)."""
+
+    def __init__(self, counter: ByteCounter, **kwargs):
+        super().__init__(**kwargs)
+        self.counter = counter
+
+    async def connect(self, req, traces, timeout):
+        connection = await super().connect(req, traces, timeout)
+        protocol, transport = connection.protocol, connection.transport
+        if protocol is not None and transport is not None and not getattr(protocol, '_anker_counted', False):
+            protocol._anker_counted = True
+            counter = self.counter
+            data_received, write = protocol.data_received, transport.write
+
+            def counting_data_received(data: bytes):
+                counter.received(len(data))
+                data_received(data)
+
+            def counting_write(data: bytes):
+                counter.sent(len(data))
+                write(data)
+
+            protocol.data_received = counting_data_received
+            transport.write = counting_write
+        return connection
+
+
+def counting_session(counter: ByteCounter = None) -> aiohttp.ClientSession:
+    """A client session that counts its traffic in counter (a plain session if no counter is given)."""
+    if counter is None:
+        return aiohttp.ClientSession()
+    return aiohttp.ClientSession(connector=CountingConnector(counter))
+
+
 async def _send_ctrl(ankerctl_ws_host: str, ctrl: str):
     url = f"{ankerctl_ws_host}/ws/ctrl"
     session = aiohttp.ClientSession()
 
     try:
-        async with session.ws_connect(url) as ws:
+        async with session.ws_connect(url, compress=WS_COMPRESS) as ws:
             await ws.send_str(ctrl)
     except Exception as e:
         raise AnkerUtilException(e)
@@ -32,6 +80,149 @@ async def _send_ctrl(ankerctl_ws_host: str, ctrl: str):
         await session.close()
 
 
+class AnkerCtrlChannel:
+    """
+    A persistent connection to ankerctl's /ws/ctrl socket.
+
+    Commands are written back to back on the same websocket (no handshake per command). The printer acknowledges gcode
+    commands with a ZZ_MQTT_CMD_GCODE_COMMAND message on the mqtt socket; these replies carry no request id, so they are
+    matched to the oldest pending command (the printer executes gcode in order), or to the command they echo (cmdData)
+    if they do. A command that times out stays in the queue as a tombstone, so its late reply is consumed instead of
+    being handed to the next command. Tombstones are dropped after LATE_REPLY_TIMEOUT (the reply is assumed lost).
+    """
+
+    def __init__(self, ankerctl_ws_host: str, max_in_flight: int = 16, latency: Histogram = None,
+                 traffic: ByteCounter = None):
+        self._url = f"{ankerctl_ws_host}/ws/ctrl"
+        self._session: aiohttp.ClientSession | None = None
+        self._ws: aiohttp.ClientWebSocketResponse | None = None
+        self._reader: asyncio.Task | None = None
+        self._traffic = traffic
+        self._lock = asyncio.Lock()
+        self._window = asyncio.Semaphore(max_in_flight)
+        self._pending: deque[tuple[float, str, asyncio.Future]] = deque()  # (sent at, gcode, future)
+
+        self.latency = latency or Histogram()
+        self.timeouts = 0
+
+    async def _connect(self) -> aiohttp.ClientWebSocketResponse:
+        if self._ws is not None and not self._ws.closed:
+            return self._ws
+        if self._session is None or self._session.closed:
+            self._session = counting_session(self._traffic)
+        self._ws = await self._session.ws_connect(self._url, heartbeat=30, compress=WS_COMPRESS)
+        # Reading also processes the heartbeat pongs, without it the connection is dropped after the first heartbeat
+        self._reader = asyncio.create_task(self._read(self._ws))
+        return self._ws
+
+    async def _read(self, ws: aiohttp.ClientWebSocketResponse):
+        async for _ in ws:
+            pass
+
+    async def send(self, ctrl: str):
+        """Send a raw control message, (re)connecting if needed."""
+        async with self._lock:
+            try:
+                ws = await self._connect()
+                await ws.send_str(ctrl)
+            except Exception as e:
+                await self.close()
+                raise AnkerUtilException(e)
+
+    async def set_light(self, on: bool):
+        try:
+            await self.send(json.dumps({'light': on}))
+        except AnkerUtilException as e:
+            raise AnkerUtilException(f"Failed to turn {['off', 'on'][on]} light: {e}")
+
+    async def set_video_quality(self, quality: VideoQuality):
+        try:
+            await self.send(json.dumps({'quality': quality.value}))
+        except AnkerUtilException as e:
+            raise AnkerUtilException(f"Failed to set video quality: {e}")
+
+    async def send_gcode(self, lines: list[str], timeout: float = 10) -> list[dict]:
+        """
+        Pipeline a batch of gcode lines and wait for their replies.
+
+        At most max_in_flight commands are awaiting a reply at any time. The timeout of a command starts when it is
+        sent, a command that times out frees its slot in the window. Returns one result per line, in order:
+        {'gcode': str, 'reply': dict | None, 'latency': float | None, 'error': str | None}
+        """
+        loop = asyncio.get_running_loop()
+        sent = []
+        for line in lines:
+            await self._window.acquire()
+            future = loop.create_future()
+            timer = loop.call_later(timeout, self._expire, future)
+            future.add_done_callback(lambda _, timer=timer: (timer.cancel(), self._window.release()))
+            entry = (time.monotonic(), line, future)
+            self._pending.append(entry)
+            cmd = {'commandType': CommandTypes.ZZ_MQTT_CMD_GCODE_COMMAND.value, 'cmdData': line, 'cmdLen': len(line)}
+            try:
+                await self.send(json.dumps(cmd))
+            except AnkerUtilException as e:
+                self._pending.remove(entry)
+                future.cancel()
+                # Fail the lines that never made it to the printer, keep waiting for those that did
+                return await self._collect(sent) + [
+                    {'gcode': line, 'reply': None, 'latency': None, 'error': f"Failed to send gcode: {e}"}
+                    for line in lines[len(sent):]]
+            sent.append((line, entry))
+        return await self._collect(sent)
+
+    def _expire(self, future: asyncio.Future):
+        if not future.done():
+            self.timeouts += 1
+            future.set_exception(asyncio.TimeoutError())
+
+    async def _collect(self, sent: list) -> list[dict]:
+        results = []
+        for line, entry in sent:
+            future = entry[2]
+            result = {'gcode': line, 'reply': None, 'latency': None, 'error': None}
+            try:
+                result['reply'] = await future
+                result['latency'] = round(result['reply'].pop('_latency'), 4)
+            except asyncio.TimeoutError:
+                # Left in the queue as a tombstone for its late reply
+                result['error'] = "Timed out waiting for reply"
+            results.append(result)
+        return results
+
+    def handle_reply(self, message: dict):
+        """Match a ZZ_MQTT_CMD_GCODE_COMMAND reply to the command it echoes, or else the oldest pending command."""
+        now = time.monotonic()
+        # Drop the tombstones whose reply is assumed lost (they're the oldest entries)
+        while self._pending and self._pending[0][2].done() and now - self._pending[0][0] > LATE_REPLY_TIMEOUT:
+            self._pending.popleft()
+        echoed = message.get('cmdData')
+        for entry in self._pending:
+            if echoed is None or entry[1] == echoed:
+                break
+        else:
+            return
+        self._pending.remove(entry)
+        sent_at, _, future = entry
+        if future.done():
+            # The reply to a command that timed out
+            return
+        latency = now - sent_at
+        self.latency.observe(latency)
+        future.set_result({**message, '_latency': latency})
+
+    async def close(self):
+        if self._reader is not None:
+            self._reader.cancel()
+            self._reader = None
+        if self._ws is not None:
+            await self._ws.close()
+            self._ws = None
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
 async def turn_on_light(ankerctl_ws_host: str):
     cmd = {'light': True}
     try:
@@ -74,17 +265,94 @@ async def reload_ankerctl(host: str):
         raise AnkerUtilException(f"Failed to reload ankerctl: {e}")
 
 
-async def get_api_status(host: str):
-    """Gets the status of the ankerctl api."""
+async def get_api_status(host: str, session: aiohttp.ClientSession = None) -> dict:
+    """
+    Gets the status of the ankerctl api.
+
+    Pass a (long-lived) session to keep the connection open between polls, otherwise a new one is made for every call.
+    """
+    body = await get_api_status_body(host, session)
+    try:
+        return json.loads(body)
+    except ValueError as e:
+        raise AnkerUtilException(f"Failed to get api status: {e}")
+
+
+async def get_api_status_body(host: str, session: aiohttp.ClientSession = None) -> bytes:
+    """Gets the (unparsed) status of the ankerctl api, see api_status.py."""
     url = host.replace("ws://", "http://").replace("wss://", "https://")
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(f"{url}/api/ankerctl/status") as response:
-                # TODO: Temporary if on the main branch of ankerctl
-                if response.status == 404:
-                    raise AnkerUtilException("Ankerctl API not found (not present in ankerctl yet)")
-                if response.status != 200:
-                    raise AnkerUtilException(f"Failed to get api status: {response.status}")
-                return await response.json()
+        if session is None:
+            async with aiohttp.ClientSession() as session:
+                return await _get_api_status(session, url)
+        return await _get_api_status(session, url)
     except Exception as e:
         raise AnkerUtilException(f"Failed to get api status: {e}")
+
+
+async def _get_api_status(session: aiohttp.ClientSession, url: str) -> bytes:
+    async with session.get(f"{url}/api/ankerctl/status", headers=ACCEPT_COMPRESSED) as response:
+        # TODO: Temporary if on the main branch of ankerctl
+        if response.status == 404:
+            raise AnkerUtilException("Ankerctl API not found (not present in ankerctl yet)")
+        if response.status != 200:
+            raise AnkerUtilException(f"Failed to get api status: {response.status}")
+        return await response.read()
+
+
+class _SizedFilePayload(aiohttp.AsyncIterablePayload):
+    """An async iterable payload with a known size (so the upload gets a Content-Length instead of being chunked)."""
+
+    def __init__(self, value, size: int, **kwargs):
+        super().__init__(value, **kwargs)
+        self._size = size
+
+
+async def upload_gcode(host: str, path: str, start_print: bool = False, on_progress=None,
+                       chunk_size: int = UPLOAD_CHUNK_SIZE, session: aiohttp.ClientSession = None):
+    """
+    Streams a gcode file to ankerctl's file transfer endpoint (/api/files/local).
+
+    The file is read in chunks in the executor, so it is never held in memory as a whole.
+    on_progress(sent_bytes, total_bytes) is called after every chunk. Cancel the awaiting task to abort the upload.
+    Pass a (long-lived, e.g. counting) session to reuse it, otherwise a new one is made for the upload.
+    """
+    url = host.replace("ws://", "http://").replace("wss://", "https://")
+    loop = asyncio.get_running_loop()
+    try:
+        size = await loop.run_in_executor(None, os.path.getsize, path)
+    except OSError as e:
+        raise AnkerUtilException(f"Failed to upload gcode: {e}")
+
+    async def read_chunks():
+        file = await loop.run_in_executor(None, open, path, 'rb')
+        sent = 0
+        try:
+            while chunk := await loop.run_in_executor(None, file.read, chunk_size):
+                yield chunk
+                sent += len(chunk)
+                if on_progress:
+                    on_progress(sent, size)
+        finally:
+            await loop.run_in_executor(None, file.close)
+
+    with aiohttp.MultipartWriter('form-data') as form:
+        form.append(str(start_print).lower()).set_content_disposition('form-data', name='print')
+        payload = _SizedFilePayload(read_chunks(), size)
+        payload.set_content_disposition('form-data', name='file', filename=os.path.basename(path))
+        form.append_payload(payload)
+
+        try:
+            if session is None:
+                async with aiohttp.ClientSession() as session:
+                    await _post_upload(session, url, form)
+            else:
+                await _post_upload(session, url, form)
+        except Exception as e:
+            raise AnkerUtilException(f"Failed to upload gcode: {e}")
+
+
+async def _post_upload(session: aiohttp.ClientSession, url: str, form: aiohttp.MultipartWriter):
+    async with session.post(f"{url}/api/files/local", data=form) as response:
+        if response.status != 200:
+            raise AnkerUtilException(f"Failed to upload gcode: {response.status}")
@@ -4,42 +4,70 @@ This module is responsible for handling the MQTT messages from the AnkerMake pri
 
 In other words, this module is the "brain" of the AnkerMake integration.
 """
+from __future__ import annotations
+
 import os
 import re
-from dataclasses import dataclass
+from collections import Counter
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta
 from logging import getLogger
+from typing import TYPE_CHECKING
 
 from .anker_models import (CommandTypes,
                            FilamentType,
                            FILAMENT_WEIGHT_175,
                            FILAMENT_DENSITY,
-                           AnkerUnhandledCommandException,
                            AnkerStatus,
                            NOZZLE_TYPES,
-                           ERROR_CODES)
+                           ERROR_LEVELS)
+from .capture import CommandCapture
+from .derived import DerivedValues, derived
+from .errors import ERROR_REGISTRY, ErrorInfo, parse_ext
+from .layers import LayerTimings
+
+if TYPE_CHECKING:
+    from .gcode_analyzer import GcodeMetadata
 
 _LOGGER = getLogger(__name__)
 if os.environ.get("ANKERMAKE_DEBUG", False):
     _LOGGER.setLevel("DEBUG")
 
 RESET_STATES = [AnkerStatus.OFFLINE, AnkerStatus.IDLE]
+JOB_METADATA_SIZE = 32
+
+
+def job_key(name: str) -> str:
+    """Normalizes a job/file name, so uploaded files can be matched with the job name reported by the printer."""
+    name = os.path.basename(name or "").lower()
+    return name[:-len(".gcode")] if name.endswith(".gcode") else name
 
 
 @dataclass
-class AnkerData:
+class AnkerData(DerivedValues):
+    _derived_cache: dict = field(default_factory=dict, repr=False, compare=False)  # See derived.py
     _timezone: datetime.tzinfo = None  # Defined in __init__.py
     _api_status: dict = None  # Updated via __init__.py
+    _job_metadata: dict[str, GcodeMetadata] = field(default_factory=dict)  # Pre-analyzed gcode files by job_key
+    _capture: CommandCapture = field(default_factory=CommandCapture)  # Unhandled command types
+    _layer_timings: LayerTimings = field(default_factory=LayerTimings)  # Start time of every layer of the job
+    _error_counts: Counter = field(default_factory=Counter)  # Occurrences of every error code (see errors.py)
 
     _last_heartbeat: datetime = None
+    # Performance profile (see tuning.py)
+    _liveness_timeout: float = 30  # Seconds without a message before the printer is offline
+    _hotend_deadband: float = 5  # °C below the target that count as heating up
+    _bed_deadband: float = 2
     _status: AnkerStatus = AnkerStatus.OFFLINE
     _old_status: AnkerStatus = None
     _old_job_name: str = ""
     job_name: str = ""
     image: str = ""
+    thumbnail: bytes = None  # Embedded gcode thumbnail (if the file was analyzed before the job started)
 
     paused: bool = False
 
+    error_code: str = ""
     error_message: str = ""
     error_level: str = ""
     error_ext: str = ""
@@ -48,6 +76,7 @@ class AnkerData:
     elapsed_time: int = 0
     remaining_time: int = 0
     total_time: int = 0
+    slicer_estimated_time: int = 0
 
     fan_speed: int = 0
 
@@ -99,14 +128,14 @@ class AnkerData:
     def online(self) -> bool:
         """Returns True if the printer is online."""
         # TODO: Make this less taxing on the system (checks n(entities) times per update cycle)
-        return self._last_heartbeat > datetime.now(tz=self._timezone) - timedelta(seconds=30)
+        return self._last_heartbeat > datetime.now(tz=self._timezone) - timedelta(seconds=self._liveness_timeout)
 
-    @property
+    @derived('job_name', 'progress')
     def printing(self) -> bool:
         """Returns True if the printer is currently printing."""
         return self.job_name != "" or self.progress
 
-    @property
+    @derived('filament', 'filament_used')
     def filament_weight(self) -> float:
         """Returns the weight of the filament used in grams."""
         # PLA is the default filament type (if the filament type is unknown)
@@ -114,7 +143,7 @@ class AnkerData:
                                                FILAMENT_WEIGHT_175.get(FilamentType.PLA.value))) * self.filament_used
         return round(weight, 2)
 
-    @property
+    @derived('filament_weight')
     def filament_density(self) -> float:
         """Returns the density of the filament in g/cm^3."""
         density = self.filament_weight / FILAMENT_DENSITY.get(self.filament,
@@ -153,8 +182,8 @@ class AnkerData:
         status = AnkerStatus.PRINTING
 
         # Check if the printer is heating up
-        is_heating_hotend = self.target_hotend_temp - 5 > self.hotend_temp > 30
-        is_heating_bed = self.target_bed_temp - 2 > self.bed_temp > 30
+        is_heating_hotend = self.target_hotend_temp - self._hotend_deadband > self.hotend_temp > 30
+        is_heating_bed = self.target_bed_temp - self._bed_deadband > self.bed_temp > 30
 
         if not self.online:
             status = AnkerStatus.OFFLINE
@@ -194,23 +223,77 @@ class AnkerData:
         self.print_start_time = datetime.now(tz=self._timezone) - timedelta(seconds=self.elapsed_time)
         self._update_target_time()
         self._update_filament()
+        self._apply_job_metadata()
+
+    def register_job_metadata(self, name: str, metadata: GcodeMetadata):
+        """Register pre-analyzed metadata for a gcode file, applied when a job with the same name starts."""
+        self._job_metadata[job_key(name)] = metadata
+        while len(self._job_metadata) > JOB_METADATA_SIZE:
+            del self._job_metadata[next(iter(self._job_metadata))]
+        # The job might already be running (analyzed after the upload started the print)
+        if self.job_name and job_key(self.job_name) == job_key(name):
+            self._apply_job_metadata()
+
+    def _apply_job_metadata(self):
+        """Pre-fill values the printer doesn't report (or reports late) from the analyzed gcode file."""
+        metadata = self._job_metadata.get(job_key(self.job_name))
+        if metadata is None:
+            # Don't keep the values of the previous job
+            self.slicer_estimated_time = 0
+            self.thumbnail = None
+            return
+        if metadata.filament != FilamentType.UNKNOWN.value:
+            self.filament = metadata.filament
+        if metadata.layer_count and not self.total_layers:
+            self.total_layers = metadata.layer_count
+        self.slicer_estimated_time = metadata.estimated_time
+        self.thumbnail = metadata.thumbnail
 
     def _new_job_handler(self):
         """Handler for new print jobs"""
         if self.job_name != self._old_job_name:
             self._new_print_job()
 
-    @property
+    @derived('error_message')
     def in_error_state(self) -> bool:
         """Returns True if the printer has an error."""
         return self.error_message != ""
 
+    @derived('error_code')
+    def error_info(self) -> ErrorInfo | None:
+        """Returns the decoded error code (see errors.py)."""
+        return ERROR_REGISTRY.lookup(self.error_code) if self.error_code else None
+
+    @derived('error_info')
+    def error_subsystem(self) -> int | None:
+        return self.error_info.subsystem if self.error_info else None
+
+    @derived('error_info')
+    def error_category(self) -> int | None:
+        return self.error_info.category if self.error_info else None
+
+    @derived('error_level')
+    def error_severity(self) -> str | None:
+        return ERROR_LEVELS.get(self.error_level)
+
+    @derived('error_ext')
+    def error_details(self) -> dict:
+        """Returns the ext payload of the error as a dict (parsed when it is first read)."""
+        return parse_ext(self.error_ext)
+
+    @derived('error_code', '_error_counts')
+    def error_occurrences(self) -> int:
+        """Returns how often the current error occurred (since Home Assistant started)."""
+        return self._error_counts[self.error_info.code] if self.error_code else 0
+
     def _remove_error(self):
         """Removes the error from the AnkerData object, allowing the status to change."""
+        self.error_code = ""
         self.error_message = ""
         self.error_level = ""
+        self.error_ext = ""
 
-    @property
+    @derived('_api_status')
     def api_service_possible_states(self) -> list:
         return list(self._api_status.get('possible_states', {}).keys()) + ['Unavailable']
 
@@ -263,6 +346,7 @@ class AnkerData:
             case CommandTypes.ZZ_MQTT_CMD_MODEL_LAYER.value:
                 self.current_layer = websocket_message.get("real_print_layer")
                 self.total_layers = websocket_message.get("total_layer")
+                self._layer_timings.record(self.current_layer, self.job_name)
 
             # Nozzle temp gets broadcast with fixed intervals (every 5 seconds or so)
             case CommandTypes.ZZ_MQTT_CMD_NOZZLE_TEMP.value:
@@ -317,15 +401,21 @@ class AnkerData:
 
             # Errors (?)
             case CommandTypes.TEMP_ERROR_CODE.value:
+                info = ERROR_REGISTRY.lookup(websocket_message.get("errorCode"))
+                # The printer repeats the error until it is resolved, only count it once
+                if info.code != self.error_code:
+                    # Replaced (not changed in place), so error_occurrences is recomputed
+                    error_counts = self._error_counts.copy()
+                    error_counts[info.code] += 1
+                    self._error_counts = error_counts
+                    if not info.known and error_counts[info.code] == 1:
+                        _LOGGER.error(
+                            f"Unknown error occured: {info.code}. Please open a github issue with a description of what you were doing when this error occurred, and please look in the AnkerMake app for a proper error message. Include this: (Received message: {websocket_message})")
+                self.error_code = info.code
                 self.error_level = websocket_message.get("errorLevel")
-                self.error_message = ERROR_CODES.get(websocket_message.get("errorCode"),
-                                                     websocket_message.get("errorCode"))
-                if self.error_message not in ERROR_CODES.values():
-                    _LOGGER.error(
-                        f"Unknown error occured: {self.error_message}. Please open a github issue with a description of what you were doing when this error occurred, and please look in the AnkerMake app for a proper error message. Include this: (Received message: {websocket_message})")
+                self.error_message = info.message
+                self.error_ext = websocket_message.get("ext") or ""
 
-            # If the command_type is not handled, raise an exception (unless we know it's not used)
+            # Capture unhandled command types (unknown or not used) for the diagnostics and on-demand sensors
             case _:
-                if command_type not in CommandTypes:
-                    _LOGGER.error(f"Unknown command_type: {command_type} ({websocket_message})")
-                    raise AnkerUnhandledCommandException(f"Unknown command_type: {command_type} ({websocket_message})")
+                self._capture.capture(command_type, websocket_message)
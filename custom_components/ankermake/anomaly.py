@@ -0,0 +1,240 @@
+"""
+Online anomaly detection for thermal faults and stalled prints.
+
+Every printer has one AnkerAnomalyMonitor, checked by the coordinator together with the event tracker (after every
+applied message and on every poll). The statistics are streaming and O(1) in memory: a time weighted EWMA of each
+temperature, an exponentially weighted least squares slope (°C/s) and Welford's variance of the deviation from the
+target while printing. The detectors:
+
+- heating_failed: a heater has been below its target for longer than HEATING_TIMEOUT and is no longer heating up
+- temperature_drop: a heater falls below its target during a print (by more than DROP_MARGIN, or 4 sigma of its usual
+  deviation if that is larger)
+- thermal_overshoot: a heater is above its target by more than OVERSHOOT_MARGIN, once it got down to the target since
+  the target last changed (lowering the target while the heater is hot isn't an overshoot)
+- print_stalled: the status is Printing but neither the progress nor the layer advanced for STALL_TIMEOUT (or three
+  times the 95th percentile layer time, if that is longer)
+
+Each detector is a binary sensor (see ANOMALY_BINARY_SENSOR_DESCRIPTIONS), and fires an ankermake_anomaly event when
+it becomes active and when it clears.
+"""
+
+import math
+import time
+
+from .anker_models import AnkerStatus
+from .ankermake_mqtt_adapter import AnkerData
+from .const import EVENT_ANOMALY
+
+HEATERS = ('hotend', 'bed')
+TEMP_TAU = 20  # Seconds, time constant of the temperature EWMA
+SLOPE_TAU = 30  # Seconds, time constant of the slope regression
+MIN_SAMPLE_INTERVAL = 1  # Seconds between samples (messages arrive in bursts)
+REACHED_MARGIN = {'hotend': 5, 'bed': 2}  # °C below the target that counts as reached (the default deadbands)
+HEATING_TIMEOUT = {'hotend': 300, 'bed': 900}  # Seconds
+MIN_HEATING_RATE = 0.02  # °C/s
+DROP_MARGIN = {'hotend': 15, 'bed': 8}  # °C
+OVERSHOOT_MARGIN = {'hotend': 15, 'bed': 10}  # °C
+STALL_TIMEOUT = 600  # Seconds
+DETECTORS = ('heating_failed', 'temperature_drop', 'thermal_overshoot', 'print_stalled')
+
+
+class Ewma:
+    """Exponentially weighted moving average of irregularly sampled values (weights decay with time)."""
+    __slots__ = ('tau', 'value', 'time')
+
+    def __init__(self, tau: float):
+        self.tau = tau
+        self.value = None
+        self.time = 0.0
+
+    def add(self, x: float, now: float) -> float:
+        if self.value is None:
+            self.value = x
+        else:
+            alpha = 1 - math.exp(-(now - self.time) / self.tau)
+            self.value += alpha * (x - self.value)
+        self.time = now
+        return self.value
+
+
+class Welford:
+    """Running mean and variance (Welford's algorithm)."""
+    __slots__ = ('count', 'mean', 'm2')
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def add(self, x: float):
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (x - self.mean)
+
+    @property
+    def stdev(self) -> float:
+        return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else 0.0
+
+
+class EwSlope:
+    """
+    Slope of a least squares line through the samples, weighted by exp(-age / tau).
+
+    The weighted sums are kept relative to the latest sample, so they are shifted and decayed on every sample.
+    """
+    __slots__ = ('tau', 'time', 's0', 's1', 's2', 'sx', 'stx')
+
+    def __init__(self, tau: float):
+        self.tau = tau
+        self.time = None
+        self.s0 = self.s1 = self.s2 = self.sx = self.stx = 0.0
+
+    def add(self, x: float, now: float):
+        if self.time is not None:
+            dt = now - self.time
+            decay = math.exp(-dt / self.tau)
+            # Shift the time origin to now, then decay
+            self.s2 = (self.s2 - 2 * dt * self.s1 + dt * dt * self.s0) * decay
+            self.stx = (self.stx - dt * self.sx) * decay
+            self.s1 = (self.s1 - dt * self.s0) * decay
+            self.s0 *= decay
+            self.sx *= decay
+        self.time = now
+        self.s0 += 1
+        self.sx += x
+
+    @property
+    def slope(self) -> float | None:
+        denominator = self.s0 * self.s2 - self.s1 * self.s1
+        if self.s0 < 3 or denominator < 1e-9:
+            return None
+        return (self.s0 * self.stx - self.s1 * self.sx) / denominator
+
+
+class HeaterState:
+    def __init__(self, name: str):
+        self.name = name
+        self.temp = Ewma(TEMP_TAU)
+        self.slope = EwSlope(SLOPE_TAU)
+        self.deviation = Welford()
+        self.target = 0.0
+        self.target_since = 0.0
+        self.reached = False
+        self.settled = False  # At or below the target since it changed
+        self.last_sample = -MIN_SAMPLE_INTERVAL
+
+    def update(self, temp: float, target: float, printing: bool, now: float):
+        if target != self.target:
+            self.target = target
+            self.target_since = now
+            self.reached = False
+            self.settled = False
+            self.deviation = Welford()
+        if now - self.last_sample < MIN_SAMPLE_INTERVAL:
+            return
+        self.last_sample = now
+        self.temp.add(temp, now)
+        self.slope.add(temp, now)
+        if target and temp >= target - REACHED_MARGIN[self.name]:
+            self.reached = True
+        if self.temp.value <= target + REACHED_MARGIN[self.name]:
+            self.settled = True
+        # The usual deviation while printing (a drop must not widen its own margin)
+        if printing and self.reached and abs(temp - target) < DROP_MARGIN[self.name]:
+            self.deviation.add(temp - target)
+
+    def details(self) -> dict:
+        slope = self.slope.slope
+        return {
+            'heater': self.name,
+            'temperature': round(self.temp.value, 1) if self.temp.value is not None else None,
+            'target': self.target,
+            'rate': round(slope * 60, 2) if slope is not None else None,  # °C/min
+        }
+
+
+class AnkerAnomalyMonitor:
+    def __init__(self, ankerdata: AnkerData):
+        self.ankerdata = ankerdata
+        self.heaters = {name: HeaterState(name) for name in HEATERS}
+        self.active: dict[str, dict | None] = {name: None for name in DETECTORS}  # Details of the active anomalies
+        self._progress = None
+        self._progress_since = 0.0
+
+    def is_active(self, detector: str) -> bool:
+        return self.active[detector] is not None
+
+    def value(self, key: str):
+        """<detector> (is active) or <detector>.<detail> (for the binary sensor attributes)."""
+        detector, _, detail = key.partition('.')
+        if not detail:
+            return self.is_active(detector)
+        return (self.active[detector] or {}).get(detail)
+
+    def check(self, now: float = None) -> list[tuple[str, dict]]:
+        """Update the detectors, returns an (event_type, event_data) for every detector that changed."""
+        now = time.monotonic() if now is None else now
+        data = self.ankerdata
+        status = data.status
+        printing = status == AnkerStatus.PRINTING.value
+
+        readings = {'hotend': (data.hotend_temp, data.target_hotend_temp), 'bed': (data.bed_temp, data.target_bed_temp)}
+        for name, heater in self.heaters.items():
+            heater.update(*readings[name], printing, now)
+
+        found = {
+            'heating_failed': self._heating_failed(now),
+            'temperature_drop': self._temperature_drop() if printing else None,
+            'thermal_overshoot': self._thermal_overshoot(),
+            'print_stalled': self._print_stalled(printing, now),
+        }
+
+        events = []
+        for detector, details in found.items():
+            if (details is None) != (self.active[detector] is None):
+                events.append((EVENT_ANOMALY, {
+                    'anomaly': detector,
+                    'active': details is not None,
+                    'job_name': data.job_name,
+                    **(details or self.active[detector]),
+                }))
+            self.active[detector] = details
+        return events
+
+    def _heating_failed(self, now: float) -> dict | None:
+        for heater in self.heaters.values():
+            slope = heater.slope.slope
+            if (heater.target and not heater.reached and now - heater.target_since > HEATING_TIMEOUT[heater.name]
+                    and slope is not None and slope < MIN_HEATING_RATE):
+                return heater.details()
+        return None
+
+    def _temperature_drop(self) -> dict | None:
+        for heater in self.heaters.values():
+            if not heater.reached or heater.temp.value is None:
+                continue
+            margin = max(DROP_MARGIN[heater.name], 4 * heater.deviation.stdev)
+            if heater.temp.value < heater.target - margin:
+                return {**heater.details(), 'margin': round(margin, 1)}
+        return None
+
+    def _thermal_overshoot(self) -> dict | None:
+        for heater in self.heaters.values():
+            if heater.target and heater.settled and heater.temp.value > heater.target + OVERSHOOT_MARGIN[heater.name]:
+                return heater.details()
+        return None
+
+    def _print_stalled(self, printing: bool, now: float) -> dict | None:
+        data = self.ankerdata
+        progress = (data.progress, data.current_layer)
+        if not printing or progress != self._progress:
+            self._progress = progress
+            self._progress_since = now
+            return None
+        p95 = data._layer_timings.p95.value
+        timeout = max(STALL_TIMEOUT, 3 * p95) if p95 else STALL_TIMEOUT
+        stalled_for = now - self._progress_since
+        if stalled_for < timeout:
+            return None
+        return {'progress': data.progress, 'current_layer': data.current_layer, 'stalled_for': int(stalled_for)}
@@ -0,0 +1,56 @@
+"""
+Change detection for the ankerctl api status (polled every update interval).
+
+The response body is fingerprinted before it is parsed: while it is unchanged (most polls) nothing is parsed, AnkerData's
+derived values aren't invalidated and the service entities don't write their state. When it changes, every service
+gets a revision that only increases when its own slice of the status (the service and the possible states) changed,
+so each service entity updates independently. The binary sensor platform creates the service entities when new
+services are reported (SIGNAL_API_SERVICES). A service that is no longer reported keeps its entity (and its registry
+entry, with the user's settings), which becomes unavailable until the service is reported again.
+"""
+
+from __future__ import annotations
+
+import json
+
+from .const import DOMAIN
+
+# Sent (with the entry id) when the reported services changed
+SIGNAL_API_SERVICES = f'{DOMAIN}_api_services_{{}}'
+
+
+class ApiStatusTracker:
+    def __init__(self):
+        self.data: dict | None = None
+        self.revisions: dict[str, int] = {}  # Service: revision of its slice of the status (of every service seen)
+        self.unchanged = 0  # Polls skipped because the status was unchanged
+        self._fingerprint: int | None = None
+        self._slices: dict[str, int] = {}  # Service: hash of its slice
+
+    @property
+    def services(self) -> set[str]:
+        """The services ankerctl currently reports."""
+        return set(self._slices)
+
+    def update(self, body: bytes) -> bool:
+        """Apply a response body, returns False if it didn't change since the last one."""
+        fingerprint = hash(body)
+        if fingerprint == self._fingerprint:
+            self.unchanged += 1
+            return False
+        data = json.loads(body)
+        self._fingerprint = fingerprint
+        self.data = data
+
+        services = data.get('services') or {}
+        possible_states = data.get('possible_states')
+        slices = {name: hash(json.dumps([service, possible_states], sort_keys=True))
+                  for name, service in services.items()}
+        for name, digest in slices.items():
+            if self._slices.get(name) != digest:
+                self.revisions[name] = self.revisions.get(name, 0) + 1
+        for name in self._slices.keys() - slices.keys():
+            # Kept, so its entity updates (to unavailable)
+            self.revisions[name] += 1
+        self._slices = slices
+        return True
@@ -8,10 +8,15 @@ import logging
 from homeassistant.components.binary_sensor import BinarySensorEntity
 from homeassistant.core import callback
 from homeassistant.helpers.device_registry import DeviceInfo
+from homeassistant.helpers.dispatcher import async_dispatcher_connect
 
 from . import AnkerMakeBaseEntity
+from .api_status import SIGNAL_API_SERVICES
 from .const import DOMAIN, MANUFACTURER
-from .sensor_manifest import BINARY_SENSOR_DESCRIPTIONS, BINARY_SENSOR_WITH_ATTR_DESCRIPTIONS
+from .sensor_manifest import (BINARY_SENSOR_DESCRIPTIONS,
+                              BINARY_SENSOR_WITH_ATTR_DESCRIPTIONS,
+                              ANOMALY_BINARY_SENSOR_DESCRIPTIONS,
+                              api_service_description)
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -53,6 +58,54 @@ class AnkerMakeBinarySensorWithAttr(AnkerMakeBaseEntity, BinarySensorEntity):
             self._attr_available = False
 
 
+class AnkerMakeAnomalySensor(AnkerMakeBinarySensorWithAttr):
+    @callback
+    def _update_from_anker(self) -> None:
+        # The detectors also run while the printer is offline (a stalled print can be the reason it went quiet)
+        for attr, key in self.attrs.items():
+            if attr == 'state':
+                self._attr_is_on = self._filter_handler(key)
+                continue
+            self._attr_extra_state_attributes[attr] = self._filter_handler(key)
+        self._attr_available = True
+
+
+class AnkerMakeServiceSensor(AnkerMakeBinarySensorWithAttr):
+    """A service of the ankerctl api, only updated when its own slice of the api status changed (see api_status.py)."""
+
+    def __init__(self, coordinator, service, dev_info):
+        description, attrs = api_service_description(service)
+        super().__init__(coordinator, description, dev_info, attrs)
+        self.service = service
+        self._revision = None
+
+    async def async_added_to_hass(self) -> None:
+        await super().async_added_to_hass()
+        self._handle_coordinator_update()
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        revision = self.coordinator.api_status.revisions.get(self.service)
+        if revision is None or revision == self._revision:
+            return
+        self._revision = revision
+        super()._handle_coordinator_update()
+
+    @callback
+    def _update_from_anker(self) -> None:
+        if self.service not in self.coordinator.api_status.services:
+            # No longer reported by ankerctl (the entity is kept, it may come back)
+            self._attr_available = False
+            return
+        # Reported by ankerctl, regardless of whether the printer is online
+        for attr, key in self.attrs.items():
+            if attr == 'state':
+                self._attr_is_on = self._filter_handler(key)
+                continue
+            self._attr_extra_state_attributes[attr] = self._filter_handler(key)
+        self._attr_available = True
+
+
 async def async_setup_entry(hass, entry, async_add_entities):
     coordinator = hass.data[DOMAIN][entry.entry_id]
     entities = []
@@ -65,5 +118,22 @@ async def async_setup_entry(hass, entry, async_add_entities):
         entities.append(AnkerMakeBinarySensor(coordinator, description, dev_info))
     for description, attributes in BINARY_SENSOR_WITH_ATTR_DESCRIPTIONS:
         entities.append(AnkerMakeBinarySensorWithAttr(coordinator, description, dev_info, attributes))
+    for description, attributes in ANOMALY_BINARY_SENSOR_DESCRIPTIONS:
+        entities.append(AnkerMakeAnomalySensor(coordinator, description, dev_info, attributes))
 
     async_add_entities(entities, True)
+
+    services: dict[str, AnkerMakeServiceSensor] = {}
+
+    @callback
+    def async_update_services():
+        """Create the entities of newly reported services (those no longer reported become unavailable)."""
+        reported = coordinator.api_status.services
+        added = [AnkerMakeServiceSensor(coordinator, service, dev_info) for service in sorted(reported - services.keys())]
+        services.update((entity.service, entity) for entity in added)
+        if added:
+            async_add_entities(added)
+
+    async_update_services()
+    entry.async_on_unload(async_dispatcher_connect(hass, SIGNAL_API_SERVICES.format(entry.entry_id),
+                                                   async_update_services))
@@ -0,0 +1,82 @@
+"""
+Capture store for command types that AnkerData doesn't handle (unknown types, and those marked as '# Not used').
+
+Instead of logging (and raising) for every message, the last few raw payloads of each type are kept together with the
+field names and value types seen so far. This makes it possible to support new firmware messages by looking at the
+diagnostics, and selected fields can be exposed as sensors without code changes (see the expose_captured_field service).
+"""
+
+import time
+from collections import deque
+from logging import getLogger
+
+from .anker_models import CommandTypes
+
+_LOGGER = getLogger(__name__)
+
+CAPTURE_SIZE = 10  # Payloads kept per command type
+MAX_CAPTURED_TYPES = 32
+LOG_INTERVAL = 600  # Seconds between log messages per command type
+
+IGNORED_FIELDS = ['commandType']
+# (Enum containment checks on plain values raise a TypeError before python 3.12)
+KNOWN_COMMAND_TYPES = frozenset(c.value for c in CommandTypes)
+
+
+def _flatten(message: dict, prefix: str = '') -> dict:
+    """Flattens nested dicts to dotted keys ({'a': {'b': 1}} -> {'a.b': 1})."""
+    flat = {}
+    for key, value in message.items():
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f"{prefix}{key}."))
+        elif f"{prefix}{key}" not in IGNORED_FIELDS:
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
+class CommandCapture:
+    def __init__(self, size: int = CAPTURE_SIZE):
+        self.size = size
+        self.payloads: dict[int, deque] = {}
+        self.fields: dict[int, dict[str, set[str]]] = {}
+        self.counts: dict[int, int] = {}
+        self._last_logged: dict[int, float] = {}
+
+    def capture(self, command_type, message: dict):
+        if command_type not in self.payloads:
+            if len(self.payloads) >= MAX_CAPTURED_TYPES:
+                return
+            self.payloads[command_type] = deque(maxlen=self.size)
+            self.fields[command_type] = {}
+            self.counts[command_type] = 0
+
+        self.payloads[command_type].append(message)
+        self.counts[command_type] += 1
+        fields = self.fields[command_type]
+        for key, value in _flatten(message).items():
+            fields.setdefault(key, set()).add(type(value).__name__)
+
+        now = time.monotonic()
+        if now - self._last_logged.get(command_type, -LOG_INTERVAL) >= LOG_INTERVAL:
+            self._last_logged[command_type] = now
+            if command_type in KNOWN_COMMAND_TYPES:
+                _LOGGER.debug(f"Captured unused command_type: {command_type} ({message})")
+            else:
+                _LOGGER.warning(f"Unknown command_type: {command_type} ({message}), captured for the diagnostics "
+                                f"(further messages of this type are logged every {LOG_INTERVAL} seconds)")
+
+    def value(self, command_type: int, field: str):
+        """Returns the latest value of a (dotted) field of a captured command type."""
+        payloads = self.payloads.get(command_type)
+        if not payloads:
+            return None
+        return _flatten(payloads[-1]).get(field)
+
+    def as_dict(self) -> dict:
+        return {
+            command_type: {
+                'count': self.counts[command_type],
+                'fields': {key: sorted(types) for key, types in self.fields[command_type].items()},
+                'payloads': list(payloads),
+            } for command_type, payloads in self.payloads.items()
+        }
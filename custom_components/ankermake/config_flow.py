@@ -2,61 +2,176 @@
 AnkerMake Config Flow
 - host: str (will be ws(s)://<host>)
 - printer_name: str (the device name)
+- transport, mqtt_credentials (optional): subscribe to the printer's mqtt topic directly (see transport.py), with the
+  credentials read from ankerctl's config file
+
+The host can be entered manually, picked from the ankerctl instances found on the local network (see discovery.py), or
+confirmed when ankerctl is announced over zeroconf (_ankerctl._tcp).
+
+The options flow sets the performance profile (see tuning.py): a preset, or custom values for every setting.
 """
 
 import re
+from typing import TYPE_CHECKING
 
 import aiohttp
 import voluptuous as vol
 from homeassistant import config_entries
+from homeassistant.components import network
+from homeassistant.core import callback
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
+from homeassistant.helpers.selector import SelectSelector, SelectSelectorConfig
 from homeassistant.helpers.typing import ConfigType
 
-from .const import DOMAIN
+from .const import DOMAIN, CONF_INGEST_WORKER, CONF_PROFILE, PROFILE_BALANCED, PROFILE_CUSTOM
+from .discovery import candidate_hosts, discover, http_url
+from .transport import TRANSPORT_MQTT, load_ankerctl_credentials
+from .tuning import PROFILES, Tuning
+
+if TYPE_CHECKING:
+    from homeassistant.components.zeroconf import ZeroconfServiceInfo
+
+DEFAULT_PRINTER_NAME = "AnkerMake M5"
+VALIDATE_TIMEOUT = 10  # Seconds
+
+# Setting: (min, max)
+TUNING_RANGES = {
+    'poll_interval': (1, 300),
+    'liveness_timeout': (5, 600),
+    'hotend_deadband': (0, 50),
+    'bed_deadband': (0, 30),
+    'reconnect_min': (1, 600),
+    'reconnect_max': (1, 3600),
+}
 
 VOL_SCHEME = vol.Schema({
     vol.Required("host", default="localhost:4470"): vol.Coerce(str),
-    vol.Required("printer_name", default="AnkerMake M5"): vol.Coerce(str),
+    vol.Required("printer_name", default=DEFAULT_PRINTER_NAME): vol.Coerce(str),
+    vol.Optional("ankerctl_config"): vol.Coerce(str),
 })
 
 
+def normalize_host(host: str) -> str:
+    # Replace http(s) with ws(s)
+    host = host.replace('http://', 'ws://').replace('https://', 'wss://')
+    # Ensure the host is in the correct format (ws:// or wss://)
+    if not re.match(r"wss?://.+(:\d+)?", host):
+        host = f"ws://{host}"
+    # Ensure there is no trailing slashes or paths
+    return re.search(r'(wss?://[^/]+)', host).group(1)
+
+
 class AnkerMakeFlowHandler(config_entries.ConfigFlow, domain=DOMAIN):
     """Config flow for AnkerMake."""
     VERSION = 1
 
+    def __init__(self):
+        self._discovered: dict[str, dict] = {}
+
+    @staticmethod
+    @callback
+    def async_get_options_flow(config_entry: config_entries.ConfigEntry) -> config_entries.OptionsFlow:
+        return AnkerMakeOptionsFlow(config_entry)
+
     async def async_step_user(self, user_input: ConfigType = None):
+        return self.async_show_menu(step_id="user", menu_options=["discovery", "manual"])
+
+    async def async_step_manual(self, user_input: ConfigType = None, errors: dict = None):
         # If the user input is empty, show the form
         if not user_input:
-            return self.async_show_form(step_id="user", data_schema=VOL_SCHEME)
+            return self.async_show_form(step_id="manual", data_schema=VOL_SCHEME, errors=errors)
 
         def retry_input(msg):
             vol_scheme = vol.Schema({
                 vol.Required("host", default=user_input["host"]): vol.Coerce(str),
                 vol.Required("printer_name", default=user_input["printer_name"]): vol.Coerce(str),
+                vol.Optional("ankerctl_config",
+                             description={"suggested_value": user_input.get("ankerctl_config")}): vol.Coerce(str),
             })
-            return self.async_show_form(step_id="user", data_schema=vol_scheme, errors={"base": msg})
+            return self.async_show_form(step_id="manual", data_schema=vol_scheme, errors={"base": msg})
+
+        return await self._async_create_printer(user_input, retry_input)
+
+    async def async_step_discovery(self, user_input: ConfigType = None):
+        """Probes the local subnets for ankerctl instances and lets the user pick one."""
+        if not user_input:
+            adapters = await network.async_get_adapters(self.hass)
+            addresses = [(ip["address"], ip["network_prefix"])
+                         for adapter in adapters if adapter["enabled"] for ip in adapter["ipv4"]]
+            configured = {entry.data["host"] for entry in self._async_current_entries()}
+            found = await discover(async_get_clientsession(self.hass), candidate_hosts(addresses))
+            self._discovered = {instance["host"]: instance for instance in found
+                                if instance["host"] not in configured}
+            if not self._discovered:
+                return await self.async_step_manual(errors={"base": "no_instances_found"})
 
-        # Replace http(s) with ws(s)
-        host = user_input["host"].replace('http://', 'ws://').replace('https://', 'wss://')
-        # Ensure the host is in the correct format (ws:// or wss://)
-        if not re.match(r"wss?://.+(:\d+)?", host):
-            host = f"ws://{host}"
-        # Ensure there is no trailing slashes or paths
-        host = re.search(r'(wss?://[^/]+)', host).group(1)
+        hosts = {host: f"{instance['printer_name'] or host} ({http_url(host)}, ankerctl {instance['version']})"
+                 for host, instance in self._discovered.items()}
+        first = next(iter(self._discovered.values()))
+        default_host = user_input["host"] if user_input else first["host"]
+        default_name = user_input["printer_name"] if user_input else first["printer_name"] or DEFAULT_PRINTER_NAME
 
+        def show_form(errors: dict = None):
+            vol_scheme = vol.Schema({
+                vol.Required("host", default=default_host): vol.In(hosts),
+                vol.Required("printer_name", default=default_name): vol.Coerce(str),
+            })
+            return self.async_show_form(step_id="discovery", data_schema=vol_scheme, errors=errors)
+
+        if not user_input:
+            return show_form()
+        return await self._async_create_printer(user_input, lambda msg: show_form({"base": msg}))
+
+    async def async_step_zeroconf(self, discovery_info: "ZeroconfServiceInfo"):
+        host = f"ws://{discovery_info.host}:{discovery_info.port}"
+        self._async_abort_entries_match({"host": host})
+        name = discovery_info.properties.get("printer_name") or discovery_info.name.split(".")[0]
+        self._discovered = {host: {"host": host, "printer_name": name, "version": None}}
+        self.context["title_placeholders"] = {"name": name}
+        return await self.async_step_zeroconf_confirm()
+
+    async def async_step_zeroconf_confirm(self, user_input: ConfigType = None):
+        instance = next(iter(self._discovered.values()))
+
+        def show_form(errors: dict = None):
+            vol_scheme = vol.Schema({
+                vol.Required("printer_name", default=instance["printer_name"]): vol.Coerce(str),
+            })
+            return self.async_show_form(step_id="zeroconf_confirm", data_schema=vol_scheme, errors=errors,
+                                        description_placeholders={"host": http_url(instance["host"])})
+
+        if not user_input:
+            return show_form()
+        user_input["host"] = instance["host"]
+        return await self._async_create_printer(user_input, lambda msg: show_form({"base": msg}))
+
+    async def _async_create_printer(self, user_input: ConfigType, retry_input):
+        """Validates the host and printer name, creates the entry or shows the form again (retry_input(msg))."""
         # Update the user input
-        user_input["host"] = host
+        user_input["host"] = normalize_host(user_input["host"])
 
         # Ensure the host is reachable
-        http_host = user_input["host"].replace('ws://', 'http://').replace('wss://', 'https://')
-        url = f"{http_host}/api/version"
+        url = f"{http_url(user_input['host'])}/api/version"
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url) as response:
-                    response.raise_for_status()
+            session = async_get_clientsession(self.hass)
+            async with session.get(url, timeout=aiohttp.ClientTimeout(total=VALIDATE_TIMEOUT)) as response:
+                response.raise_for_status()
         except Exception as e:
             return retry_input(
                 f"Could not connect to the specified ankerctl host, verify that the host is correct and is reachable. ({e})")
 
+        # Read the credentials for the direct mqtt transport
+        if user_input.get("ankerctl_config"):
+            path = user_input["ankerctl_config"]
+            if not self.hass.config.is_allowed_path(path):
+                return retry_input(f"Access to {path} is not allowed (see allowlist_external_dirs)")
+            try:
+                credentials = await self.hass.async_add_executor_job(load_ankerctl_credentials, path)
+            except (OSError, ValueError, KeyError) as e:
+                return retry_input(f"Could not read the printer's mqtt credentials from {path}. ({e})")
+            user_input["transport"] = TRANSPORT_MQTT
+            user_input["mqtt_credentials"] = credentials
+
         # Ensure host is unique
         unique_id = user_input["printer_name"]
         await self.async_set_unique_id(unique_id)
@@ -65,4 +180,46 @@ class AnkerMakeFlowHandler(config_entries.ConfigFlow, domain=DOMAIN):
         except Exception:
             return retry_input("A printer with this name is already configured.")
 
+        user_input.pop("ankerctl_config", None)
         return self.async_create_entry(title=user_input['printer_name'], data=user_input)
+
+
+class AnkerMakeOptionsFlow(config_entries.OptionsFlow):
+    """Performance profile of a printer, applied live by the entry's update listener."""
+
+    def __init__(self, config_entry: config_entries.ConfigEntry):
+        self._entry = config_entry
+        self._ingest_worker = config_entry.options.get(CONF_INGEST_WORKER, False)
+
+    async def async_step_init(self, user_input: ConfigType = None):
+        if user_input is not None:
+            self._ingest_worker = user_input.get(CONF_INGEST_WORKER, False)
+            if user_input[CONF_PROFILE] == PROFILE_CUSTOM:
+                return await self.async_step_advanced()
+            options = {k: v for k, v in self._entry.options.items() if k not in TUNING_RANGES}
+            return self.async_create_entry(title="", data={**options, CONF_PROFILE: user_input[CONF_PROFILE],
+                                                           CONF_INGEST_WORKER: self._ingest_worker})
+
+        vol_scheme = vol.Schema({
+            vol.Required(CONF_PROFILE, default=self._entry.options.get(CONF_PROFILE, PROFILE_BALANCED)):
+                SelectSelector(SelectSelectorConfig(options=[*PROFILES, PROFILE_CUSTOM], translation_key=CONF_PROFILE)),
+            vol.Optional(CONF_INGEST_WORKER, default=self._ingest_worker): bool,
+        })
+        return self.async_show_form(step_id="init", data_schema=vol_scheme)
+
+    async def async_step_advanced(self, user_input: ConfigType = None):
+        errors = {}
+        if user_input is not None:
+            if user_input['reconnect_max'] < user_input['reconnect_min']:
+                errors['reconnect_max'] = "reconnect_max_below_min"
+            else:
+                return self.async_create_entry(title="", data={**self._entry.options, **user_input,
+                                                               CONF_PROFILE: PROFILE_CUSTOM,
+                                                               CONF_INGEST_WORKER: self._ingest_worker})
+
+        current = user_input or Tuning.from_options(self._entry.options).as_dict()
+        vol_scheme = vol.Schema({
+            vol.Required(name, default=current[name]): vol.All(vol.Coerce(float), vol.Range(min=low, max=high))
+            for name, (low, high) in TUNING_RANGES.items()
+        })
+        return self.async_show_form(step_id="advanced", data_schema=vol_scheme, errors=errors)
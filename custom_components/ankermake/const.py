@@ -16,3 +16,30 @@ If you have any issues with this you need to open an issue here:
 """
 
 UPDATE_FREQUENCY_SECONDS = 5
+
+# Performance profile (entry options, see tuning.py): a preset, or 'custom' with a value for every setting
+CONF_PROFILE = 'profile'
+PROFILE_BALANCED = 'balanced'
+PROFILE_CUSTOM = 'custom'
+
+# Entry option: run the transport and AnkerData.update in a worker thread shared by the printers using it (worker.py)
+CONF_INGEST_WORKER = 'ingest_worker'
+
+# Fields of captured (unhandled) command types exposed as sensors, stored in the entry options as '<type>.<field>'
+CONF_CAPTURED_FIELDS = 'captured_fields'
+
+# Directory (in the config directory) of the per-job telemetry files, one subdirectory per printer
+TELEMETRY_DIR = f'{DOMAIN}_telemetry'
+
+# Additional error codes (in the config directory), {"<code>": "<message>"} merged into the built-in codes (errors.py)
+ERROR_CODES_FILE = f'{DOMAIN}_error_codes.json'
+
+EVENT_UPLOAD_PROGRESS = f'{DOMAIN}_upload_progress'
+EVENT_PRINT_STARTED = f'{DOMAIN}_print_started'
+EVENT_PRINT_FINISHED = f'{DOMAIN}_print_finished'
+EVENT_PRINT_PAUSED = f'{DOMAIN}_print_paused'
+EVENT_PRINT_ERROR = f'{DOMAIN}_print_error'
+EVENT_LAYER_CHANGED = f'{DOMAIN}_layer_changed'
+EVENT_FILAMENT_RUNOUT = f'{DOMAIN}_filament_runout'
+EVENT_ANOMALY = f'{DOMAIN}_anomaly'
+EVENT_QUEUE_DISPATCHED = f'{DOMAIN}_queue_dispatched'
@@ -0,0 +1,111 @@
+"""
+Optimistic state for the printer settings controlled through ankerctl's /ws/ctrl socket (light and video quality).
+
+Setting a value updates the entity at once and queues the value for sending; while a send is in flight newer values
+replace the queued one, so rapid changes only send the final state. The printer doesn't report these settings on the
+mqtt stream (and ankerctl doesn't echo them), so a value is confirmed once ankerctl accepted it. A send that fails or
+doesn't complete within the timeout reverts to the last confirmed value and fails the call that set it. A value set
+while the send was in flight isn't reverted, it is sent next.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable
+
+from .anker_models import AnkerException
+from .metrics import Histogram
+
+_LOGGER = logging.getLogger(__name__)
+
+CONFIRM_TIMEOUT = 10  # Seconds ankerctl has to accept a value
+
+
+class OptimisticControl:
+    def __init__(self, name: str, send: Callable[[Any], Awaitable], on_change: Callable[[], None],
+                 initial: Any = None, latency: Histogram = None, timeout: float = CONFIRM_TIMEOUT):
+        """
+        send: sends a value to the printer (raises AnkerException on failure)
+        on_change: called when the state is reverted
+        """
+        self.name = name
+        self._send = send
+        self._on_change = on_change
+        self._timeout = timeout
+        self.latency = latency or Histogram()
+
+        self.confirmed = initial
+        self.desired = initial
+        self.rollbacks = 0
+        self._waiters: list[tuple[Any, asyncio.Future]] = []
+        self._task: asyncio.Task | None = None
+
+    @property
+    def state(self) -> Any:
+        return self.desired
+
+    @property
+    def pending(self) -> bool:
+        return self.desired != self.confirmed
+
+    def set(self, value: Any) -> asyncio.Future:
+        """
+        Set the desired state, it is sent in the background (coalescing values set while a send is in flight).
+
+        The returned future completes once the value was confirmed or replaced by a newer one, it raises AnkerException
+        if the value was reverted.
+        """
+        self.desired = value
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append((value, waiter))
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._sender())
+        return waiter
+
+    async def _sender(self):
+        while self.desired != self.confirmed:
+            value = self.desired
+            sent_at = time.monotonic()
+            try:
+                await asyncio.wait_for(self._send(value), self._timeout)
+            except (AnkerException, asyncio.TimeoutError) as e:
+                if isinstance(e, asyncio.TimeoutError):
+                    e = AnkerException(f"ankerctl did not accept {self.name} = {value} within {self._timeout} seconds")
+                _LOGGER.error(f"[AnkerMake] Failed to set {self.name} to {value}: {e}")
+                self._resolve(value, e)
+                if self._rollback(value):
+                    break
+                continue
+            self.latency.observe(time.monotonic() - sent_at)
+            self.confirmed = value
+            self._resolve(value)
+        # Whatever is still waiting was replaced by the value that ended up confirmed
+        self._resolve(None, match=False)
+
+    def _resolve(self, value: Any, error: Exception = None, match: bool = True):
+        waiting = []
+        for waiter_value, waiter in self._waiters:
+            if match and waiter_value != value:
+                waiting.append((waiter_value, waiter))
+            elif not waiter.done():
+                if error is None:
+                    waiter.set_result(None)
+                else:
+                    waiter.set_exception(error)
+        self._waiters = waiting
+
+    def _rollback(self, value: Any) -> bool:
+        """Revert a value that wasn't applied, unless a newer value was set meanwhile. Returns True if reverted."""
+        if self.desired != value:
+            return False
+        self.rollbacks += 1
+        self.desired = self.confirmed
+        self._on_change()
+        return True
+
+    def cancel(self):
+        if self._task is not None:
+            self._task.cancel()
+        for _, waiter in self._waiters:
+            waiter.cancel()
+        self._waiters = []
@@ -0,0 +1,63 @@
+"""
+Cached derived values for AnkerData.
+
+A derived value is a read-only property that names the fields it is computed from, e.g.
+
+    @derived('filament', 'filament_used')
+    def filament_weight(self) -> float: ...
+
+The value is computed on the first read and cached until one of those fields is assigned (tracked by
+DerivedValues.__setattr__). Derived values can depend on other derived values (declared above them), which is
+expanded to the underlying fields. Fields must be replaced to invalidate a value, in-place changes are not tracked.
+"""
+
+from typing import Callable
+
+
+class derived:
+    def __init__(self, *depends_on: str):
+        self.depends_on = depends_on
+        self.func: Callable | None = None
+        self.name = ''
+
+    def __call__(self, func: Callable) -> 'derived':
+        self.func = func
+        self.__doc__ = func.__doc__
+        return self
+
+    def __set_name__(self, owner, name: str):
+        self.name = name
+        if '_derived_dependents' not in owner.__dict__:
+            owner._derived_dependents = {}
+        fields = set()
+        for dependency in self.depends_on:
+            other = owner.__dict__.get(dependency)
+            fields.update(other.fields if isinstance(other, derived) else [dependency])
+        self.fields = frozenset(fields)
+        for field in self.fields:
+            owner._derived_dependents.setdefault(field, []).append(name)
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        cache = instance._derived_cache
+        try:
+            return cache[self.name]
+        except KeyError:
+            value = cache[self.name] = self.func(instance)
+            return value
+
+
+class DerivedValues:
+    """Mixin invalidating the derived values of a field when it is assigned."""
+    _derived_dependents: dict[str, list[str]] = {}
+    _derived_cache: dict
+
+    def __setattr__(self, name: str, value):
+        object.__setattr__(self, name, value)
+        dependents = self._derived_dependents.get(name)
+        if dependents:
+            cache = self.__dict__.get('_derived_cache')
+            if cache:
+                for dependent in dependents:
+                    cache.pop(dependent, None)
@@ -0,0 +1,33 @@
+"""
+Diagnostics download for the AnkerMake integration, includes the current AnkerData, the ankerctl api status and the
+performance metrics of the printer.
+"""
+
+from dataclasses import fields
+
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+
+from .const import DOMAIN
+
+# Credentials, the serial, the host and the job file names (and preview urls), anywhere in the payload
+TO_REDACT = {'mqtt_key', 'email', 'user_id', 'sn', 'host', 'name', 'job_name', 'image', 'img'}
+
+
+async def async_get_config_entry_diagnostics(hass: HomeAssistant, entry: ConfigEntry) -> dict:
+    coordinator = hass.data[DOMAIN][entry.entry_id]
+    ankerdata = coordinator.ankerdata
+    return async_redact_data({
+        'config': dict(entry.data),
+        'ankerdata': {f.name: getattr(ankerdata, f.name) for f in fields(ankerdata)
+                      if not f.name.startswith('_') and f.name != 'thumbnail'},
+        'status': ankerdata.status,
+        'online': ankerdata.online,
+        'api_status': ankerdata._api_status,
+        'api_status_unchanged_polls': coordinator.api_status.unchanged,
+        'transport': coordinator.transport.name,
+        'metrics': coordinator.metrics.as_dict(),
+        'captured_command_types': ankerdata._capture.as_dict(),
+        'error_counts': dict(ankerdata._error_counts),
+    }, TO_REDACT)
@@ -0,0 +1,75 @@
+"""
+Discovery of ankerctl instances on the local network (used by the config flow).
+
+Candidate hosts (every address of the local IPv4 subnets, capped at a /24 around each address) are probed concurrently
+on the ankerctl port(s) with a short timeout and a bounded number of requests in flight.
+"""
+
+import asyncio
+import ipaddress
+from typing import Iterable
+
+import aiohttp
+
+DISCOVERY_PORTS = (4470,)
+DISCOVERY_TIMEOUT = 1.5  # Seconds per probe
+DISCOVERY_CONCURRENCY = 64  # Probes in flight
+MIN_PREFIX = 24  # Larger subnets are narrowed to the /24 around our own address
+
+
+def http_url(host: str) -> str:
+    return host.replace('ws://', 'http://').replace('wss://', 'https://')
+
+
+def candidate_hosts(addresses: Iterable[tuple[str, int]]) -> list[str]:
+    """Returns every host address of the subnets of the given (address, network_prefix) pairs."""
+    hosts = {'127.0.0.1'}
+    for address, prefix in addresses:
+        network = ipaddress.ip_network(f"{address}/{max(prefix, MIN_PREFIX)}", strict=False)
+        if network.is_loopback or network.is_link_local:
+            continue
+        hosts.update(str(host) for host in network.hosts() if str(host) != address)
+    return sorted(hosts, key=ipaddress.ip_address)
+
+
+async def probe(session: aiohttp.ClientSession, host: str, timeout: float = DISCOVERY_TIMEOUT) -> dict | None:
+    """
+    Checks if an ankerctl instance is running on host (ws(s)://<address>:<port>).
+
+    Returns {'host': str, 'version': str, 'printer_name': str | None} or None if nothing answered.
+    """
+    url = http_url(host)
+    client_timeout = aiohttp.ClientTimeout(total=timeout)
+    try:
+        async with session.get(f"{url}/api/version", timeout=client_timeout) as response:
+            if response.status != 200:
+                return None
+            version = await response.json(content_type=None)
+    except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+        return None
+    if not isinstance(version, dict) or 'server' not in version:
+        return None
+
+    # The printer name is only known if this ankerctl reports it in its status
+    printer_name = None
+    try:
+        async with session.get(f"{url}/api/ankerctl/status", timeout=client_timeout) as response:
+            if response.status == 200:
+                status = await response.json(content_type=None)
+                printer_name = (status.get('printer') or {}).get('name') or status.get('printer_name')
+    except (aiohttp.ClientError, asyncio.TimeoutError, ValueError, AttributeError):
+        pass
+    return {'host': host, 'version': version.get('server'), 'printer_name': printer_name}
+
+
+async def discover(session: aiohttp.ClientSession, hosts: Iterable[str], ports: Iterable[int] = DISCOVERY_PORTS,
+                   concurrency: int = DISCOVERY_CONCURRENCY, timeout: float = DISCOVERY_TIMEOUT) -> list[dict]:
+    """Probes every host:port combination concurrently, returns the ankerctl instances that responded."""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def bounded_probe(host: str):
+        async with semaphore:
+            return await probe(session, host, timeout)
+
+    results = await asyncio.gather(*(bounded_probe(f"ws://{host}:{port}") for host in hosts for port in ports))
+    return [result for result in results if result]
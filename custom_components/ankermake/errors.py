@@ -0,0 +1,123 @@
+"""
+Registry of the printer's error codes (TEMP_ERROR_CODE messages).
+
+Codes are indexed by their integer value, so lookups are O(1) regardless of how the code is written ('0xff01030001'
+and '0xFF01030001' are the same code). The code is decoded into its fields, as far as they are understood:
+
+    0xFF 01 03 0001
+      |  |  |  +--- number
+      |  |  +------ category
+      |  +--------- subsystem
+      +------------ source (always 0xFF so far)
+
+The severity is the errorLevel of the message (see ERROR_LEVELS), not part of the code.
+
+The built-in codes (ERROR_CODES) can be extended without a release by adding them to <config>/ankermake_error_codes.json:
+
+    {"0xFF01030002": "Nozzle clogged", "0xFF02010001": {"message": "Bed thermistor disconnected"}}
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+from dataclasses import dataclass
+
+from .anker_models import ERROR_CODES
+
+_LOGGER = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True, slots=True)
+class ErrorInfo:
+    code: str  # Normalized, e.g. 0xFF01030001
+    message: str
+    known: bool
+    source: int | None = None
+    subsystem: int | None = None
+    category: int | None = None
+    number: int | None = None
+
+
+def parse_code(code: str) -> int | None:
+    try:
+        return int(code, 16)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_ext(ext: str | dict | None) -> dict:
+    """
+    The ext payload of an error message ('{"curFilamentType":["PLA"]}') as attributes: snake_case keys, lists with a
+    single value unwrapped ({'cur_filament_type': 'PLA'}). Returns {'raw': ext} if it isn't a json object.
+    """
+    if not ext:
+        return {}
+    if isinstance(ext, str):
+        try:
+            ext = json.loads(ext)
+        except ValueError:
+            return {'raw': ext}
+    if not isinstance(ext, dict):
+        return {'raw': ext}
+    details = {}
+    for key, value in ext.items():
+        name = ''.join(f'_{c.lower()}' if c.isupper() else c for c in key).lstrip('_')
+        details[name] = value[0] if isinstance(value, list) and len(value) == 1 else value
+    return details
+
+
+class ErrorRegistry:
+    def __init__(self, codes: dict[str, str] = None):
+        self._messages: dict[int, str] = {}
+        self._cache: dict[str, ErrorInfo] = {}  # By the code as received
+        self.update(codes or {})
+
+    def __len__(self) -> int:
+        return len(self._messages)
+
+    def update(self, codes: dict[str, str | dict]):
+        for code, message in codes.items():
+            value = parse_code(code)
+            if value is None:
+                _LOGGER.warning(f"[AnkerMake] Ignoring invalid error code {code!r}")
+                continue
+            self._messages[value] = message['message'] if isinstance(message, dict) else str(message)
+        self._cache.clear()
+
+    def load(self, path: str) -> int:
+        """Add the codes of a json file (if it exists), returns the number of codes loaded."""
+        if not os.path.exists(path):
+            return 0
+        with open(path) as f:
+            codes = json.load(f)
+        if not isinstance(codes, dict):
+            raise ValueError(f"{path} must contain a json object of error codes")
+        self.update(codes)
+        return len(codes)
+
+    def lookup(self, code: str) -> ErrorInfo:
+        info = self._cache.get(code)
+        if info is None:
+            info = self._cache[code] = self._decode(code)
+        return info
+
+    def _decode(self, code: str) -> ErrorInfo:
+        value = parse_code(code)
+        if value is None:
+            return ErrorInfo(code=str(code), message=str(code), known=False)
+        normalized = f'0x{value:010X}'
+        message = self._messages.get(value)
+        return ErrorInfo(
+            code=normalized,
+            message=message or normalized,
+            known=message is not None,
+            source=value >> 32 & 0xFF,
+            subsystem=value >> 24 & 0xFF,
+            category=value >> 16 & 0xFF,
+            number=value & 0xFFFF,
+        )
+
+
+ERROR_REGISTRY = ErrorRegistry(ERROR_CODES)
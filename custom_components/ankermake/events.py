@@ -0,0 +1,117 @@
+"""
+Print transition events for the Home Assistant event bus.
+
+AnkerEventTracker compares AnkerData with the last state it saw, and returns one event per transition. The coordinator
+calls check() after a message has been applied (and on every poll), never when entities read the data, so automations
+can trigger on these events instead of re-evaluating templates on every state write.
+
+The first check once the printer is online only records the current state, so a print that was already running when
+Home Assistant (re)started doesn't fire print_started (or a finished one print_finished) again.
+"""
+
+from .anker_models import AnkerStatus, FILAMENT_BROKEN_CODE
+from .ankermake_mqtt_adapter import AnkerData
+from .const import (EVENT_PRINT_STARTED,
+                    EVENT_PRINT_FINISHED,
+                    EVENT_PRINT_PAUSED,
+                    EVENT_PRINT_ERROR,
+                    EVENT_LAYER_CHANGED,
+                    EVENT_FILAMENT_RUNOUT)
+
+STARTED_STATES = [AnkerStatus.PREHEATING.value, AnkerStatus.PRINTING.value]
+
+
+def _isoformat(value):
+    return value.isoformat() if value else None
+
+
+class AnkerEventTracker:
+    def __init__(self, ankerdata: AnkerData):
+        self.ankerdata = ankerdata
+        self._status = None
+        self._started_job = None
+        self._finished_job = None
+        self._layer = 0
+        self._error = ""
+        self._seeded = False
+
+    def _seed(self, status: str):
+        data = self.ankerdata
+        self._seeded = True
+        self._started_job = data.job_name or None
+        self._finished_job = data.job_name if status == AnkerStatus.FINISHED.value else None
+        self._layer = data.current_layer
+        self._error = (data.error_code, data.error_message) if data.in_error_state else ""
+        self._status = status
+
+    def check(self) -> list[tuple[str, dict]]:
+        """Returns the (event_type, event_data) of every transition since the last check."""
+        data = self.ankerdata
+        status = data.status
+        if not self._seeded:
+            if data.online:
+                self._seed(status)
+            return []
+        events = []
+
+        # Preheating and printing are both part of starting a job, only the first one counts (once per job)
+        if status in STARTED_STATES and data.job_name and data.job_name != self._started_job:
+            self._started_job = data.job_name
+            self._finished_job = None
+            self._layer = 0
+            events.append((EVENT_PRINT_STARTED, {
+                'job_name': data.job_name,
+                'filament': data.filament,
+                'total_layers': data.total_layers,
+                'start_time': _isoformat(data.print_start_time),
+                'target_time': _isoformat(data.print_target_time),
+                'slicer_estimated_time': data.slicer_estimated_time,
+            }))
+
+        if status == AnkerStatus.FINISHED.value and self._finished_job != data.job_name:
+            self._finished_job = data.job_name
+            events.append((EVENT_PRINT_FINISHED, {
+                'job_name': data.job_name,
+                'total_time': data.total_time,
+                'filament': data.filament,
+                'filament_used': data.filament_used,
+                'filament_weight': data.filament_weight,
+                'total_layers': data.total_layers,
+            }))
+
+        if status == AnkerStatus.PAUSED.value and self._status != AnkerStatus.PAUSED.value:
+            events.append((EVENT_PRINT_PAUSED, {
+                'job_name': data.job_name,
+                'progress': data.progress,
+                'current_layer': data.current_layer,
+            }))
+
+        # Job was reset (stopped/idle), allow the same job name to be started again
+        if not data.job_name:
+            self._started_job = None
+
+        if data.current_layer and data.current_layer != self._layer:
+            self._layer = data.current_layer
+            events.append((EVENT_LAYER_CHANGED, {
+                'job_name': data.job_name,
+                'current_layer': data.current_layer,
+                'total_layers': data.total_layers,
+                'progress': data.progress,
+            }))
+
+        error = (data.error_code, data.error_message)
+        if data.in_error_state and error != self._error:
+            payload = {
+                'job_name': data.job_name,
+                'error_code': data.error_code,
+                'error_message': data.error_message,
+                'error_level': data.error_level,
+            }
+            events.append((EVENT_PRINT_ERROR, payload))
+            if data.error_code == FILAMENT_BROKEN_CODE:
+                events.append((EVENT_FILAMENT_RUNOUT, {**payload, 'filament': data.filament,
+                                                       'current_layer': data.current_layer}))
+        self._error = error if data.in_error_state else ""
+
+        self._status = status
+        return events
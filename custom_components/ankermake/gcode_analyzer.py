@@ -0,0 +1,158 @@
+"""
+Gcode pre-analysis, used to learn a job's metadata (filament, layers, slicer estimate, thumbnail) before the printer
+reports it.
+
+The file is memory-mapped and scanned once with a single regex that only stops at lines we care about (comments,
+extrusion moves and extrusion mode changes), so a 200 MB file is never read into memory. This is blocking work and
+must be run in the executor. Results are cached by the hash of the file contents.
+"""
+
+import base64
+import hashlib
+import mmap
+import os
+import re
+from collections import OrderedDict
+from dataclasses import dataclass, field, asdict
+
+from .anker_models import FilamentType
+
+CACHE_SIZE = 32
+
+_CACHE: OrderedDict[str, 'GcodeMetadata'] = OrderedDict()
+
+_LINE_PATTERN = re.compile(
+    rb'^(?:;(?P<comment>[^\r\n]*)'
+    rb'|(?P<mode>M8[23])\b'
+    rb'|G92\b[^\r\n;]*?E(?P<reset>-?\d*\.?\d+)'
+    rb'|G[01]\b[^\r\n;]*?E(?P<e>-?\d*\.?\d+))',
+    re.MULTILINE)
+# key = value (PrusaSlicer / AnkerMake Studio) or KEY:value (Cura)
+_HEADER_PATTERN = re.compile(r'^\s*([A-Za-z_][\w \[\]()]*?)\s*(?:=|:)\s*(.+)$')
+_DURATION_PATTERN = re.compile(r'(?:(\d+)d)?\s*(?:(\d+)h)?\s*(?:(\d+)m)?\s*(?:(\d+)s)?')
+# thumbnail begin <width>x<height> <length>
+_THUMBNAIL_SIZE_PATTERN = re.compile(rb'^\s*thumbnail(?:_PNG)? begin\s+(\d+)x(\d+)')
+
+# Per-move comments emitted in the body of the file, skipped without parsing (they are by far the most common lines)
+BODY_TAGS = (b'WIDTH:', b'HEIGHT:', b'Z:', b'TYPE:', b'MESH:', b'TIME_ELAPSED:', b'AFTER_LAYER_CHANGE')
+# Keys (lowercase) that slicers use for the values we are interested in
+FILAMENT_TYPE_KEYS = ('filament_type', 'filament type', 'material')
+ESTIMATED_TIME_KEYS = ('estimated printing time (normal mode)', 'estimated printing time', 'time')
+LAYER_COUNT_KEYS = ('layer_count', 'total layers count', 'total layer number')
+
+
+@dataclass
+class GcodeMetadata:
+    file_hash: str
+    header: dict[str, str] = field(default_factory=dict)
+    filament: str = FilamentType.UNKNOWN.value
+    layer_count: int = 0
+    extrusion: float = 0  # Total extruded filament in mm
+    estimated_time: int = 0  # Slicer estimate in seconds
+    thumbnail: bytes | None = field(default=None, repr=False)  # Largest embedded PNG thumbnail
+
+    def as_dict(self) -> dict:
+        """Returns the metadata without the thumbnail (for service responses and diagnostics)."""
+        data = asdict(self)
+        data['has_thumbnail'] = data.pop('thumbnail') is not None
+        return data
+
+
+def _parse_duration(value: str) -> int:
+    if value.strip().isdigit():
+        return int(value)
+    match = _DURATION_PATTERN.search(value)
+    days, hours, minutes, seconds = (int(v or 0) for v in match.groups())
+    return ((days * 24 + hours) * 60 + minutes) * 60 + seconds
+
+
+def _parse_filament(value: str) -> str:
+    # Multi material files list one type per extruder (PLA;PLA), the first one is the one being used
+    first = re.split(r'[;,\s]+', value.strip().strip('"'))[0]
+    return FilamentType.upper_dict().get(first.upper(), FilamentType.UNKNOWN.value)
+
+
+def _scan(mm) -> GcodeMetadata:
+    header = {}
+    layers = 0
+    extrusion = 0.0
+    relative = False
+    last_e = 0.0
+    thumbnails = {}
+    thumbnail = None  # (size, [base64 lines]) while inside a thumbnail block
+
+    for match in _LINE_PATTERN.finditer(mm):
+        kind = match.lastgroup
+        if kind == 'e':
+            e = float(match.group('e'))
+            if relative:
+                extrusion += max(e, 0)
+            else:
+                extrusion += max(e - last_e, 0)
+                last_e = e
+        elif kind == 'comment':
+            comment = match.group('comment')
+            if comment.startswith(BODY_TAGS):
+                continue
+            if thumbnail is not None:
+                if comment.strip().startswith((b'thumbnail end', b'thumbnail_PNG end')):
+                    thumbnails[thumbnail[0]] = b''.join(thumbnail[1])
+                    thumbnail = None
+                else:
+                    thumbnail[1].append(comment.strip())
+            elif comment.startswith((b'LAYER_CHANGE', b'LAYER:')):
+                layers += 1
+            elif comment.strip().startswith((b'thumbnail begin', b'thumbnail_PNG begin')):
+                # A block with a malformed size is still skipped, but its image is never used
+                size = _THUMBNAIL_SIZE_PATTERN.match(comment)
+                thumbnail = (int(size.group(1)) * int(size.group(2)) if size else -1, [])
+            else:
+                kv = _HEADER_PATTERN.match(comment.decode(errors='ignore'))
+                if kv:
+                    header[kv.group(1).lower()] = kv.group(2).strip()
+        elif kind == 'mode':
+            relative = match.group('mode') == b'M83'
+        elif kind == 'reset':
+            last_e = float(match.group('reset'))
+
+    metadata = GcodeMetadata(file_hash='', header=header, layer_count=layers, extrusion=round(extrusion, 2))
+    for key in FILAMENT_TYPE_KEYS:
+        if key in header:
+            metadata.filament = _parse_filament(header[key])
+            break
+    for key in ESTIMATED_TIME_KEYS:
+        if key in header:
+            metadata.estimated_time = _parse_duration(header[key])
+            break
+    for key in LAYER_COUNT_KEYS:
+        if key in header and header[key].isdigit():
+            metadata.layer_count = int(header[key])
+            break
+    thumbnails.pop(-1, None)
+    if thumbnails:
+        try:
+            metadata.thumbnail = base64.b64decode(thumbnails[max(thumbnails)])
+        except ValueError:
+            pass
+    return metadata
+
+
+def analyze_gcode(path: str) -> GcodeMetadata:
+    """Analyze a gcode file (blocking, run in the executor)."""
+    with open(path, 'rb') as file:
+        if not os.fstat(file.fileno()).st_size:
+            return GcodeMetadata(file_hash=hashlib.blake2b(digest_size=16).hexdigest())
+        mm = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    with mm:
+        file_hash = hashlib.blake2b(mm, digest_size=16).hexdigest()
+        if file_hash in _CACHE:
+            _CACHE.move_to_end(file_hash)
+            return _CACHE[file_hash]
+
+        metadata = _scan(mm)
+        metadata.file_hash = file_hash
+
+    _CACHE[file_hash] = metadata
+    while len(_CACHE) > CACHE_SIZE:
+        _CACHE.popitem(last=False)
+    return metadata
@@ -12,11 +12,14 @@ from .sensor_manifest import Description
 
 _LOGGER = logging.getLogger(__name__)
 
+DEFAULT_CONTENT_TYPE = "image/jpeg"  # Of preview urls that don't report an image type (ImageEntity's default)
+
 
 class AnkerMakeImageSensor(AnkerMakeBaseEntity, ImageEntity):
     def __init__(self, coordinator, description, dev_info, hass: HomeAssistant):
         super().__init__(coordinator, description, dev_info)
         self._gcode_preview_url = ''
+        self._thumbnail = None
         self._placeholder_path = hass.config.path('./custom_components/ankermake/assets/placeholder_gcode.png')
         ImageEntity.__init__(self, hass=hass)
         self._attr_image_last_updated = datetime.now()
@@ -24,9 +27,11 @@ class AnkerMakeImageSensor(AnkerMakeBaseEntity, ImageEntity):
     @callback
     def _update_from_anker(self) -> None:
         gcode_preview_url = self.coordinator.ankerdata.image
-        is_new_image = gcode_preview_url != self._gcode_preview_url
+        thumbnail = self.coordinator.ankerdata.thumbnail
+        is_new_image = gcode_preview_url != self._gcode_preview_url or thumbnail is not self._thumbnail
 
         self._gcode_preview_url = gcode_preview_url
+        self._thumbnail = thumbnail
         self._attr_image_url = self._gcode_preview_url
 
         if is_new_image:
@@ -39,10 +44,17 @@ class AnkerMakeImageSensor(AnkerMakeBaseEntity, ImageEntity):
 
     async def async_image(self) -> bytes | None:
         """Return image bytes."""
+        if not self._gcode_preview_url and self._thumbnail:
+            # Thumbnail embedded in the (pre-analyzed) gcode file
+            self._attr_content_type = "image/png"
+            return self._thumbnail
         if not self._gcode_preview_url:
+            self._attr_content_type = "image/png"
             return await self.hass.async_add_executor_job(lambda: open(self._placeholder_path, 'rb').read())
         async with aiohttp.ClientSession() as session:
             async with session.get(self._gcode_preview_url) as response:
+                content_type = response.content_type
+                self._attr_content_type = content_type if content_type.startswith("image/") else DEFAULT_CONTENT_TYPE
                 return await response.read()
 
 
@@ -0,0 +1,78 @@
+"""
+Bounded ingest queue between the websocket reader and the task applying messages to AnkerData.
+
+Messages of idempotent command types (temperatures, print schedule, speeds) only describe the current state, so while
+one is still waiting to be applied a newer message of the same type replaces it. Every other message (print control,
+errors, stop, layers, gcode replies, ...) is edge-triggered and kept. The relative order between kept messages and
+state messages is preserved: a state message never jumps ahead of an edge-triggered message it arrived after.
+"""
+
+import asyncio
+from collections import deque
+
+from .anker_models import CommandTypes
+from .metrics import AnkerMetrics
+
+IDEMPOTENT_TYPES = frozenset({
+    CommandTypes.ZZ_MQTT_CMD_PRINT_SCHEDULE.value,
+    CommandTypes.ZZ_MQTT_CMD_NOZZLE_TEMP.value,
+    CommandTypes.ZZ_MQTT_CMD_HOTBED_TEMP.value,
+    CommandTypes.ZZ_MQTT_CMD_FAN_SPEED.value,
+    CommandTypes.ZZ_MQTT_CMD_PRINT_SPEED.value,
+    CommandTypes.TEMP_MAX_PRINT_SPEED.value,
+})
+INGEST_QUEUE_SIZE = 256
+
+
+class CoalescingQueue:
+    def __init__(self, maxsize: int = INGEST_QUEUE_SIZE, metrics: AnkerMetrics = None):
+        self.maxsize = maxsize
+        self.metrics = metrics or AnkerMetrics()
+        # Each entry is a mutable [command_type, message] slot, so pending state messages can be replaced in place
+        self._items: deque[list] = deque()
+        # Pending slot per idempotent type, only for slots queued after the last edge-triggered message
+        self._latest: dict[int, list] = {}
+        self._event = asyncio.Event()
+
+    def __len__(self):
+        return len(self._items)
+
+    def put(self, message: dict):
+        command_type = message.get("commandType")
+        if command_type in IDEMPOTENT_TYPES:
+            slot = self._latest.get(command_type)
+            if slot is not None:
+                slot[1] = message
+                self.metrics.ingest_coalesced += 1
+                return
+            slot = self._latest[command_type] = [command_type, message]
+        else:
+            slot = [command_type, message]
+            self._latest.clear()
+
+        if len(self._items) >= self.maxsize:
+            self._drop()
+        self._items.append(slot)
+        self.metrics.ingest_max_depth = max(self.metrics.ingest_max_depth, len(self._items))
+        self._event.set()
+
+    def _drop(self):
+        """Drop the oldest state message (or the oldest message if the queue only holds edge-triggered ones)."""
+        for i, slot in enumerate(self._items):
+            if slot[0] in IDEMPOTENT_TYPES:
+                del self._items[i]
+                if self._latest.get(slot[0]) is slot:
+                    del self._latest[slot[0]]
+                break
+        else:
+            self._items.popleft()
+        self.metrics.ingest_dropped += 1
+
+    async def get_batch(self) -> list[dict]:
+        """Wait for messages and return all that are queued (oldest first)."""
+        await self._event.wait()
+        self._event.clear()
+        batch = [message for _, message in self._items]
+        self._items.clear()
+        self._latest.clear()
+        return batch
@@ -0,0 +1,197 @@
+"""
+Per-job summaries, kept in a Store and imported into Home Assistant's long-term statistics.
+
+A summary is made when a job finishes (or is stopped), with the values last seen while it was running (the job fields
+are reset when a job is stopped). The summaries are added to the printer's job store, and every job that ended after
+the last imported hour is turned into hourly rows of four external statistics (cumulative sums, like the energy
+dashboard's meters):
+
+    ankermake:<printer>_jobs             Number of jobs
+    ankermake:<printer>_print_time       Hours
+    ankermake:<printer>_filament_used    Meters
+    ankermake:<printer>_filament_weight  Grams
+
+The store remembers the start of the last imported hour and the sums before it, so an import only computes the rows
+since then (that hour is rewritten, the recorder replaces rows with the same start). Jobs that ended while the recorder
+was unavailable are backfilled in one batch on the next import (on startup and after every job).
+"""
+
+from __future__ import annotations
+
+import logging
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.storage import Store
+from homeassistant.util import slugify
+
+from .ankermake_mqtt_adapter import AnkerData
+from .const import DOMAIN
+
+_LOGGER = logging.getLogger(__name__)
+
+STORAGE_VERSION = 1
+MAX_JOBS = 500  # Summaries kept in the store (the imported sums don't depend on them)
+SAVE_DELAY = 10  # Seconds
+
+# Statistic: (name, unit, value of a summary)
+STATISTICS = {
+    'jobs': ("Print jobs", None, lambda job: 1),
+    'print_time': ("Print time", 'h', lambda job: job['duration'] / 3600),
+    'filament_used': ("Filament used", 'm', lambda job: job['filament_used']),
+    'filament_weight': ("Filament weight", 'g', lambda job: job['filament_weight']),
+}
+
+OUTCOME_FINISHED = 'finished'
+OUTCOME_CANCELLED = 'cancelled'
+
+
+@dataclass
+class JobSummary:
+    job_name: str
+    filament: str
+    start: str  # ISO 8601 (UTC)
+    end: str
+    duration: int  # Seconds
+    filament_used: float  # Meters
+    filament_weight: float  # Grams
+    layers: int
+    outcome: str
+    errors: int
+
+
+def _hour(iso: str) -> datetime:
+    return datetime.fromisoformat(iso).astimezone(timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+def hourly_statistics(jobs: list[dict], since: datetime | None, sums: dict[str, float]) -> tuple[dict, datetime, dict]:
+    """
+    Hourly rows ({'start', 'sum'}) of every statistic for the jobs that ended at or after `since`, continuing from
+    the sums before that hour.
+
+    Returns (rows per statistic, the start of the last hour, the sums before the last hour).
+    """
+    hours: dict[datetime, list[dict]] = {}
+    for job in jobs:
+        hour = _hour(job['end'])
+        if since is None or hour >= since:
+            hours.setdefault(hour, []).append(job)
+
+    rows = {key: [] for key in STATISTICS}
+    sums = dict(sums)
+    before_last = dict(sums)
+    last = since
+    for hour in sorted(hours):
+        before_last = dict(sums)
+        for key, (_, _, value) in STATISTICS.items():
+            sums[key] = sums.get(key, 0) + sum(value(job) or 0 for job in hours[hour])
+            rows[key].append({'start': hour, 'sum': round(sums[key], 3)})
+        last = hour
+    return rows, last, before_last
+
+
+class JobStore:
+    def __init__(self, hass: HomeAssistant, entry_id: str, printer_name: str):
+        self.hass = hass
+        self.printer_name = printer_name
+        self.statistic_prefix = f'{DOMAIN}:{slugify(printer_name)}'
+        self._store = Store(hass, STORAGE_VERSION, f'{DOMAIN}.jobs.{entry_id}')
+        self.jobs: list[dict] = []
+        self.imported_hour: datetime | None = None  # Start of the last imported hour
+        self.imported_sums: dict[str, float] = {}  # Sums before that hour
+
+        # The running job
+        self._job: dict | None = None
+
+    async def async_load(self):
+        data = await self._store.async_load() or {}
+        self.jobs = data.get('jobs', [])
+        if data.get('imported_hour'):
+            self.imported_hour = datetime.fromisoformat(data['imported_hour'])
+        self.imported_sums = data.get('imported_sums', {})
+
+    def _data(self) -> dict:
+        return {
+            'jobs': self.jobs,
+            'imported_hour': self.imported_hour.isoformat() if self.imported_hour else None,
+            'imported_sums': self.imported_sums,
+        }
+
+    @property
+    def active(self) -> bool:
+        return self._job is not None
+
+    def start(self, data: AnkerData):
+        self._job = {'job_name': data.job_name, 'start': datetime.now(timezone.utc), 'errors': 0}
+        self.sample(data)
+
+    def sample(self, data: AnkerData):
+        """Remember the job's values (called for every message, they are reset if the job is stopped)."""
+        if self._job is None or not data.job_name:
+            return
+        job = self._job
+        job['filament'] = data.filament
+        job['elapsed_time'] = data.elapsed_time
+        job['filament_used'] = data.filament_used
+        job['filament_weight'] = data.filament_weight
+        job['layers'] = data.current_layer or data.total_layers
+
+    def error(self):
+        if self._job is not None:
+            self._job['errors'] += 1
+
+    def finish(self, outcome: str, data: AnkerData = None) -> JobSummary | None:
+        """Summarize the running job (with the final values of data, if it still has them) and add it to the store."""
+        if self._job is None:
+            return None
+        if data is not None:
+            self.sample(data)
+        job, self._job = self._job, None
+        end = datetime.now(timezone.utc)
+        duration = job.get('elapsed_time') or int((end - job['start']).total_seconds())
+        summary = JobSummary(
+            job_name=job['job_name'],
+            filament=job.get('filament'),
+            start=job['start'].isoformat(),
+            end=end.isoformat(),
+            duration=duration,
+            filament_used=job.get('filament_used', 0),
+            filament_weight=round(job.get('filament_weight') or 0, 2),
+            layers=job.get('layers', 0),
+            outcome=outcome,
+            errors=job['errors'],
+        )
+        self.jobs.append(asdict(summary))
+        del self.jobs[:-MAX_JOBS]
+        self._store.async_delay_save(self._data, SAVE_DELAY)
+        return summary
+
+    def pending_statistics(self) -> tuple[dict, datetime, dict]:
+        return hourly_statistics(self.jobs, self.imported_hour, self.imported_sums)
+
+    async def async_import_statistics(self):
+        """Import the hourly rows of the jobs since the last import (one batch per statistic)."""
+        if 'recorder' not in self.hass.config.components:
+            return
+        rows, last_hour, before_last = self.pending_statistics()
+        if not rows['jobs']:
+            return
+
+        from homeassistant.components.recorder.statistics import async_add_external_statistics
+
+        for key, (name, unit, _) in STATISTICS.items():
+            metadata = {
+                'has_mean': False,
+                'has_sum': True,
+                'name': f"{self.printer_name} {name.lower()}",
+                'source': DOMAIN,
+                'statistic_id': f'{self.statistic_prefix}_{key}',
+                'unit_of_measurement': unit,
+            }
+            async_add_external_statistics(self.hass, metadata, rows[key])
+        _LOGGER.debug(f"[AnkerMake] Imported {len(rows['jobs'])} hour(s) of job statistics for {self.printer_name}")
+
+        self.imported_hour = last_hour
+        self.imported_sums = before_last
+        await self._store.async_save(self._data())
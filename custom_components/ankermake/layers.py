@@ -0,0 +1,154 @@
+"""
+Per-layer timing of the current (or last) print job, from the ZZ_MQTT_CMD_MODEL_LAYER messages.
+
+The start time of every layer is kept in compact arrays (the duration of a layer is known once the next one starts),
+together with streaming statistics that cost O(1) per layer: the mean, P² estimates of the median and 95th percentile
+and the slowest layers (a bounded heap). The statistics are exposed as attributes of the Layer Time sensor (via the
+%LAYERS= prefix), the arrays through the get_layer_timings service.
+"""
+
+import heapq
+import time
+from array import array
+
+SLOWEST_LAYERS = 5
+
+
+class P2Quantile:
+    """
+    Streaming estimate of a quantile with the P² algorithm (Jain & Chlamtac, 1985): five markers are adjusted per
+    observation, so time and memory are O(1) regardless of the number of observations.
+    """
+    __slots__ = ('p', 'count', 'heights', 'positions', 'desired', 'increments')
+
+    def __init__(self, p: float):
+        self.p = p
+        self.count = 0
+        self.heights: list[float] = []
+        self.positions = [0, 1, 2, 3, 4]
+        self.desired = [0, 2 * p, 4 * p, 2 + 2 * p, 4]
+        self.increments = [0, p / 2, p, (1 + p) / 2, 1]
+
+    def add(self, x: float):
+        self.count += 1
+        q = self.heights
+        if self.count <= 5:
+            q.append(x)
+            q.sort()
+            return
+
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = 0
+            while x >= q[k + 1]:
+                k += 1
+
+        n = self.positions
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self.desired[i] += self.increments[i]
+
+        for i in (1, 2, 3):
+            d = self.desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                # Piecewise parabolic prediction, linear if it would leave the neighbouring markers
+                height = q[i] + d / (n[i + 1] - n[i - 1]) * (
+                        (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i]) +
+                        (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1]))
+                if not q[i - 1] < height < q[i + 1]:
+                    height = q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+                q[i] = height
+                n[i] += d
+
+    @property
+    def value(self) -> float | None:
+        if not self.count:
+            return None
+        if self.count <= 5:
+            # Exact (nearest rank) until the markers are initialized
+            return self.heights[min(int(self.p * self.count), self.count - 1)]
+        return self.heights[2]
+
+
+class LayerTimings:
+    def __init__(self, slowest: int = SLOWEST_LAYERS):
+        self.slowest_size = slowest
+        self.reset()
+
+    def reset(self, job_name: str = ""):
+        self.job_name = job_name
+        self.layers = array('I')  # Layer numbers (layers can be skipped if a message is missed)
+        self.starts = array('d')  # Start timestamps (seconds since the epoch)
+        self.durations = array('f')  # Seconds, one less than the number of layers (the last one is in progress)
+        self.total = 0.0
+        self.p50 = P2Quantile(0.5)
+        self.p95 = P2Quantile(0.95)
+        self._slowest: list[tuple[float, int]] = []  # Min-heap of (duration, layer)
+
+    def record(self, layer: int, job_name: str = "", now: float = None):
+        """Register a layer message, the previous layer ends when a new one starts."""
+        if not layer:
+            return
+        if self.layers:
+            if layer == self.layers[-1]:
+                return  # Repeated message
+            if layer < self.layers[-1]:
+                self.reset()  # A new job (or the job was restarted)
+        now = time.time() if now is None else now
+        if self.layers:
+            duration = now - self.starts[-1]
+            self.durations.append(duration)
+            self.total += duration
+            self.p50.add(duration)
+            self.p95.add(duration)
+            entry = (duration, self.layers[-1])
+            if len(self._slowest) < self.slowest_size:
+                heapq.heappush(self._slowest, entry)
+            elif entry > self._slowest[0]:
+                heapq.heapreplace(self._slowest, entry)
+        if job_name:
+            self.job_name = job_name
+        self.layers.append(layer)
+        self.starts.append(now)
+
+    @property
+    def mean(self) -> float | None:
+        return self.total / len(self.durations) if self.durations else None
+
+    @property
+    def slowest(self) -> list[dict]:
+        return [{'layer': layer, 'duration': round(duration, 1)}
+                for duration, layer in sorted(self._slowest, reverse=True)]
+
+    def value(self, key: str):
+        """A single statistic (for the sensor attributes), durations are rounded to 0.1 seconds."""
+        match key:
+            case 'last':
+                value = self.durations[-1] if self.durations else None
+            case 'mean':
+                value = self.mean
+            case 'p50' | 'p95':
+                value = getattr(self, key).value
+            case 'slowest':
+                return self.slowest
+            case 'count':
+                return len(self.durations)
+            case _:
+                raise KeyError(key)
+        return None if value is None else round(value, 1)
+
+    def as_dict(self) -> dict:
+        return {
+            'job_name': self.job_name,
+            'layers': self.layers.tolist(),
+            'start_times': self.starts.tolist(),
+            'durations': [round(d, 2) for d in self.durations],
+            'stats': {key: self.value(key) for key in ('count', 'last', 'mean', 'p50', 'p95', 'slowest')},
+        }
@@ -11,8 +11,9 @@ from homeassistant.exceptions import ServiceValidationError
 from homeassistant.helpers.device_registry import DeviceInfo
 
 from . import AnkerMakeBaseEntity
-from .ankerctl_util import turn_on_light, turn_off_light, AnkerUtilException
+from .anker_models import AnkerException
 from .const import DOMAIN, MANUFACTURER
+from .control import OptimisticControl
 from .sensor_manifest import Description
 
 _LOGGER = logging.getLogger(__name__)
@@ -21,7 +22,19 @@ _LOGGER = logging.getLogger(__name__)
 class AnkerMakeLightSensor(AnkerMakeBaseEntity, LightEntity):
     _attr_supported_color_modes = {"onoff"}
     _attr_color_mode = "onoff"
-    _attr_is_on = False
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.control = OptimisticControl(
+            "light",
+            send=self.coordinator.ctrl.set_light,
+            on_change=self.async_write_ha_state,
+            initial=False,
+            latency=self.coordinator.metrics.light_latency)
+
+    @property
+    def is_on(self) -> bool:
+        return self.control.state
 
     @callback
     def _update_from_anker(self) -> None:
@@ -30,19 +43,23 @@ class AnkerMakeLightSensor(AnkerMakeBaseEntity, LightEntity):
         else:
             self._attr_available = False
 
-    async def async_turn_on(self, **kwargs):
+    async def _set(self, on: bool):
+        confirmed = self.control.set(on)
+        self.async_write_ha_state()
         try:
-            await turn_on_light(self.coordinator.config['host'])
-            self._attr_is_on = True
-        except AnkerUtilException as e:
+            await confirmed
+        except AnkerException as e:
             raise ServiceValidationError(e)
 
+    async def async_turn_on(self, **kwargs):
+        await self._set(True)
+
     async def async_turn_off(self, **kwargs):
-        try:
-            await turn_off_light(self.coordinator.config['host'])
-            self._attr_is_on = False
-        except AnkerUtilException as e:
-            raise ServiceValidationError(e)
+        await self._set(False)
+
+    async def async_will_remove_from_hass(self) -> None:
+        await super().async_will_remove_from_hass()
+        self.control.cancel()
 
 
 async def async_setup_entry(hass, entry, async_add_entities):
@@ -0,0 +1,201 @@
+"""
+Lightweight performance metrics for the AnkerMake integration.
+
+Everything here is kept in fixed-size structures (preallocated bucket lists and ring buffers), so recording a sample is
+a couple of list operations and memory use does not grow with uptime. Metrics are exposed as (disabled by default)
+diagnostic sensors via the %METRIC= prefix in sensor_manifest.py, and in the config entry diagnostics download.
+
+With the ingest worker (worker.py) a printer's metrics are written in the worker thread and read on the event loop,
+see there why that doesn't need a lock.
+"""
+
+import time
+from bisect import bisect_left
+
+# Upper bounds (in seconds) of the latency buckets, the last bucket catches everything above
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# Maximum number of distinct command types counted separately (the rest are counted as 'other')
+MAX_FRAME_TYPES = 64
+
+
+class Histogram:
+    """A fixed bucket histogram of durations (in seconds)."""
+    __slots__ = ('bounds', 'counts', 'count', 'total', 'max')
+
+    def __init__(self, bounds: tuple = LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, p: float) -> float:
+        """Returns the upper bound of the bucket containing the p-th percentile (an upper estimate)."""
+        if not self.count:
+            return 0.0
+        rank = p / 100 * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def as_dict(self) -> dict:
+        return {
+            'count': self.count,
+            'mean_ms': round(self.mean * 1000, 3),
+            'p50_ms': round(self.percentile(50) * 1000, 3),
+            'p95_ms': round(self.percentile(95) * 1000, 3),
+            'max_ms': round(self.max * 1000, 3),
+            'buckets': {f'le_{bound}': count for bound, count in zip(self.bounds, self.counts)} | {
+                'inf': self.counts[-1]},
+        }
+
+
+class RateMeter:
+    """Counts events per second over a sliding window of one second slots."""
+    __slots__ = ('window', 'slots', 'seconds', 'total')
+
+    def __init__(self, window: int = 60):
+        self.window = window
+        self.slots = [0] * window
+        self.seconds = [0] * window
+        self.total = 0
+
+    def mark(self, n: int = 1):
+        second = int(time.monotonic())
+        i = second % self.window
+        if self.seconds[i] != second:
+            self.seconds[i] = second
+            self.slots[i] = 0
+        self.slots[i] += n
+        self.total += n
+
+    @property
+    def rate(self) -> float:
+        """Average events per second over the window."""
+        oldest = int(time.monotonic()) - self.window
+        return round(sum(n for n, s in zip(self.slots, self.seconds) if s > oldest) / self.window, 2)
+
+
+class ByteCounter:
+    """Bytes on the wire of one connection (after compression, including http/websocket framing, excluding TLS)."""
+    __slots__ = ('bytes_in', 'bytes_out', 'payload_in', 'in_rate', 'out_rate')
+
+    def __init__(self):
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.payload_in = 0  # Decompressed message bytes (if counted by the reader)
+        self.in_rate = RateMeter()
+        self.out_rate = RateMeter()
+
+    def received(self, n: int):
+        self.bytes_in += n
+        self.in_rate.mark(n)
+
+    def sent(self, n: int):
+        self.bytes_out += n
+        self.out_rate.mark(n)
+
+    @property
+    def compression_ratio(self) -> float | None:
+        """Decompressed / received bytes of the messages (None if the payload isn't counted)."""
+        if not self.payload_in or not self.bytes_in:
+            return None
+        return round(self.payload_in / self.bytes_in, 2)
+
+    def as_dict(self) -> dict:
+        return {
+            'bytes_in': self.bytes_in,
+            'bytes_out': self.bytes_out,
+            'in_per_second': self.in_rate.rate,
+            'out_per_second': self.out_rate.rate,
+            'compression_ratio': self.compression_ratio,
+        }
+
+
+# The connections to ankerctl: the message stream (/ws/mqtt), commands (/ws/ctrl) and the api status poll
+TRAFFIC_CONNECTIONS = ('mqtt', 'ctrl', 'api')
+
+
+class AnkerMetrics:
+    """The metrics of a single printer (one instance per coordinator)."""
+
+    def __init__(self):
+        self.frames: dict[int | str, int] = {}
+        self.frame_rate = RateMeter()
+        self.decode_time = Histogram()
+        self.apply_time = Histogram()
+        self.entity_writes = RateMeter()
+        self.ws_reconnects = 0
+        self.api_poll_latency = Histogram()
+        self.ctrl_latency = Histogram()
+        self.light_latency = Histogram()
+        self.video_quality_latency = Histogram()
+        self.ingest_coalesced = 0
+        self.ingest_dropped = 0
+        self.ingest_max_depth = 0
+        self.traffic = {connection: ByteCounter() for connection in TRAFFIC_CONNECTIONS}
+
+    def count_frame(self, command_type):
+        if command_type not in self.frames and len(self.frames) >= MAX_FRAME_TYPES:
+            command_type = 'other'
+        self.frames[command_type] = self.frames.get(command_type, 0) + 1
+        self.frame_rate.mark()
+
+    def value(self, key: str):
+        """
+        Returns a single metric for the diagnostic sensors.
+
+        A key is either an attribute name (frames_total, frame_rate, ...), <histogram>.<stat>, e.g. apply_time.p95_ms, or
+        traffic.<connection|total>.<stat>, e.g. traffic.mqtt.bytes_in
+        """
+        name, _, stat = key.partition('.')
+        match name:
+            case 'traffic':
+                connection, _, stat = stat.partition('.')
+                if connection == 'total':
+                    return sum(counter.as_dict()[stat] for counter in self.traffic.values())
+                return self.traffic[connection].as_dict()[stat]
+            case 'frames_total':
+                return self.frame_rate.total
+            case 'frame_rate' | 'entity_writes':
+                return getattr(self, name).rate
+            case 'entity_writes_total':
+                return self.entity_writes.total
+            case 'frames':
+                # A copy, the attributes of an entity must not change after they were written
+                return dict(self.frames)
+        metric = getattr(self, name)
+        if isinstance(metric, Histogram):
+            return metric.as_dict()[stat]
+        return metric
+
+    def as_dict(self) -> dict:
+        return {
+            'frames': {'total': self.frame_rate.total, 'per_second': self.frame_rate.rate,
+                       'by_command_type': dict(self.frames)},
+            'decode_time': self.decode_time.as_dict(),
+            'apply_time': self.apply_time.as_dict(),
+            'entity_writes': {'total': self.entity_writes.total, 'per_second': self.entity_writes.rate},
+            'ws_reconnects': self.ws_reconnects,
+            'api_poll_latency': self.api_poll_latency.as_dict(),
+            'ctrl_latency': self.ctrl_latency.as_dict(),
+            'light_latency': self.light_latency.as_dict(),
+            'video_quality_latency': self.video_quality_latency.as_dict(),
+            'ingest': {'coalesced': self.ingest_coalesced, 'dropped': self.ingest_dropped,
+                       'max_depth': self.ingest_max_depth},
+            'traffic': {connection: counter.as_dict() for connection, counter in self.traffic.items()},
+        }
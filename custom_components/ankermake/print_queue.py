@@ -0,0 +1,302 @@
+"""
+Fleet print queue: gcode files are queued with constraints, and dispatched to the first suitable idle printer.
+
+There is one queue for all printers (created in async_setup), every config entry registers its coordinator with it.
+The scheduler runs whenever a coordinator updates (every poll), when a job is added and when a print or upload ends:
+for every idle printer (online, Idle, no upload or queued job of its own) it picks the first queued job that matches
+its filament, nozzle type and printer (highest priority first, then first in first out) and streams it with
+start_upload(path, start_print=True). The filament of a printer is only known while it prints (it is derived from the
+job), so the queue remembers the last known filament of every printer.
+
+Job states: queued -> dispatched (uploading, waiting for the print to start) -> printing -> finished, or back to queued
+if the upload fails (failed after MAX_ATTEMPTS), failed if the print doesn't start within DISPATCH_TIMEOUT and stopped
+if the printer is idle again without finishing the job.
+
+The queue, the recent history, the wait times and the utilization of every printer (the fraction of time spent
+preheating or printing while Home Assistant was running) are kept in a Store, so they survive restarts.
+"""
+
+from __future__ import annotations
+
+import logging
+import math
+import time
+import uuid
+from dataclasses import asdict, dataclass, field
+from typing import TYPE_CHECKING
+
+from homeassistant.core import Event, HomeAssistant, callback
+from homeassistant.helpers.storage import Store
+
+from .anker_models import AnkerStatus, FilamentType
+from .const import (DOMAIN,
+                    EVENT_PRINT_STARTED,
+                    EVENT_PRINT_FINISHED,
+                    EVENT_UPLOAD_PROGRESS,
+                    EVENT_QUEUE_DISPATCHED)
+
+if TYPE_CHECKING:
+    from . import AnkerMakeUpdateCoordinator
+
+_LOGGER = logging.getLogger(__name__)
+
+DATA_PRINT_QUEUE = f'{DOMAIN}_print_queue'
+STORAGE_VERSION = 1
+SAVE_DELAY = 5  # Seconds
+MAX_ATTEMPTS = 3
+DISPATCH_TIMEOUT = 600  # Seconds
+MAX_HISTORY = 50  # Ended jobs kept for get_print_queue
+MAX_WAIT_TIMES = 200  # Wait times kept for the statistics
+MAX_TICK = 60  # Seconds, longer gaps (restarts) don't count towards the utilization
+BUSY_STATES = {AnkerStatus.PREHEATING.value, AnkerStatus.PRINTING.value}
+
+STATE_QUEUED = 'queued'
+STATE_DISPATCHED = 'dispatched'
+STATE_PRINTING = 'printing'
+STATE_FINISHED = 'finished'
+STATE_FAILED = 'failed'
+STATE_STOPPED = 'stopped'
+ACTIVE_STATES = {STATE_DISPATCHED, STATE_PRINTING}
+
+
+@dataclass
+class QueuedJob:
+    path: str
+    priority: int = 0
+    filament: str | None = None  # Constraints, None matches any printer
+    nozzle: str | None = None
+    printer: str | None = None  # Entry id
+    id: str = field(default_factory=lambda: uuid.uuid4().hex[:12])
+    state: str = STATE_QUEUED
+    added: float = field(default_factory=time.time)
+    dispatched: float | None = None  # First dispatch (for the wait time)
+    attempt_dispatched: float | None = None  # Dispatch of the current attempt (for DISPATCH_TIMEOUT)
+    ended: float | None = None
+    assigned: str | None = None  # Entry id of the printer it was dispatched to
+    attempts: int = 0
+    error: str | None = None
+
+    def matches(self, entry_id: str, filament: str, nozzle: str) -> bool:
+        return ((self.printer is None or self.printer == entry_id) and
+                (self.filament is None or self.filament.lower() == (filament or '').lower()) and
+                (self.nozzle is None or self.nozzle.lower() == (nozzle or '').lower()))
+
+    def sort_key(self) -> tuple:
+        return -self.priority, self.added
+
+
+def _uploading(coordinator: AnkerMakeUpdateCoordinator) -> bool:
+    return coordinator.upload_task is not None and not coordinator.upload_task.done()
+
+
+class PrintQueue:
+    def __init__(self, hass: HomeAssistant):
+        self.hass = hass
+        self._store = Store(hass, STORAGE_VERSION, f'{DOMAIN}.print_queue')
+        self.jobs: list[QueuedJob] = []  # Queued and active jobs, in dispatch order
+        self.history: list[QueuedJob] = []
+        self.wait_times: list[float] = []
+        self.utilization: dict[str, dict] = {}  # Entry id: {'busy': seconds, 'total': seconds}
+        self.filaments: dict[str, str] = {}  # Entry id: last known filament
+        self._printers: dict[str, AnkerMakeUpdateCoordinator] = {}
+        self._last_tick: dict[str, float] = {}
+        self._listeners = {}  # Entry id: unsubscribe from the coordinator
+        self._unsubscribe = []
+
+    async def async_load(self):
+        data = await self._store.async_load() or {}
+        self.jobs = [QueuedJob(**job) for job in data.get('jobs', [])]
+        self.history = [QueuedJob(**job) for job in data.get('history', [])]
+        self.wait_times = data.get('wait_times', [])
+        self.utilization = data.get('utilization', {})
+        self.filaments = data.get('filaments', {})
+        for event_type in (EVENT_PRINT_STARTED, EVENT_PRINT_FINISHED, EVENT_UPLOAD_PROGRESS):
+            self._unsubscribe.append(self.hass.bus.async_listen(event_type, self._handle_event))
+
+    def _data(self) -> dict:
+        return {
+            'jobs': [asdict(job) for job in self.jobs],
+            'history': [asdict(job) for job in self.history],
+            'wait_times': self.wait_times,
+            'utilization': self.utilization,
+            'filaments': self.filaments,
+        }
+
+    def _save(self):
+        self._store.async_delay_save(self._data, SAVE_DELAY)
+
+    @callback
+    def add_printer(self, coordinator: AnkerMakeUpdateCoordinator):
+        entry_id = coordinator.entry.entry_id
+        self._printers[entry_id] = coordinator
+        self.utilization.setdefault(entry_id, {'busy': 0.0, 'total': 0.0})
+        self._listeners[entry_id] = coordinator.async_add_listener(self.schedule)
+
+    @callback
+    def remove_printer(self, entry_id: str):
+        self._printers.pop(entry_id, None)
+        self._last_tick.pop(entry_id, None)
+        if entry_id in self._listeners:
+            self._listeners.pop(entry_id)()
+
+    @callback
+    def add(self, job: QueuedJob) -> QueuedJob:
+        self._insert(job)
+        self._save()
+        self.schedule()
+        return job
+
+    def _insert(self, job: QueuedJob):
+        # Few jobs are queued at a time, a sorted list keeps dispatch order and listing trivial
+        index = next((i for i, other in enumerate(self.jobs) if other.sort_key() > job.sort_key()), len(self.jobs))
+        self.jobs.insert(index, job)
+
+    @callback
+    def remove(self, job_id: str) -> bool:
+        """Remove a queued job (dispatched jobs are managed by their printer)."""
+        for job in self.jobs:
+            if job.id == job_id and job.state == STATE_QUEUED:
+                self.jobs.remove(job)
+                self._save()
+                return True
+        return False
+
+    def _active_job(self, entry_id: str) -> QueuedJob | None:
+        return next((job for job in self.jobs if job.assigned == entry_id and job.state in ACTIVE_STATES), None)
+
+    def _end(self, job: QueuedJob, state: str, error: str = None):
+        job.state = state
+        job.ended = time.time()
+        job.error = error
+        self.jobs.remove(job)
+        self.history.append(job)
+        del self.history[:-MAX_HISTORY]
+        self._save()
+
+    @callback
+    def schedule(self):
+        """Update the utilization and the active jobs, then dispatch the next jobs to idle printers."""
+        now = time.monotonic()
+        idle = []
+        for entry_id, coordinator in self._printers.items():
+            status = coordinator.ankerdata.status
+            self._tick(entry_id, status, now)
+            filament = coordinator.ankerdata.filament
+            if filament != FilamentType.UNKNOWN.value and self.filaments.get(entry_id) != filament:
+                self.filaments[entry_id] = filament
+                self._save()
+
+            job = self._active_job(entry_id)
+            if job is not None:
+                self._check_active(job, coordinator, status)
+            elif status == AnkerStatus.IDLE.value and not _uploading(coordinator):
+                idle.append((entry_id, coordinator))
+
+        for entry_id, coordinator in idle:
+            filament, nozzle = self.filaments.get(entry_id), coordinator.ankerdata.nozzle_type
+            job = next((job for job in self.jobs if job.state == STATE_QUEUED
+                        and job.matches(entry_id, filament, nozzle)), None)
+            if job is not None:
+                self._dispatch(job, coordinator)
+
+    def _tick(self, entry_id: str, status: str, now: float):
+        last = self._last_tick.get(entry_id)
+        self._last_tick[entry_id] = now
+        if last is None:
+            return
+        elapsed = min(now - last, MAX_TICK)
+        usage = self.utilization[entry_id]
+        usage['total'] += elapsed
+        if status in BUSY_STATES:
+            usage['busy'] += elapsed
+
+    def _check_active(self, job: QueuedJob, coordinator: AnkerMakeUpdateCoordinator, status: str):
+        if job.state == STATE_DISPATCHED and not _uploading(coordinator) and status == AnkerStatus.IDLE.value \
+                and time.time() - job.attempt_dispatched > DISPATCH_TIMEOUT:
+            self._end(job, STATE_FAILED, "The print did not start")
+        elif job.state == STATE_PRINTING and status == AnkerStatus.IDLE.value:
+            self._end(job, STATE_STOPPED)
+
+    def _dispatch(self, job: QueuedJob, coordinator: AnkerMakeUpdateCoordinator):
+        try:
+            coordinator.start_upload(job.path, start_print=True)
+        except Exception as e:
+            _LOGGER.warning(f"[AnkerMake] Failed to dispatch {job.path} to {coordinator.config['printer_name']}: {e}")
+            return
+        job.state = STATE_DISPATCHED
+        job.assigned = coordinator.entry.entry_id
+        job.attempts += 1
+        job.attempt_dispatched = time.time()
+        if job.dispatched is None:
+            job.dispatched = job.attempt_dispatched
+            self.wait_times.append(job.dispatched - job.added)
+            del self.wait_times[:-MAX_WAIT_TIMES]
+        self._save()
+        self.hass.bus.async_fire(EVENT_QUEUE_DISPATCHED, {
+            'entry_id': job.assigned,
+            'printer_name': coordinator.config['printer_name'],
+            'job_id': job.id,
+            'path': job.path,
+            'wait_time': round(job.dispatched - job.added),
+        })
+
+    @callback
+    def _handle_event(self, event: Event):
+        job = self._active_job(event.data.get('entry_id'))
+        if job is None:
+            return
+        if event.event_type == EVENT_UPLOAD_PROGRESS:
+            if event.data.get('path') != job.path or event.data.get('state') not in ('failed', 'cancelled'):
+                return
+            if job.attempts >= MAX_ATTEMPTS or event.data['state'] == 'cancelled':
+                self._end(job, STATE_FAILED, event.data.get('error') or event.data['state'])
+            else:
+                job.state = STATE_QUEUED
+                job.assigned = None
+                self._save()
+        elif event.event_type == EVENT_PRINT_STARTED:
+            job.state = STATE_PRINTING
+            self._save()
+        elif event.event_type == EVENT_PRINT_FINISHED:
+            self._end(job, STATE_FINISHED)
+        self.schedule()
+
+    def value(self, entry_id: str, key: str):
+        """A metric for the sensor attributes: utilization (of the printer), length or wait_time.<stat>."""
+        if key == 'utilization':
+            usage = self.utilization.get(entry_id)
+            return round(usage['busy'] * 100 / usage['total'], 1) if usage and usage['total'] else None
+        if key == 'length':
+            return sum(job.state == STATE_QUEUED for job in self.jobs)
+        if key.startswith('wait_time.'):
+            return self.wait_stats().get(key.split('.', 1)[1])
+        raise KeyError(key)
+
+    def wait_stats(self) -> dict:
+        """Wait times (seconds from queued to dispatched) of the recent jobs."""
+        times = sorted(self.wait_times)
+        if not times:
+            return {'count': 0, 'mean': None, 'p95': None, 'max': None}
+        return {
+            'count': len(times),
+            'mean': round(sum(times) / len(times)),
+            'p95': round(times[min(math.ceil(0.95 * len(times)) - 1, len(times) - 1)]),
+            'max': round(times[-1]),
+        }
+
+    def as_dict(self) -> dict:
+        return {
+            'jobs': [asdict(job) for job in self.jobs],
+            'history': [asdict(job) for job in self.history],
+            'wait_time': self.wait_stats(),
+            'utilization': {self._printers[entry_id].config['printer_name'] if entry_id in self._printers
+                            else entry_id: self.value(entry_id, 'utilization') for entry_id in self.utilization},
+        }
+
+    @callback
+    def close(self):
+        for entry_id in list(self._printers):
+            self.remove_printer(entry_id)
+        for unsubscribe in self._unsubscribe:
+            unsubscribe()
+        self._unsubscribe.clear()
@@ -0,0 +1,93 @@
+"""
+On-demand cProfile instrumentation of the integration's hot paths (message decoding, AnkerData.update and the entity
+state writes incl. _filter_handler).
+
+The hot paths only check PROFILER.active when no profiling session is running, so this costs nothing in production.
+A session is started through the ankermake.profile service, and writes a pstats file and a top-N summary.
+cProfile and pstats are only imported when a session is started.
+
+Hot paths can be nested (an applied message writes the entity states), start() and stop() are counted so the outer
+path stays profiled after the inner one stops. Only the thread that began the session (the event loop) is profiled.
+"""
+
+from __future__ import annotations
+
+import io
+import threading
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import cProfile
+
+SORT_KEYS = ('cumulative', 'tottime', 'ncalls')
+
+
+class HotPathProfiler:
+    def __init__(self):
+        self.active = False
+        self._profile: cProfile.Profile | None = None
+        self._thread: int | None = None
+        self._depth = 0
+
+    def start(self):
+        """Start profiling (called at the beginning of a hot path, only when active)."""
+        if self._profile is None or threading.get_ident() != self._thread:
+            return
+        self._depth += 1
+        if self._depth == 1:
+            self._profile.enable()
+
+    def stop(self):
+        if self._profile is None or threading.get_ident() != self._thread or not self._depth:
+            return
+        self._depth -= 1
+        if not self._depth:
+            self._profile.disable()
+
+    def begin(self):
+        """Begin a profiling session, the hot paths are instrumented until end() is called."""
+        if self.active:
+            raise RuntimeError("A profiling session is already running")
+        import cProfile
+        self._profile = cProfile.Profile()
+        self._thread = threading.get_ident()
+        self._depth = 0
+        self.active = True
+
+    def end(self) -> cProfile.Profile:
+        self.active = False
+        profile, self._profile = self._profile, None
+        if self._depth:
+            profile.disable()
+            self._depth = 0
+        return profile
+
+
+PROFILER = HotPathProfiler()
+
+
+def write_profile(profile: cProfile.Profile, path: str, top: int = 25, sort: str = 'cumulative') -> list[dict]:
+    """Write the pstats file (path) and a text summary (path.txt), returns the top functions. (Blocking)"""
+    import pstats
+    profile.create_stats()
+    if not profile.stats:
+        raise ValueError("Nothing was recorded during the profiling session")
+    stats = pstats.Stats(profile)
+    stats.dump_stats(path)
+
+    summary = io.StringIO()
+    pstats.Stats(profile, stream=summary).sort_stats(sort).print_stats(top)
+    with open(f"{path}.txt", 'w') as file:
+        file.write(summary.getvalue())
+
+    stats.sort_stats(sort)
+    result = []
+    for func in stats.fcn_list[:top]:
+        _, ncalls, tottime, cumtime, _ = stats.stats[func]
+        result.append({
+            'function': pstats.func_std_string(func),
+            'calls': ncalls,
+            'tottime_ms': round(tottime * 1000, 3),
+            'cumtime_ms': round(cumtime * 1000, 3),
+        })
+    return result
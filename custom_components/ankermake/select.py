@@ -10,8 +10,10 @@ from homeassistant.exceptions import ServiceValidationError
 from homeassistant.helpers.device_registry import DeviceInfo
 
 from . import AnkerMakeBaseEntity
-from .ankerctl_util import VideoQuality, set_video_quality, AnkerUtilException
+from .anker_models import AnkerException
+from .ankerctl_util import VideoQuality
 from .const import DOMAIN, MANUFACTURER
+from .control import OptimisticControl
 from .sensor_manifest import Description
 
 _LOGGER = logging.getLogger(__name__)
@@ -19,7 +21,19 @@ _LOGGER = logging.getLogger(__name__)
 
 class AnkerMakeSelectSensor(AnkerMakeBaseEntity, SelectEntity):
     _attr_options = list(VideoQuality.__members__.keys())
-    _attr_current_option = VideoQuality.HD.name
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.control = OptimisticControl(
+            "video quality",
+            send=self.coordinator.ctrl.set_video_quality,
+            on_change=self.async_write_ha_state,
+            initial=VideoQuality.HD,
+            latency=self.coordinator.metrics.video_quality_latency)
+
+    @property
+    def current_option(self) -> str:
+        return self.control.state.name
 
     @callback
     def _update_from_anker(self) -> None:
@@ -29,12 +43,17 @@ class AnkerMakeSelectSensor(AnkerMakeBaseEntity, SelectEntity):
             self._attr_available = False
 
     async def async_select_option(self, option: str) -> None:
+        confirmed = self.control.set(VideoQuality.__members__[option])
+        self.async_write_ha_state()
         try:
-            await set_video_quality(self.coordinator.config['host'], VideoQuality.__members__[option])
-            self._attr_current_option = option
-        except AnkerUtilException as e:
+            await confirmed
+        except AnkerException as e:
             raise ServiceValidationError(e)
 
+    async def async_will_remove_from_hass(self) -> None:
+        await super().async_will_remove_from_hass()
+        self.control.cancel()
+
 
 async def async_setup_entry(hass, entry, async_add_entities):
     coordinator = hass.data[DOMAIN][entry.entry_id]
@@ -11,8 +11,11 @@ from homeassistant.core import callback
 from homeassistant.helpers.device_registry import DeviceInfo
 
 from . import AnkerMakeBaseEntity
-from .const import DOMAIN, MANUFACTURER
-from .sensor_manifest import SENSOR_DESCRIPTIONS, SENSOR_WITH_ATTR_DESCRIPTIONS
+from .const import DOMAIN, MANUFACTURER, CONF_CAPTURED_FIELDS
+from .sensor_manifest import (SENSOR_DESCRIPTIONS,
+                              SENSOR_WITH_ATTR_DESCRIPTIONS,
+                              DIAGNOSTIC_SENSOR_WITH_ATTR_DESCRIPTIONS,
+                              captured_field_description)
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -67,7 +70,17 @@ async def async_setup_entry(hass, entry, async_add_entities):
 
     for description in SENSOR_DESCRIPTIONS:
         entities.append(AnkerMakeSensor(coordinator, description, dev_info))
-    for description, attributes in SENSOR_WITH_ATTR_DESCRIPTIONS:
+    for description, attributes in SENSOR_WITH_ATTR_DESCRIPTIONS + DIAGNOSTIC_SENSOR_WITH_ATTR_DESCRIPTIONS:
         entities.append(AnkerMakeSensorWithAttr(coordinator, description, dev_info, attributes))
 
+    def captured_field_sensor(captured_field: str) -> AnkerMakeSensorWithAttr:
+        command_type, field = captured_field.split('.', 1)
+        description, attributes = captured_field_description(int(command_type), field)
+        return AnkerMakeSensorWithAttr(coordinator, description, dev_info, attributes)
+
+    for captured_field in entry.options.get(CONF_CAPTURED_FIELDS, []):
+        entities.append(captured_field_sensor(captured_field))
+    # Used by the expose_captured_field service to add sensors on demand
+    coordinator.add_captured_field_sensor = lambda f: async_add_entities([captured_field_sensor(f)], True)
+
     async_add_entities(entities, True)
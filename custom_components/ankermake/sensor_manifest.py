@@ -1,6 +1,6 @@
 from homeassistant import const
 from homeassistant.components.binary_sensor import BinarySensorDeviceClass
-from homeassistant.components.sensor import SensorEntityDescription, SensorDeviceClass
+from homeassistant.components.sensor import SensorEntityDescription, SensorDeviceClass, SensorStateClass
 
 from .ankermake_mqtt_adapter import AnkerStatus, FilamentType
 
@@ -39,60 +39,97 @@ BINARY_SENSOR_WITH_ATTR_DESCRIPTIONS = [
             'data_collection': 'ai_data_collection',
         }
     ],
-    # Filetransfer service
-    [Description(
-        key="service_filetransfer",
-        name="Filetransfer Service",
+]
+
+# Services reported by the ankerctl api, entities are created as ankerctl reports them (see api_status.py)
+# Keys and names of the services as they were before the entities were dynamic (keeps their unique ids)
+API_SERVICE_KEYS = {
+    'mqttqueue': 'mqtt',
+}
+API_SERVICE_NAMES = {
+    'filetransfer': 'Filetransfer',
+    'pppp': 'PPPP',
+    'videoqueue': 'Videoqueue',
+    'mqttqueue': 'MQTT',
+}
+
+
+def api_service_description(service: str) -> list:
+    return [Description(
+        key=f"service_{API_SERVICE_KEYS.get(service, service)}",
+        name=f"{API_SERVICE_NAMES.get(service, service.capitalize())} Service",
         icon="mdi:console",
         device_class=BinarySensorDeviceClass.CONNECTIVITY,
         entity_registry_enabled_default=False,  # TODO: Enable this when API is in master
     ),
         {
-            'state': '%SVC_ONLINE=filetransfer',
-            'status': '%SVC_STATE=filetransfer',
+            'state': f'%SVC_ONLINE={service}',
+            'status': f'%SVC_STATE={service}',
             'possible_states': 'api_service_possible_states',
         }
+    ]
+
+
+# Anomaly detectors (see anomaly.py), attributes are set while the anomaly is active
+ANOMALY_BINARY_SENSOR_DESCRIPTIONS = [
+    # Heating failed
+    [Description(
+        key="heating_failed",
+        name="Heating Failed",
+        icon="mdi:thermometer-alert",
+        device_class=BinarySensorDeviceClass.PROBLEM,
+    ),
+        {
+            'state': '%ANOMALY=heating_failed',
+            'heater': '%ANOMALY=heating_failed.heater',
+            'temperature': '%ANOMALY=heating_failed.temperature',
+            'target': '%ANOMALY=heating_failed.target',
+            'rate': '%ANOMALY=heating_failed.rate',
+        }
     ],
-    # PPPPservice
+    # Temperature drop
     [Description(
-        key="service_pppp",
-        name="PPPP Service",
-        icon="mdi:console",
-        device_class=BinarySensorDeviceClass.CONNECTIVITY,
-        entity_registry_enabled_default=False,  # TODO: Enable this when API is in master
+        key="temperature_drop",
+        name="Temperature Drop",
+        icon="mdi:thermometer-chevron-down",
+        device_class=BinarySensorDeviceClass.PROBLEM,
     ),
         {
-            'state': '%SVC_ONLINE=pppp',
-            'status': '%SVC_STATE=pppp',
-            'possible_states': 'api_service_possible_states',
+            'state': '%ANOMALY=temperature_drop',
+            'heater': '%ANOMALY=temperature_drop.heater',
+            'temperature': '%ANOMALY=temperature_drop.temperature',
+            'target': '%ANOMALY=temperature_drop.target',
+            'rate': '%ANOMALY=temperature_drop.rate',
+            'margin': '%ANOMALY=temperature_drop.margin',
         }
     ],
-    # Videoqueue
+    # Thermal overshoot
     [Description(
-        key="service_videoqueue",
-        name="Videoqueue Service",
-        icon="mdi:console",
-        device_class=BinarySensorDeviceClass.CONNECTIVITY,
-        entity_registry_enabled_default=False,  # TODO: Enable this when API is in master
+        key="thermal_overshoot",
+        name="Thermal Overshoot",
+        icon="mdi:thermometer-chevron-up",
+        device_class=BinarySensorDeviceClass.PROBLEM,
     ),
         {
-            'state': '%SVC_ONLINE=videoqueue',
-            'status': '%SVC_STATE=videoqueue',
-            'possible_states': 'api_service_possible_states',
+            'state': '%ANOMALY=thermal_overshoot',
+            'heater': '%ANOMALY=thermal_overshoot.heater',
+            'temperature': '%ANOMALY=thermal_overshoot.temperature',
+            'target': '%ANOMALY=thermal_overshoot.target',
+            'rate': '%ANOMALY=thermal_overshoot.rate',
         }
     ],
-    # mqtt
+    # Print stalled
     [Description(
-        key="service_mqtt",
-        name="MQTT Service",
-        icon="mdi:console",
-        device_class=BinarySensorDeviceClass.CONNECTIVITY,
-        entity_registry_enabled_default=False,  # TODO: Enable this when API is in master
+        key="print_stalled",
+        name="Print Stalled",
+        icon="mdi:timer-sand-paused",
+        device_class=BinarySensorDeviceClass.PROBLEM,
     ),
         {
-            'state': '%SVC_ONLINE=mqttqueue',
-            'status': '%SVC_STATE=mqttqueue',
-            'possible_states': 'api_service_possible_states',
+            'state': '%ANOMALY=print_stalled',
+            'progress': '%ANOMALY=print_stalled.progress',
+            'current_layer': '%ANOMALY=print_stalled.current_layer',
+            'stalled_for': '%ANOMALY=print_stalled.stalled_for',
         }
     ],
 ]
@@ -267,6 +304,7 @@ SENSOR_WITH_ATTR_DESCRIPTIONS = [
             'elapsed_time': '%%TD=elapsed_time',
             'remaining_time': '%%TD=remaining_time',
             'total_print_time': '%%TD=total_time',
+            'slicer_estimated_time': '%%TD=slicer_estimated_time',
             'start_time': 'print_start_time',
             'target_time': 'print_target_time',
             'current_speed': 'current_speed',
@@ -276,6 +314,41 @@ SENSOR_WITH_ATTR_DESCRIPTIONS = [
             'total_layers': 'total_layers',
         }
     ],
+    # Layer Time (duration of the last completed layer)
+    [Description(
+        key="layer_time",
+        name="Layer Time",
+        icon="mdi:layers-triple-outline",
+        device_class=SensorDeviceClass.DURATION,
+        native_unit_of_measurement=const.UnitOfTime.SECONDS,
+    ),
+        {
+            'state': '%LAYERS=last',
+            'mean': '%LAYERS=mean',
+            'p50': '%LAYERS=p50',
+            'p95': '%LAYERS=p95',
+            'slowest_layers': '%LAYERS=slowest',
+            'layers_timed': '%LAYERS=count',
+        }
+    ],
+    # Print queue
+    [Description(
+        key="queue_utilization",
+        name="Utilization",
+        icon="mdi:tray-full",
+        native_unit_of_measurement=const.PERCENTAGE,
+        state_class=SensorStateClass.MEASUREMENT,
+        entity_registry_enabled_default=False,
+    ),
+        {
+            'state': '%QUEUE=utilization',
+            'queue_length': '%QUEUE=length',
+            'wait_time_mean': '%QUEUE=wait_time.mean',
+            'wait_time_p95': '%QUEUE=wait_time.p95',
+            'wait_time_max': '%QUEUE=wait_time.max',
+            'jobs_dispatched': '%QUEUE=wait_time.count',
+        }
+    ],
     # Filament
     # TODO: Move from print job to filament sensor
     [Description(
@@ -304,7 +377,177 @@ SENSOR_WITH_ATTR_DESCRIPTIONS = [
     ),
         {
             'state': 'error_message',
+            'error_code': 'error_code',
             'error_level': 'error_level',
+            'severity': 'error_severity',
+            'subsystem': 'error_subsystem',
+            'category': 'error_category',
+            'details': 'error_details',
+            'occurrences': 'error_occurrences',
+        }
+    ],
+]
+
+# Performance metrics (see metrics.py), %METRIC= keys are passed to AnkerMetrics.value
+DIAGNOSTIC_SENSOR_WITH_ATTR_DESCRIPTIONS = [
+    # Frames received
+    [Description(
+        key="metrics_frames",
+        name="Frames Received",
+        icon="mdi:swap-vertical",
+        entity_category=const.EntityCategory.DIAGNOSTIC,
+        entity_registry_enabled_default=False,
+    ),
+        {
+            'state': '%METRIC=frames_total',
+            'per_second': '%METRIC=frame_rate',
+            'by_command_type': '%METRIC=frames',
+        }
+    ],
+    # Time spent applying frames in AnkerData.update
+    [Description(
+        key="metrics_apply_time",
+        name="Update Time",
+        icon="mdi:timer-sand",
+        native_unit_of_measurement=const.UnitOfTime.MILLISECONDS,
+        entity_category=const.EntityCategory.DIAGNOSTIC,
+        entity_registry_enabled_default=False,
+    ),
+        {
+            'state': '%METRIC=apply_time.p95_ms',
+            'mean': '%METRIC=apply_time.mean_ms',
+            'max': '%METRIC=apply_time.max_ms',
+            'decode_p95': '%METRIC=decode_time.p95_ms',
+            'decode_mean': '%METRIC=decode_time.mean_ms',
+        }
+    ],
+    # Entity writes
+    [Description(
+        key="metrics_entity_writes",
+        name="Entity Writes",
+        icon="mdi:pencil",
+        native_unit_of_measurement="writes/s",
+        entity_category=const.EntityCategory.DIAGNOSTIC,
+        entity_registry_enabled_default=False,
+    ),
+        {
+            'state': '%METRIC=entity_writes',
+            'total': '%METRIC=entity_writes_total',
+        }
+    ],
+    # Websocket reconnects
+    [Description(
+        key="metrics_ws_reconnects",
+        name="Websocket Reconnects",
+        icon="mdi:connection",
+        entity_category=const.EntityCategory.DIAGNOSTIC,
+        entity_registry_enabled_default=False,
+    ),
+        {
+            'state': '%METRIC=ws_reconnects',
+        }
+    ],
+    # API poll latency
+    [Description(
+        key="metrics_api_latency",
+        name="API Poll Latency",
+        icon="mdi:timer-outline",
+        native_unit_of_measurement=const.UnitOfTime.MILLISECONDS,
+        entity_category=const.EntityCategory.DIAGNOSTIC,
+        entity_registry_enabled_default=False,
+    ),
+        {
+            'state': '%METRIC=api_poll_latency.p95_ms',
+            'mean': '%METRIC=api_poll_latency.mean_ms',
+            'max': '%METRIC=api_poll_latency.max_ms',
+        }
+    ],
+    # Control command latency
+    [Description(
+        key="metrics_ctrl_latency",
+        name="Control Latency",
+        icon="mdi:timer-outline",
+        native_unit_of_measurement=const.UnitOfTime.MILLISECONDS,
+        entity_category=const.EntityCategory.DIAGNOSTIC,
+        entity_registry_enabled_default=False,
+    ),
+        {
+            'state': '%METRIC=ctrl_latency.p95_ms',
+            'mean': '%METRIC=ctrl_latency.mean_ms',
+            'max': '%METRIC=ctrl_latency.max_ms',
+            'count': '%METRIC=ctrl_latency.count',
+            'light_p95': '%METRIC=light_latency.p95_ms',
+            'light_count': '%METRIC=light_latency.count',
+            'video_quality_p95': '%METRIC=video_quality_latency.p95_ms',
+            'video_quality_count': '%METRIC=video_quality_latency.count',
+        }
+    ],
+    # Ingest queue
+    [Description(
+        key="metrics_ingest",
+        name="Ingest Coalesced",
+        icon="mdi:tray-full",
+        entity_category=const.EntityCategory.DIAGNOSTIC,
+        entity_registry_enabled_default=False,
+    ),
+        {
+            'state': '%METRIC=ingest_coalesced',
+            'dropped': '%METRIC=ingest_dropped',
+            'max_depth': '%METRIC=ingest_max_depth',
+        }
+    ],
+    # Traffic to and from ankerctl (after compression)
+    [Description(
+        key="metrics_bytes_in",
+        name="Bytes Received",
+        icon="mdi:download-network",
+        device_class=SensorDeviceClass.DATA_SIZE,
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        native_unit_of_measurement=const.UnitOfInformation.BYTES,
+        entity_category=const.EntityCategory.DIAGNOSTIC,
+        entity_registry_enabled_default=False,
+    ),
+        {
+            'state': '%METRIC=traffic.total.bytes_in',
+            'per_second': '%METRIC=traffic.total.in_per_second',
+            'mqtt': '%METRIC=traffic.mqtt.bytes_in',
+            'mqtt_compression_ratio': '%METRIC=traffic.mqtt.compression_ratio',
+            'ctrl': '%METRIC=traffic.ctrl.bytes_in',
+            'api': '%METRIC=traffic.api.bytes_in',
+        }
+    ],
+    [Description(
+        key="metrics_bytes_out",
+        name="Bytes Sent",
+        icon="mdi:upload-network",
+        device_class=SensorDeviceClass.DATA_SIZE,
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        native_unit_of_measurement=const.UnitOfInformation.BYTES,
+        entity_category=const.EntityCategory.DIAGNOSTIC,
+        entity_registry_enabled_default=False,
+    ),
+        {
+            'state': '%METRIC=traffic.total.bytes_out',
+            'per_second': '%METRIC=traffic.total.out_per_second',
+            'mqtt': '%METRIC=traffic.mqtt.bytes_out',
+            'ctrl': '%METRIC=traffic.ctrl.bytes_out',
+            'api': '%METRIC=traffic.api.bytes_out',
         }
     ],
 ]
+
+
+def captured_field_description(command_type: int, field: str) -> list:
+    """Sensor for a field of a captured (unhandled) command type, see capture.py and CONF_CAPTURED_FIELDS"""
+    return [Description(
+        key=f"captured_{command_type}_{field.replace('.', '_')}",
+        name=f"{command_type} {field}",
+        icon="mdi:help-network",
+        entity_category=const.EntityCategory.DIAGNOSTIC,
+    ),
+        {
+            'state': f'%CAPTURE={command_type}.{field}',
+            'command_type': f'={command_type}',
+            'field': f'={field}',
+        }
+    ]
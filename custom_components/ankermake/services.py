@@ -0,0 +1,262 @@
+"""
+AnkerMake services for Home Assistant.
+
+Services are registered once for the domain (in async_setup) and target a printer through its device, which is mapped
+back to the coordinator of the config entry that owns it.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+from datetime import datetime
+from typing import TYPE_CHECKING
+
+import voluptuous as vol
+from homeassistant.const import ATTR_DEVICE_ID
+from homeassistant.core import HomeAssistant, ServiceCall, SupportsResponse
+from homeassistant.exceptions import ServiceValidationError
+from homeassistant.helpers import config_validation as cv, device_registry as dr, entity_registry as er
+
+from .ankerctl_util import AnkerUtilException
+from .const import DOMAIN, CONF_CAPTURED_FIELDS, TELEMETRY_DIR
+from .print_queue import DATA_PRINT_QUEUE, QueuedJob
+from .profiler import PROFILER, SORT_KEYS, write_profile
+from .telemetry import COLUMNS, read_telemetry
+
+if TYPE_CHECKING:
+    from . import AnkerMakeUpdateCoordinator
+
+_LOGGER = logging.getLogger(__name__)
+
+SERVICE_SEND_GCODE = "send_gcode"
+SERVICE_UPLOAD_GCODE = "upload_gcode"
+SERVICE_CANCEL_UPLOAD = "cancel_upload"
+SERVICE_ANALYZE_GCODE = "analyze_gcode"
+SERVICE_PROFILE = "profile"
+SERVICE_GET_CAPTURED = "get_captured"
+SERVICE_EXPOSE_CAPTURED_FIELD = "expose_captured_field"
+SERVICE_LOAD_TELEMETRY = "load_telemetry"
+SERVICE_GET_LAYER_TIMINGS = "get_layer_timings"
+SERVICE_QUEUE_ADD = "queue_add"
+SERVICE_QUEUE_REMOVE = "queue_remove"
+SERVICE_GET_PRINT_QUEUE = "get_print_queue"
+
+SEND_GCODE_SCHEMA = vol.Schema({
+    vol.Required(ATTR_DEVICE_ID): cv.string,
+    vol.Required("gcode"): vol.Any(cv.string, [cv.string]),
+    vol.Optional("timeout", default=10): vol.All(vol.Coerce(float), vol.Range(min=1, max=300)),
+})
+
+UPLOAD_GCODE_SCHEMA = vol.Schema({
+    vol.Required(ATTR_DEVICE_ID): cv.string,
+    vol.Required("path"): cv.string,
+    vol.Optional("start_print", default=False): cv.boolean,
+})
+
+ANALYZE_GCODE_SCHEMA = vol.Schema({
+    vol.Required(ATTR_DEVICE_ID): cv.string,
+    vol.Required("path"): cv.string,
+})
+
+QUEUE_ADD_SCHEMA = vol.Schema({
+    vol.Required("path"): cv.string,
+    vol.Optional("priority", default=0): vol.Coerce(int),
+    vol.Optional("filament"): cv.string,
+    vol.Optional("nozzle"): cv.string,
+    vol.Optional(ATTR_DEVICE_ID): cv.string,
+})
+
+QUEUE_REMOVE_SCHEMA = vol.Schema({
+    vol.Required("job_id"): cv.string,
+})
+
+PROFILE_SCHEMA = vol.Schema({
+    vol.Optional("duration", default=30): vol.All(vol.Coerce(int), vol.Range(min=1, max=600)),
+    vol.Optional("top", default=25): vol.All(vol.Coerce(int), vol.Range(min=1, max=200)),
+    vol.Optional("sort", default="cumulative"): vol.In(SORT_KEYS),
+})
+
+EXPOSE_CAPTURED_FIELD_SCHEMA = vol.Schema({
+    vol.Required(ATTR_DEVICE_ID): cv.string,
+    vol.Required("command_type"): vol.Coerce(int),
+    vol.Required("field"): cv.string,
+    vol.Optional("expose", default=True): cv.boolean,
+})
+
+LOAD_TELEMETRY_SCHEMA = vol.Schema({
+    vol.Required("paths"): vol.All(cv.ensure_list, [cv.string]),
+    vol.Optional("columns"): vol.All(cv.ensure_list, [vol.In([name for name, _ in COLUMNS])]),
+})
+
+DEVICE_SCHEMA = vol.Schema({
+    vol.Required(ATTR_DEVICE_ID): cv.string,
+})
+
+
+def get_coordinator(hass: HomeAssistant, call: ServiceCall) -> AnkerMakeUpdateCoordinator:
+    """Returns the coordinator of the printer targeted by the service call."""
+    return get_device_coordinator(hass, call.data[ATTR_DEVICE_ID])
+
+
+def get_device_coordinator(hass: HomeAssistant, device_id: str) -> AnkerMakeUpdateCoordinator:
+    """Returns the coordinator of a printer's device."""
+    device = dr.async_get(hass).async_get(device_id)
+    if device is None:
+        raise ServiceValidationError(f"Unknown device: {device_id}")
+    for entry_id in device.config_entries:
+        if entry_id in hass.data.get(DOMAIN, {}):
+            return hass.data[DOMAIN][entry_id]
+    raise ServiceValidationError(f"{device.name} is not an AnkerMake printer")
+
+
+def parse_gcode(gcode: str | list[str]) -> list[str]:
+    """Split gcode into single commands, dropping comments and empty lines."""
+    if isinstance(gcode, str):
+        gcode = gcode.splitlines()
+    lines = [line.split(';', 1)[0].strip() for line in gcode]
+    return [line for line in lines if line]
+
+
+async def async_setup_services(hass: HomeAssistant):
+    async def send_gcode(call: ServiceCall):
+        coordinator = get_coordinator(hass, call)
+        lines = parse_gcode(call.data["gcode"])
+        if not lines:
+            raise ServiceValidationError("No gcode to send")
+
+        results = await coordinator.ctrl.send_gcode(lines, timeout=call.data["timeout"])
+        failed = [r for r in results if r['error']]
+        if failed:
+            _LOGGER.warning(f"[AnkerMake] {len(failed)}/{len(results)} gcode commands failed "
+                            f"(first: {failed[0]['gcode']}: {failed[0]['error']})")
+        return {'results': results}
+
+    async def upload(call: ServiceCall):
+        coordinator = get_coordinator(hass, call)
+        path = call.data["path"]
+        if not hass.config.is_allowed_path(path):
+            raise ServiceValidationError(f"Access to {path} is not allowed (see allowlist_external_dirs)")
+        try:
+            coordinator.start_upload(path, call.data["start_print"])
+        except AnkerUtilException as e:
+            raise ServiceValidationError(e)
+
+    async def analyze(call: ServiceCall):
+        coordinator = get_coordinator(hass, call)
+        path = call.data["path"]
+        if not hass.config.is_allowed_path(path):
+            raise ServiceValidationError(f"Access to {path} is not allowed (see allowlist_external_dirs)")
+        try:
+            metadata = await coordinator.async_analyze_gcode(path)
+        except (OSError, ValueError) as e:
+            raise ServiceValidationError(f"Failed to analyze {path}: {e}")
+        return metadata.as_dict()
+
+    async def cancel_upload(call: ServiceCall):
+        if not get_coordinator(hass, call).cancel_upload():
+            raise ServiceValidationError("There is no upload in progress for this printer")
+
+    async def profile(call: ServiceCall):
+        try:
+            PROFILER.begin()
+        except RuntimeError as e:
+            raise ServiceValidationError(e)
+        try:
+            await asyncio.sleep(call.data["duration"])
+        finally:
+            result = PROFILER.end()
+        path = hass.config.path(f"{DOMAIN}_profile_{datetime.now():%Y%m%d_%H%M%S}.pstats")
+        try:
+            top = await hass.async_add_executor_job(write_profile, result, path, call.data["top"], call.data["sort"])
+        except ValueError as e:
+            raise ServiceValidationError(e)
+        _LOGGER.info(f"[AnkerMake] Profile written to {path} (summary: {path}.txt)")
+        return {'path': path, 'summary_path': f"{path}.txt", 'top': top}
+
+    async def get_captured(call: ServiceCall):
+        coordinator = get_coordinator(hass, call)
+        return {'command_types': {str(k): v for k, v in coordinator.ankerdata._capture.as_dict().items()}}
+
+    async def expose_captured_field(call: ServiceCall):
+        coordinator = get_coordinator(hass, call)
+        entry = coordinator.entry
+        captured_field = f"{call.data['command_type']}.{call.data['field']}"
+        captured_fields = list(entry.options.get(CONF_CAPTURED_FIELDS, []))
+
+        if call.data["expose"]:
+            if captured_field in captured_fields:
+                return
+            captured_fields.append(captured_field)
+            if coordinator.add_captured_field_sensor:
+                coordinator.add_captured_field_sensor(captured_field)
+        else:
+            if captured_field not in captured_fields:
+                raise ServiceValidationError(f"{captured_field} is not exposed")
+            captured_fields.remove(captured_field)
+            registry = er.async_get(hass)
+            key = f"captured_{call.data['command_type']}_{call.data['field'].replace('.', '_')}"
+            entity_id = registry.async_get_entity_id(
+                "sensor", DOMAIN, f"{coordinator.config['printer_name']}_{key}")
+            if entity_id:
+                registry.async_remove(entity_id)
+
+        hass.config_entries.async_update_entry(entry, options={**entry.options, CONF_CAPTURED_FIELDS: captured_fields})
+
+    async def get_layer_timings(call: ServiceCall):
+        return get_coordinator(hass, call).ankerdata._layer_timings.as_dict()
+
+    async def load_telemetry(call: ServiceCall):
+        telemetry_dir = os.path.realpath(hass.config.path(TELEMETRY_DIR))
+        jobs = []
+        for path in call.data["paths"]:
+            # Relative paths are relative to the telemetry directory (e.g. <printer>/<file>.amtl)
+            path = os.path.realpath(os.path.join(telemetry_dir, path))
+            if not path.startswith(telemetry_dir + os.sep) and not hass.config.is_allowed_path(path):
+                raise ServiceValidationError(f"Access to {path} is not allowed (see allowlist_external_dirs)")
+            try:
+                job = await hass.async_add_executor_job(read_telemetry, path, call.data.get("columns"))
+            except (OSError, ValueError) as e:
+                raise ServiceValidationError(f"Failed to load {path}: {e}")
+            jobs.append({'path': path, **job})
+        return {'jobs': jobs}
+
+    async def queue_add(call: ServiceCall):
+        path = call.data["path"]
+        if not hass.config.is_allowed_path(path):
+            raise ServiceValidationError(f"Access to {path} is not allowed (see allowlist_external_dirs)")
+        printer = get_coordinator(hass, call).entry.entry_id if call.data.get(ATTR_DEVICE_ID) else None
+        job = hass.data[DATA_PRINT_QUEUE].add(QueuedJob(path=path, priority=call.data["priority"],
+                                                        filament=call.data.get("filament"),
+                                                        nozzle=call.data.get("nozzle"), printer=printer))
+        return {'job_id': job.id}
+
+    async def queue_remove(call: ServiceCall):
+        if not hass.data[DATA_PRINT_QUEUE].remove(call.data["job_id"]):
+            raise ServiceValidationError(f"No queued job with id {call.data['job_id']}")
+
+    async def get_print_queue(call: ServiceCall):
+        return hass.data[DATA_PRINT_QUEUE].as_dict()
+
+    hass.services.async_register(DOMAIN, SERVICE_SEND_GCODE, send_gcode, schema=SEND_GCODE_SCHEMA,
+                                 supports_response=SupportsResponse.OPTIONAL)
+    hass.services.async_register(DOMAIN, SERVICE_UPLOAD_GCODE, upload, schema=UPLOAD_GCODE_SCHEMA)
+    hass.services.async_register(DOMAIN, SERVICE_CANCEL_UPLOAD, cancel_upload, schema=DEVICE_SCHEMA)
+    hass.services.async_register(DOMAIN, SERVICE_ANALYZE_GCODE, analyze, schema=ANALYZE_GCODE_SCHEMA,
+                                 supports_response=SupportsResponse.OPTIONAL)
+    hass.services.async_register(DOMAIN, SERVICE_PROFILE, profile, schema=PROFILE_SCHEMA,
+                                 supports_response=SupportsResponse.OPTIONAL)
+    hass.services.async_register(DOMAIN, SERVICE_GET_CAPTURED, get_captured, schema=DEVICE_SCHEMA,
+                                 supports_response=SupportsResponse.ONLY)
+    hass.services.async_register(DOMAIN, SERVICE_EXPOSE_CAPTURED_FIELD, expose_captured_field,
+                                 schema=EXPOSE_CAPTURED_FIELD_SCHEMA)
+    hass.services.async_register(DOMAIN, SERVICE_GET_LAYER_TIMINGS, get_layer_timings, schema=DEVICE_SCHEMA,
+                                 supports_response=SupportsResponse.ONLY)
+    hass.services.async_register(DOMAIN, SERVICE_LOAD_TELEMETRY, load_telemetry, schema=LOAD_TELEMETRY_SCHEMA,
+                                 supports_response=SupportsResponse.ONLY)
+    hass.services.async_register(DOMAIN, SERVICE_QUEUE_ADD, queue_add, schema=QUEUE_ADD_SCHEMA,
+                                 supports_response=SupportsResponse.OPTIONAL)
+    hass.services.async_register(DOMAIN, SERVICE_QUEUE_REMOVE, queue_remove, schema=QUEUE_REMOVE_SCHEMA)
+    hass.services.async_register(DOMAIN, SERVICE_GET_PRINT_QUEUE, get_print_queue,
+                                 supports_response=SupportsResponse.ONLY)
@@ -0,0 +1,90 @@
+"""
+Streams AnkerData to websocket subscribers (the ankermake/subscribe command, see websocket_api.py).
+
+A subscriber gets a snapshot of the printer's fields ({"snapshot": {...}}) when it subscribes, and then only the
+fields that changed ({"delta": {...}}). Changes are coalesced per animation frame: the first change after a flush
+schedules the next one FRAME_INTERVAL later, so a burst of messages results in a single delta. The delta is computed
+and serialized once per printer and frame, only the message id differs per subscriber.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from dataclasses import fields
+from typing import Callable
+
+from homeassistant.helpers.json import json_dumps
+
+from .ankermake_mqtt_adapter import AnkerData
+
+FRAME_INTERVAL = 1 / 60  # Seconds
+EXCLUDED_FIELDS = {'thumbnail'}  # Served by the image entity
+DERIVED_FIELDS = ('status', 'online', 'printing', 'filament_weight', 'in_error_state')
+FIELDS = tuple(f.name for f in fields(AnkerData) if not f.name.startswith('_') and f.name not in EXCLUDED_FIELDS)
+
+
+def _event_message(msg_id: int, event: str) -> str:
+    return f'{{"id":{msg_id},"type":"event","event":{event}}}'
+
+
+class AnkerDataBroadcaster:
+    def __init__(self, ankerdata: AnkerData, frame_interval: float = FRAME_INTERVAL):
+        self.ankerdata = ankerdata
+        self.frame_interval = frame_interval
+        self._subscribers: dict[int, tuple[Callable[[str], None], int]] = {}
+        self._state: dict = {}  # As last sent to the subscribers
+        self._flush_handle: asyncio.TimerHandle | None = None
+        self._next_key = 0
+
+    def __len__(self) -> int:
+        return len(self._subscribers)
+
+    def snapshot(self) -> dict:
+        data = self.ankerdata
+        state = {name: getattr(data, name) for name in FIELDS}
+        for name in DERIVED_FIELDS:
+            state[name] = getattr(data, name)
+        return state
+
+    def subscribe(self, send: Callable[[str], None], msg_id: int) -> Callable[[], None]:
+        """Sends the snapshot and registers the subscriber for deltas, returns the unsubscribe callback."""
+        state = self.snapshot()
+        if not self._subscribers:
+            self._state = state
+        send(_event_message(msg_id, json_dumps({'snapshot': state})))
+
+        key = self._next_key
+        self._next_key += 1
+        self._subscribers[key] = (send, msg_id)
+
+        def unsubscribe():
+            self._subscribers.pop(key, None)
+            if not self._subscribers and self._flush_handle:
+                self._flush_handle.cancel()
+                self._flush_handle = None
+
+        return unsubscribe
+
+    def changed(self):
+        """AnkerData changed, schedules a delta for the next frame (free if nobody is subscribed)."""
+        if not self._subscribers or self._flush_handle:
+            return
+        self._flush_handle = asyncio.get_running_loop().call_later(self.frame_interval, self.flush)
+
+    def flush(self):
+        self._flush_handle = None
+        state = self.snapshot()
+        previous = self._state
+        delta = {name: value for name, value in state.items() if name not in previous or previous[name] != value}
+        self._state = state
+        if not delta:
+            return
+        event = json_dumps({'delta': delta})
+        for send, msg_id in list(self._subscribers.values()):
+            send(_event_message(msg_id, event))
+
+    def close(self):
+        self._subscribers.clear()
+        if self._flush_handle:
+            self._flush_handle.cancel()
+            self._flush_handle = None
@@ -0,0 +1,233 @@
+"""
+Per-job telemetry files, in a compact columnar format (one file per print job).
+
+While a job is running, a sample of the columns below is taken every SAMPLE_INTERVAL seconds. Samples are buffered
+per column and written as a chunk every CHUNK_SAMPLES samples, so the file is streamed during the job and finishing it
+only writes the last (partial) chunk. Writes go through the executor and are chained, so chunks land in order.
+
+File layout (.amtl):
+    b'AMTL' | version (u8) | header length (u32) | header (json) | chunk*
+    chunk: compressed length (u32) | zlib(sample count (varint) | column* )
+    column: the zigzag varint encoded deltas of the scaled values (the first delta of a chunk is relative to 0)
+
+Every chunk decodes on its own, so a file cut short (e.g. a restart mid-job) only loses the samples of the last chunk.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import re
+import struct
+import time
+import zlib
+from datetime import datetime
+from typing import Awaitable, Callable
+
+_LOGGER = logging.getLogger(__name__)
+
+MAGIC = b'AMTL'
+FORMAT_VERSION = 1
+FILE_EXTENSION = '.amtl'
+SAMPLE_INTERVAL = 5  # Seconds
+CHUNK_SAMPLES = 120  # 10 minutes of samples per chunk
+
+# (AnkerData attribute, scale): values are stored as round(value * scale)
+COLUMNS = (
+    ('hotend_temp', 100),
+    ('target_hotend_temp', 100),
+    ('bed_temp', 100),
+    ('target_bed_temp', 100),
+    ('current_speed', 1),
+    ('fan_speed', 1),
+    ('current_layer', 1),
+    ('progress', 100),
+)
+TIME_COLUMN = ('time', 1000)  # Milliseconds since the job started
+
+
+def _encode_column(values: list[int], out: bytearray):
+    previous = 0
+    for value in values:
+        delta = value - previous
+        previous = value
+        zigzag = (delta << 1) ^ (delta >> 63)
+        while zigzag > 0x7F:
+            out.append(zigzag & 0x7F | 0x80)
+            zigzag >>= 7
+        out.append(zigzag)
+
+
+def _read_varint(data: bytes, pos: int) -> tuple[int, int]:
+    result = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+
+
+def encode_chunk(columns: list[list[int]]) -> bytes:
+    out = bytearray()
+    count = len(columns[0]) if columns else 0
+    _encode_column([count], out)
+    for values in columns:
+        _encode_column(values, out)
+    compressed = zlib.compress(bytes(out), 9)
+    return struct.pack('<I', len(compressed)) + compressed
+
+
+def decode_chunk(data: bytes, columns: int) -> list[list[int]]:
+    count, pos = _read_varint(data, 0)
+    count >>= 1
+    decoded = []
+    for _ in range(columns):
+        values, value = [], 0
+        for _ in range(count):
+            zigzag, pos = _read_varint(data, pos)
+            value += (zigzag >> 1) ^ -(zigzag & 1)
+            values.append(value)
+        decoded.append(values)
+    return decoded
+
+
+def encode_header(header: dict) -> bytes:
+    data = json.dumps(header).encode()
+    return MAGIC + struct.pack('<BI', FORMAT_VERSION, len(data)) + data
+
+
+def read_telemetry(path: str, columns: list[str] = None) -> dict:
+    """Returns {'header': dict, 'columns': {name: [value, ...]}} of a telemetry file (optionally only some columns)."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    if data[:4] != MAGIC:
+        raise ValueError(f"{path} is not an AnkerMake telemetry file")
+    version, header_length = struct.unpack_from('<BI', data, 4)
+    if version != FORMAT_VERSION:
+        raise ValueError(f"Unsupported telemetry format version {version}")
+    pos = 9 + header_length
+    header = json.loads(data[9:pos])
+
+    names = [name for name, _ in header['columns']]
+    values = [[] for _ in names]
+    while pos + 4 <= len(data):
+        length, = struct.unpack_from('<I', data, pos)
+        chunk = data[pos + 4:pos + 4 + length]
+        if len(chunk) < length:
+            break  # Incomplete last chunk
+        pos += 4 + length
+        for column, decoded in zip(values, decode_chunk(zlib.decompress(chunk), len(names))):
+            column.extend(decoded)
+
+    wanted = set(columns or names) | {TIME_COLUMN[0]}
+    return {
+        'header': header,
+        'columns': {name: [v / scale for v in column] if scale != 1 else column
+                    for (name, scale), column in zip(header['columns'], values) if name in wanted},
+    }
+
+
+def telemetry_filename(job_name: str, started: datetime) -> str:
+    return f"{started:%Y%m%d_%H%M%S}_{re.sub(r'[^A-Za-z0-9_-]+', '_', job_name)[:64]}{FILE_EXTENSION}"
+
+
+class TelemetryRecorder:
+    """Records the telemetry of the running job of a single printer (one instance per coordinator)."""
+
+    def __init__(self, directory: str, executor: Callable[..., Awaitable], interval: float = SAMPLE_INTERVAL,
+                 chunk_samples: int = CHUNK_SAMPLES):
+        """executor: runs a blocking function (hass.async_add_executor_job)"""
+        self.directory = directory
+        self._executor = executor
+        self.interval = interval
+        self.chunk_samples = chunk_samples
+
+        self.job_name: str | None = None
+        self.path: str | None = None
+        self._started = 0.0
+        self._last_sample = 0.0
+        self._buffer: list[list[int]] = []
+        self._writes: asyncio.Task | None = None
+
+    @property
+    def recording(self) -> bool:
+        return self.job_name is not None
+
+    def start(self, job_name: str, header: dict = None) -> str:
+        """Start recording a job (finishes the previous one), returns the path of the telemetry file."""
+        if self.recording:
+            self.finish()
+        self.job_name = job_name
+        self._started = time.monotonic()
+        self._last_sample = -self.interval
+        self._buffer = [[] for _ in range(len(COLUMNS) + 1)]
+        started = datetime.now().astimezone()
+        self.path = os.path.join(self.directory, telemetry_filename(job_name, started))
+        self._write(encode_header({
+            **(header or {}),
+            'job_name': job_name,
+            'started': started.isoformat(),
+            'interval': self.interval,
+            'columns': [TIME_COLUMN, *COLUMNS],
+        }), create=True)
+        return self.path
+
+    def sample(self, data, now: float = None):
+        """Take a sample of AnkerData if a job is being recorded and the sample interval has passed."""
+        if not self.recording:
+            return
+        now = time.monotonic() if now is None else now
+        if now - self._started - self._last_sample < self.interval:
+            return
+        self._last_sample = now - self._started
+        self._buffer[0].append(round(self._last_sample * TIME_COLUMN[1]))
+        for column, (attr, scale) in zip(self._buffer[1:], COLUMNS):
+            column.append(round((getattr(data, attr) or 0) * scale))
+        if len(self._buffer[0]) >= self.chunk_samples:
+            self._flush()
+
+    def finish(self) -> str | None:
+        """Stop recording, writes the remaining samples. Returns the path of the telemetry file."""
+        if not self.recording:
+            return None
+        self._flush()
+        self.job_name = None
+        return self.path
+
+    def _flush(self):
+        if self._buffer[0]:
+            self._write(encode_chunk(self._buffer))
+            self._buffer = [[] for _ in self._buffer]
+
+    def _write(self, data: bytes, create: bool = False):
+        previous = self._writes
+        path = self.path
+
+        async def write():
+            if previous is not None:
+                await previous
+            try:
+                await self._executor(_write_file, path, data, create)
+            except OSError as e:
+                # The samples of this write are lost, the recording goes on (e.g. once there is disk space again)
+                _LOGGER.error(f"[AnkerMake] Failed to write telemetry to {path}: {e}")
+
+        self._writes = asyncio.create_task(write())
+
+    async def close(self):
+        """Finish the job being recorded and wait for the pending writes (never raises, it runs on unload)."""
+        self.finish()
+        if self._writes is not None:
+            try:
+                await self._writes
+            except Exception as e:
+                _LOGGER.error(f"[AnkerMake] Failed to write telemetry to {self.path}: {e}")
+
+
+def _write_file(path: str, data: bytes, create: bool):
+    if create:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb' if create else 'ab') as f:
+        f.write(data)
@@ -0,0 +1,266 @@
+"""
+Transports delivering the printer's mqtt messages to the coordinator.
+
+- WebsocketTransport: ankerctl's /ws/mqtt bridge (the default), messages arrive as json text frames (compressed with
+  permessage-deflate if ankerctl accepts it).
+- MqttTransport: subscribes to the printer's topic on the AnkerMake broker directly, with the credentials exported
+  from ankerctl (see load_ankerctl_credentials), and decrypts the packets in-process. This takes ankerctl out of the
+  data path (commands are still sent through ankerctl).
+
+A transport's run() connects, passes every decoded message to on_message (on the event loop) and returns (or raises)
+when the connection is lost; the coordinator restarts it on the next poll.
+
+MQTT packets (as implemented by ankerctl's libflagship):
+    header (64 bytes): b'MA' | size (u16) | m3..m7 (5 x u8) | packet type (u8) | packet num (u16) | time (u32) |
+                       device guid (37 bytes) | padding (11 bytes)
+    body: AES-128-CBC(json, key=the printer's mqtt key, iv=b'3DPrintAnkerMake'), PKCS#7 padded
+    checksum (1 byte): xor of all preceding bytes
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import struct
+import time
+from abc import ABC, abstractmethod
+from functools import reduce
+from operator import xor
+from typing import Any, Callable
+
+import aiohttp
+
+from .anker_models import AnkerException
+from .ankerctl_util import WS_COMPRESS, counting_session
+from .metrics import AnkerMetrics
+from .profiler import PROFILER
+
+_LOGGER = logging.getLogger(__name__)
+
+TRANSPORT_WEBSOCKET = 'websocket'
+TRANSPORT_MQTT = 'mqtt'
+
+MQTT_HEADER = struct.Struct('<2sHBBBBBBHI37s11s')
+MQTT_SIGNATURE = b'MA'
+MQTT_IV = b'3DPrintAnkerMake'
+MQTT_PORT = 8789
+MQTT_BROKERS = {
+    'eu': 'make-mqtt-eu.ankermake.com',
+    'us': 'make-mqtt.ankermake.com',
+}
+MQTT_NOTICE_TOPIC = '/phone/maker/{sn}/notice'
+
+
+class AnkerTransportException(AnkerException):
+    pass
+
+
+def _checksum(data: bytes) -> int:
+    return reduce(xor, data, 0)
+
+
+def _cipher(key: bytes):
+    from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+    return Cipher(algorithms.AES(key), modes.CBC(MQTT_IV))
+
+
+def decode_packet(packet: bytes, key: bytes) -> list[dict]:
+    """Decrypt a packet from the printer, returns the messages it contains (raises ValueError if it is malformed)."""
+    from cryptography.hazmat.primitives import padding
+
+    if len(packet) <= MQTT_HEADER.size or packet[:2] != MQTT_SIGNATURE:
+        raise ValueError("Not an AnkerMake mqtt packet")
+    size = MQTT_HEADER.unpack_from(packet)[1]
+    if size != len(packet):
+        raise ValueError(f"Packet size mismatch ({len(packet)} bytes, header says {size})")
+    if _checksum(packet[:-1]) != packet[-1]:
+        raise ValueError("Packet checksum mismatch")
+
+    decryptor = _cipher(key).decryptor()
+    padded = decryptor.update(packet[MQTT_HEADER.size:-1]) + decryptor.finalize()
+    unpadder = padding.PKCS7(128).unpadder()
+    data = json.loads(unpadder.update(padded) + unpadder.finalize())
+    return data if isinstance(data, list) else [data]
+
+
+def encode_packet(message: dict | list, key: bytes, device_guid: str = '', packet_type: int = 0xc0,
+                  packet_num: int = 0) -> bytes:
+    """Encrypt a message the way the printer does (used for testing)."""
+    from cryptography.hazmat.primitives import padding
+
+    padder = padding.PKCS7(128).padder()
+    padded = padder.update(json.dumps(message).encode()) + padder.finalize()
+    encryptor = _cipher(key).encryptor()
+    body = encryptor.update(padded) + encryptor.finalize()
+    size = MQTT_HEADER.size + len(body) + 1
+    header = MQTT_HEADER.pack(MQTT_SIGNATURE, size, 5, 1, 2, 5, ord('F'), packet_type, packet_num, int(time.time()),
+                              device_guid.encode(), b'')
+    packet = header + body
+    return packet + bytes([_checksum(packet)])
+
+
+def load_ankerctl_credentials(path: str, serial: str = None) -> dict:
+    """
+    Read the mqtt credentials of a printer from ankerctl's config file (~/.config/ankerctl/default.json).
+
+    Returns {'sn', 'mqtt_key', 'user_id', 'email', 'region'}, the first printer is used if no serial is given.
+    """
+    with open(path) as f:
+        config = json.load(f)
+    account = config.get('account') or {}
+    printers = config.get('printers') or []
+    printer = next((p for p in printers if serial in (None, p.get('sn'))), None)
+    if not account or printer is None:
+        raise ValueError(f"No {'printer ' + serial if serial else 'printer'} found in {path}")
+    return {
+        'sn': printer['sn'],
+        'mqtt_key': printer['mqtt_key'],
+        'user_id': account['user_id'],
+        'email': account['email'],
+        'region': account.get('region', 'eu'),
+    }
+
+
+class Transport(ABC):
+    name = ''
+
+    def __init__(self, metrics: AnkerMetrics = None):
+        self.metrics = metrics or AnkerMetrics()
+
+    @abstractmethod
+    async def run(self, on_message: Callable[[dict], None]):
+        """Connect and pass every message to on_message, returns (or raises) when the connection is lost."""
+
+
+class WebsocketTransport(Transport):
+    name = TRANSPORT_WEBSOCKET
+
+    def __init__(self, host: str, metrics: AnkerMetrics = None):
+        super().__init__(metrics)
+        self.host = host
+
+    async def run(self, on_message: Callable[[dict], None]):
+        traffic = self.metrics.traffic['mqtt']
+        session = counting_session(traffic)
+        try:
+            async with session.ws_connect(f"{self.host}/ws/mqtt", compress=WS_COMPRESS) as ws:
+                async for msg in ws:
+                    if msg.type == aiohttp.WSMsgType.TEXT:
+                        traffic.payload_in += len(msg.data)
+                        profiling = PROFILER.active
+                        if profiling:
+                            PROFILER.start()
+                        start = time.perf_counter()
+                        message = json.loads(msg.data)
+                        self.metrics.decode_time.observe(time.perf_counter() - start)
+                        if profiling:
+                            PROFILER.stop()
+                        on_message(message)
+                    elif msg.type in (aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR):
+                        break
+        finally:
+            await session.close()
+
+
+def _paho_client():
+    try:
+        import paho.mqtt.client as mqtt
+    except ImportError as e:
+        raise AnkerTransportException(
+            f"The direct mqtt transport requires paho-mqtt (a requirement of the integration): {e}")
+    if hasattr(mqtt, 'CallbackAPIVersion'):
+        return mqtt.Client(mqtt.CallbackAPIVersion.VERSION1)
+    return mqtt.Client()
+
+
+class MqttTransport(Transport):
+    """
+    Subscribes to the printer's notice topic on the AnkerMake broker.
+
+    client_factory returns a (paho-mqtt compatible) client; paho runs its network loop in a thread, the packets are
+    handed over to the event loop and decrypted there (profiled and timed like the websocket transport's decoding).
+    """
+    name = TRANSPORT_MQTT
+
+    def __init__(self, credentials: dict, metrics: AnkerMetrics = None, client_factory: Callable[[], Any] = None,
+                 broker: str = None, port: int = MQTT_PORT):
+        super().__init__(metrics)
+        self.credentials = credentials
+        self.key = bytes.fromhex(credentials['mqtt_key'])
+        self.topic = MQTT_NOTICE_TOPIC.format(sn=credentials['sn'])
+        self.broker = broker or MQTT_BROKERS.get(credentials.get('region'), MQTT_BROKERS['eu'])
+        self.port = port
+        self.client_factory = client_factory or _paho_client
+        self.invalid_packets = 0
+
+    def _decode(self, packet: bytes) -> list[dict]:
+        profiling = PROFILER.active
+        if profiling:
+            PROFILER.start()
+        start = time.perf_counter()
+        try:
+            messages = decode_packet(packet, self.key)
+        except ValueError as e:
+            self.invalid_packets += 1
+            _LOGGER.debug(f"[AnkerMake] Dropped invalid mqtt packet: {e}")
+            messages = []
+        else:
+            self.metrics.decode_time.observe(time.perf_counter() - start)
+        if profiling:
+            PROFILER.stop()
+        return messages
+
+    async def run(self, on_message: Callable[[dict], None]):
+        loop = asyncio.get_running_loop()
+        disconnected = loop.create_future()
+
+        def deliver(packet: bytes):
+            for message in self._decode(packet):
+                on_message(message)
+
+        def set_disconnected(error: Exception):
+            if not disconnected.done():
+                disconnected.set_exception(error)
+
+        # Called from the client's network thread
+        def on_connect(client, userdata, flags, rc):
+            if rc != 0:
+                loop.call_soon_threadsafe(set_disconnected, AnkerTransportException(f"Connection refused ({rc})"))
+                return
+            client.subscribe(self.topic)
+
+        def on_packet(client, userdata, msg):
+            loop.call_soon_threadsafe(deliver, msg.payload)
+
+        def on_disconnect(client, userdata, rc):
+            loop.call_soon_threadsafe(set_disconnected, AnkerTransportException(f"Disconnected ({rc})"))
+
+        client = self.client_factory()
+        client.username_pw_set(f"eufy_{self.credentials['user_id']}", self.credentials['email'])
+        client.on_connect = on_connect
+        client.on_message = on_packet
+        client.on_disconnect = on_disconnect
+
+        def connect():
+            client.tls_set()
+            client.connect(self.broker, self.port)
+            client.loop_start()
+
+        def stop():
+            # Joins the network thread, so it must not run on the event loop
+            client.loop_stop()
+            client.disconnect()
+
+        try:
+            await loop.run_in_executor(None, connect)
+            await disconnected
+        finally:
+            await loop.run_in_executor(None, stop)
+
+
+def create_transport(config: dict, metrics: AnkerMetrics = None) -> Transport:
+    """The transport of a config entry (direct mqtt if credentials were imported, ankerctl's websocket otherwise)."""
+    if config.get('transport') == TRANSPORT_MQTT:
+        return MqttTransport(config['mqtt_credentials'], metrics)
+    return WebsocketTransport(config['host'], metrics)
@@ -0,0 +1,41 @@
+"""
+Performance profile of a printer, set in the options flow and applied live (without reloading the entry).
+
+A profile is one of the PROFILES presets, or custom values for every setting:
+- poll_interval: seconds between ankerctl api polls (and entity refreshes)
+- liveness_timeout: seconds without a message before the printer is considered offline (AnkerData.online)
+- hotend_deadband / bed_deadband: °C below the target that count as heating up (AnkerData.status)
+- reconnect_min / reconnect_max: backoff between transport reconnects, doubled after every failed connection
+"""
+
+from dataclasses import asdict, dataclass, fields
+
+from .const import CONF_PROFILE, PROFILE_BALANCED, PROFILE_CUSTOM, UPDATE_FREQUENCY_SECONDS
+
+
+@dataclass(frozen=True)
+class Tuning:
+    poll_interval: float = UPDATE_FREQUENCY_SECONDS
+    liveness_timeout: float = 30
+    hotend_deadband: float = 5
+    bed_deadband: float = 2
+    reconnect_min: float = 5
+    reconnect_max: float = 60
+
+    @classmethod
+    def from_options(cls, options: dict) -> 'Tuning':
+        profile = options.get(CONF_PROFILE, PROFILE_BALANCED)
+        if profile != PROFILE_CUSTOM:
+            return PROFILES.get(profile, PROFILES[PROFILE_BALANCED])
+        return cls(**{f.name: options[f.name] for f in fields(cls) if f.name in options})
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+PROFILES = {
+    'low_power': Tuning(poll_interval=15, liveness_timeout=60, reconnect_min=15, reconnect_max=300),
+    PROFILE_BALANCED: Tuning(),
+    'realtime': Tuning(poll_interval=2, liveness_timeout=15, hotend_deadband=3, bed_deadband=1,
+                       reconnect_min=1, reconnect_max=15),
+}
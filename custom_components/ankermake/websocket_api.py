@@ -0,0 +1,36 @@
+"""
+AnkerMake websocket commands for custom cards.
+
+ankermake/subscribe (device_id): a snapshot of the printer's AnkerData followed by coalesced deltas of the changed
+fields (see subscriptions.py), until the subscription is closed with unsubscribe_events.
+"""
+
+from __future__ import annotations
+
+import voluptuous as vol
+from homeassistant.components import websocket_api
+from homeassistant.const import ATTR_DEVICE_ID
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.exceptions import ServiceValidationError
+
+from .services import get_device_coordinator
+
+
+@callback
+def async_setup_websocket(hass: HomeAssistant):
+    websocket_api.async_register_command(hass, ws_subscribe)
+
+
+@websocket_api.websocket_command({
+    vol.Required("type"): "ankermake/subscribe",
+    vol.Required(ATTR_DEVICE_ID): str,
+})
+@callback
+def ws_subscribe(hass: HomeAssistant, connection: websocket_api.ActiveConnection, msg: dict):
+    try:
+        coordinator = get_device_coordinator(hass, msg[ATTR_DEVICE_ID])
+    except ServiceValidationError as e:
+        connection.send_error(msg["id"], websocket_api.ERR_NOT_FOUND, str(e))
+        return
+    connection.send_result(msg["id"])
+    connection.subscriptions[msg["id"]] = coordinator.subscribers.subscribe(connection.send_message, msg["id"])
@@ -0,0 +1,250 @@
+"""
+Optional off-loop ingestion for large fleets (the ingest_worker option of a printer).
+
+By default the transport of every printer, the decoding of its messages and AnkerData.update run on Home Assistant's
+event loop. With the worker they run in a single thread with its own event loop, shared by all printers that enable it.
+The messages are applied to a shadow AnkerData in the worker, and every FLUSH_INTERVAL the fields assigned since the
+previous flush (only the latest value of each, so a burst of temperature messages is a single value) of all printers
+are handed to the event loop in one call. The coordinator assigns them to its AnkerData, and runs the events, telemetry
+and job summaries once per batch instead of once per message.
+
+The shadow and the coordinator's AnkerData (a replica) are kept in sync both ways: the resets the status handler makes
+on the event loop (_reset and _remove_error) are made in the shadow as well, and the state that is updated in place
+(the layer timings and captured command types) is copied to the event loop when it changed. gcode
+replies are passed on as they are (for the ctrl channel).
+
+The worker thread is the only writer of a printer's metrics (frames, decode/apply times, traffic and reconnects), the
+event loop only reads them (sensors and diagnostics). Every update is a few operations on ints, fixed-size lists and the
+frames dict, none of which can be left broken for a reader under the GIL. A reader can at worst see a histogram or rate
+meter one sample apart, which is fine for the diagnostics, so the hot path doesn't take a lock.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import copy
+import logging
+import threading
+import time
+from typing import Callable
+
+from .anker_models import AnkerException, CommandTypes
+from .ankermake_mqtt_adapter import AnkerData
+from .const import DOMAIN
+from .metrics import AnkerMetrics
+from .transport import Transport
+
+_LOGGER = logging.getLogger(__name__)
+
+DATA_INGEST_WORKER = f'{DOMAIN}_ingest_worker'
+FLUSH_INTERVAL = 0.25  # Seconds
+STOP_TIMEOUT = 5  # Seconds to wait for the worker thread to stop
+MIRRORED_RESETS = ('_reset', '_remove_error')
+
+
+def _layer_timings_key(layers) -> tuple:
+    # reset() replaces the arrays
+    return id(layers.layers), len(layers.layers), layers.job_name
+
+
+# State AnkerData.update changes in place: attribute and a cheap key that changes whenever the state does
+ACCUMULATORS = {
+    '_layer_timings': _layer_timings_key,
+    '_capture': lambda capture: sum(capture.counts.values()),
+}
+
+
+class ShadowAnkerData(AnkerData):
+    """AnkerData in the worker thread, records the fields assigned since the last flush."""
+    _written: dict | None = None
+
+    def __setattr__(self, name: str, value):
+        super().__setattr__(name, value)
+        written = self._written
+        if written is not None:
+            written[name] = value
+
+    def record(self):
+        object.__setattr__(self, '_written', {})
+
+    def take(self) -> dict:
+        """The fields assigned since the last call (the latest value of each)."""
+        written = self._written
+        object.__setattr__(self, '_written', {})
+        return written
+
+    def mirror(self, method: str):
+        """
+        Make a reset of the replica, without recording it (the replica already has the result). The fields it resets
+        are dropped from the recorded ones, they are older than the reset and would undo it on the next flush.
+        """
+        written = self._written
+        object.__setattr__(self, '_written', {})
+        try:
+            getattr(AnkerData, method)(self)
+        finally:
+            reset = self._written
+            object.__setattr__(self, '_written', written)
+        if written:
+            for name in reset:
+                written.pop(name, None)
+
+
+class ReplicaAnkerData(AnkerData):
+    """The coordinator's AnkerData while the worker applies the messages, passes its resets on to the shadow."""
+    _on_reset: Callable[[str], None] | None = None
+
+    def _reset(self):
+        super()._reset()
+        if self._on_reset:
+            self._on_reset('_reset')
+
+    def _remove_error(self):
+        super()._remove_error()
+        if self._on_reset:
+            self._on_reset('_remove_error')
+
+
+class WorkerPrinter:
+    def __init__(self, key: str, transport: Transport, shadow: ShadowAnkerData, metrics: AnkerMetrics,
+                 deliver: Callable[[dict, dict, list], None], backoff: Callable[[], tuple[float, float]]):
+        self.key = key
+        self.transport = transport
+        self.shadow = shadow
+        self.metrics = metrics
+        self.deliver = deliver  # Called on the event loop with (fields, accumulators, gcode replies)
+        self.backoff = backoff  # (reconnect_min, reconnect_max), read on every reconnect (see tuning.py)
+        self.replies: list[dict] = []
+        self.task: asyncio.Task | None = None
+        self._accumulator_keys = {name: key_func(getattr(shadow, name)) for name, key_func in ACCUMULATORS.items()}
+
+    def changed_accumulators(self) -> dict:
+        """Copies of the accumulators that changed since the last call."""
+        changed = {}
+        for name, key_func in ACCUMULATORS.items():
+            value = getattr(self.shadow, name)
+            key = key_func(value)
+            if key != self._accumulator_keys[name]:
+                self._accumulator_keys[name] = key
+                changed[name] = copy.deepcopy(value)
+        return changed
+
+    def on_message(self, message: dict):
+        start = time.perf_counter()
+        command_type = message.get("commandType")
+        self.metrics.count_frame(command_type)
+        if command_type == CommandTypes.ZZ_MQTT_CMD_GCODE_COMMAND.value:
+            self.replies.append(message)
+        try:
+            self.shadow.update(message)
+        except AnkerException:
+            _LOGGER.error(f"[AnkerMake] Error updating data (Received message: {message})")
+        except Exception as e:
+            _LOGGER.error(f"[AnkerMake] Error applying message: {e} (Received message: {message})")
+        self.metrics.apply_time.observe(time.perf_counter() - start)
+
+    async def run(self):
+        """Run the transport, reconnecting with a backoff (like the coordinator does without the worker)."""
+        delay = self.backoff()[0]
+        while True:
+            frames = self.metrics.frame_rate.total
+            try:
+                await self.transport.run(self.on_message)
+            except (Exception, AnkerException) as e:
+                _LOGGER.debug(f"[AnkerMake] Error connecting to the {self.transport.name} transport: {e}")
+            reconnect_min, reconnect_max = self.backoff()
+            delay = reconnect_min if self.metrics.frame_rate.total > frames else min(delay * 2, reconnect_max)
+            await asyncio.sleep(delay)
+            self.metrics.ws_reconnects += 1
+
+
+class IngestWorker:
+    """The worker thread, started with the first printer that uses it and stopped with the last."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, flush_interval: float = FLUSH_INTERVAL):
+        self.flush_interval = flush_interval
+        self._hass_loop = loop
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._thread: threading.Thread | None = None
+        self._printers: dict[str, WorkerPrinter] = {}  # Only used in the worker thread
+        self._count = 0  # Printers added (on the event loop)
+        self.flushes = 0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def add(self, printer: WorkerPrinter):
+        if not self.running:
+            self._start()
+        self._count += 1
+        printer.shadow.record()
+        self._loop.call_soon_threadsafe(self._add, printer)
+
+    def remove(self, key: str) -> bool:
+        """Stop ingesting a printer, returns True if it was the last one (stop() the worker in the executor)."""
+        self._count -= 1
+        self._loop.call_soon_threadsafe(self._remove, key)
+        return self._count == 0
+
+    def call(self, key: str, method: str, *args):
+        """Call a method of a printer's shadow AnkerData in the worker thread."""
+        self._loop.call_soon_threadsafe(self._call, key, method, args)
+
+    def _start(self):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name=DATA_INGEST_WORKER, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the worker thread (blocking)."""
+        if self.running:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(STOP_TIMEOUT)
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.call_later(self.flush_interval, self._flush)
+        try:
+            self._loop.run_forever()
+            tasks = asyncio.all_tasks(self._loop)
+            for task in tasks:
+                task.cancel()
+            self._loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+        finally:
+            self._loop.close()
+
+    def _add(self, printer: WorkerPrinter):
+        self._printers[printer.key] = printer
+        printer.task = self._loop.create_task(printer.run())
+
+    def _remove(self, key: str):
+        printer = self._printers.pop(key, None)
+        if printer is not None:
+            printer.task.cancel()
+
+    def _call(self, key: str, method: str, args: tuple):
+        printer = self._printers.get(key)
+        if printer is not None:
+            getattr(printer.shadow, method)(*args)
+
+    def _flush(self):
+        """Hand the changes of all printers to the event loop (in the worker thread, every flush_interval)."""
+        batch = []
+        for printer in self._printers.values():
+            fields, accumulators, replies = printer.shadow.take(), printer.changed_accumulators(), printer.replies
+            if fields or accumulators or replies:
+                printer.replies = []
+                batch.append((printer.deliver, fields, accumulators, replies))
+        if batch:
+            self.flushes += 1
+            self._hass_loop.call_soon_threadsafe(_deliver, batch)
+        self._loop.call_later(self.flush_interval, self._flush)
+
+
+def _deliver(batch: list):
+    for deliver, fields, accumulators, replies in batch:
+        try:
+            deliver(fields, accumulators, replies)
+        except Exception as e:
+            _LOGGER.error(f"[AnkerMake] Error applying the changes of the ingest worker: {e}")
@@ -0,0 +1,79 @@
+"""
+Work per refresh cycle for the derived AnkerData values (derived.py): every message is followed by a refresh in which
+every entity reads its keys (the keys in sensor_manifest.py), like the coordinator listeners do.
+
+Run with --benchmark -s to see the numbers.
+"""
+
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from custom_components.ankermake import sensor_manifest
+from custom_components.ankermake.ankermake_mqtt_adapter import AnkerData
+from custom_components.ankermake.derived import derived
+from fake_ankerctl import print_lifecycle
+
+DERIVED = {name: value for name, value in vars(AnkerData).items() if isinstance(value, derived)}
+
+
+def _entity_keys() -> list[str]:
+    """The AnkerData attributes read by all entities in one refresh."""
+    keys = []
+    for name in ('BINARY_SENSOR_DESCRIPTIONS', 'BINARY_SENSOR_WITH_ATTR_DESCRIPTIONS', 'SENSOR_DESCRIPTIONS',
+                 'SENSOR_WITH_ATTR_DESCRIPTIONS'):
+        for item in getattr(sensor_manifest, name):
+            if isinstance(item, list):
+                keys += [key for key in item[1].values() if not key.startswith(('%', '='))]
+            else:
+                keys.append(item.key)
+    return [key for key in keys if hasattr(AnkerData, key) or key in AnkerData.__dataclass_fields__]
+
+
+def _run(keys: list[str], cached: bool) -> tuple[int, float]:
+    """Returns the number of derived values computed, and the time spent reading the keys."""
+    computed = 0
+    funcs = {name: prop.func for name, prop in DERIVED.items()}
+
+    def counting(func):
+        def compute(instance):
+            nonlocal computed
+            computed += 1
+            return func(instance)
+        return compute
+
+    for name, prop in DERIVED.items():
+        prop.func = counting(funcs[name])
+    try:
+        data = AnkerData(_api_status={'possible_states': {'Running': 1, 'Stopped': 0}})
+        read_time = 0.0
+        for message in print_lifecycle(name='benchy_PETG', layers=50):
+            data.update(message)
+            start = time.perf_counter()
+            for key in keys:
+                if cached or key not in DERIVED:
+                    getattr(data, key)
+                else:
+                    # What a plain property does on every read
+                    DERIVED[key].func(data)
+            read_time += time.perf_counter() - start
+    finally:
+        for name, prop in DERIVED.items():
+            prop.func = funcs[name]
+    return computed, read_time
+
+
+@pytest.mark.benchmark
+def test_derived_values_benchmark():
+    keys = _entity_keys()
+    assert any(key in DERIVED for key in keys)
+
+    uncached, uncached_time = _run(keys, cached=False)
+    cached, cached_time = _run(keys, cached=True)
+    print(f"\nDerived values computed: {uncached} uncached, {cached} cached ({uncached / cached:.1f}x less work), "
+          f"reading all entity keys: {uncached_time * 1000:.1f} ms uncached, {cached_time * 1000:.1f} ms cached")
+    assert cached * 5 < uncached
@@ -0,0 +1,63 @@
+"""
+Import and setup cost of the integration, tracked per release: the time to import the integration (on top of the
+Home Assistant modules that are loaded anyway), the modules that must stay lazy, and the cost of forwarding each
+platform (importing its Home Assistant entity component and the platform module) that enabled_platforms avoids for
+platforms without enabled entities. The import time is reported (MAX_IMPORT_TIME is the target), not asserted.
+
+Every measurement runs in a fresh interpreter. Run with -s to see the numbers.
+"""
+
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+import custom_components.ankermake as integration
+
+ROOT = Path(__file__).parent.parent.parent
+# Loaded by Home Assistant (and the integration's dependencies) before the integration is imported
+PRELOADED = ['aiohttp', 'homeassistant.core', 'homeassistant.config_entries', 'homeassistant.helpers.storage',
+             'homeassistant.helpers.update_coordinator', 'homeassistant.helpers.entity_registry',
+             'homeassistant.components.websocket_api', 'homeassistant.components.network']
+# Only imported when they are used (the runtime modules when the integration is set up)
+LAZY = ['pytz', 'cProfile', 'pstats', 'custom_components.ankermake.gcode_analyzer',
+        'custom_components.ankermake.worker'] + [f'custom_components.ankermake.{module}'
+                                                 for module in integration.RUNTIME_MODULES]
+MAX_IMPORT_TIME = 0.25  # Seconds, target
+
+MEASURE = '''
+import importlib, json, sys, time
+sys.path.insert(0, {root!r})
+for module in {preloaded!r}:
+    importlib.import_module(module)
+before = set(sys.modules)
+start = time.perf_counter()
+importlib.import_module('custom_components.ankermake')
+result = {{'integration': time.perf_counter() - start, 'modules': sorted(set(sys.modules) - before), 'platforms': {{}}}}
+for platform in {platforms!r}:
+    start = time.perf_counter()
+    importlib.import_module(f'custom_components.ankermake.{{platform}}')
+    result['platforms'][platform] = time.perf_counter() - start
+print(json.dumps(result))
+'''
+
+
+def _measure() -> dict:
+    script = MEASURE.format(root=str(ROOT), preloaded=PRELOADED, platforms=[p.value for p in integration.PLATFORMS])
+    # Outside of the package directory (select.py would shadow the select module)
+    output = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, check=True, cwd='/')
+    return json.loads(output.stdout.splitlines()[-1])
+
+
+def test_import_and_setup_benchmark():
+    result = _measure()
+    loaded = set(result['modules'])
+    skipped = result['platforms']['select']
+    print(f"\nIntegration import: {result['integration'] * 1000:.1f} ms, {len(loaded)} modules; platform forwarding: "
+          + ', '.join(f"{name} {seconds * 1000:.1f} ms" for name, seconds in result['platforms'].items())
+          + f"; skipped with default entities: {skipped * 1000:.1f} ms"
+          + (f" (import over the {MAX_IMPORT_TIME * 1000:.0f} ms target)" if result['integration'] > MAX_IMPORT_TIME
+             else ""))
+    assert not loaded & set(LAZY), f"Imported at load time: {loaded & set(LAZY)}"
@@ -0,0 +1,157 @@
+"""
+Event loop latency with 1 to 50 printers, with the messages applied on the event loop (the default) and in the ingest
+worker (worker.py). Every printer is a fake ankerctl streaming a print job over the websocket (served from another
+thread, so only the integration's work runs on the measured loop). A probe measures how late the loop wakes it up,
+which is what every other integration and automation in the house waits for.
+
+Run with --benchmark -s to see the numbers.
+"""
+
+import asyncio
+import statistics
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).parent.parent))
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from custom_components.ankermake.ankermake_mqtt_adapter import AnkerData
+from custom_components.ankermake.events import AnkerEventTracker
+from custom_components.ankermake.ingest import CoalescingQueue
+from custom_components.ankermake.metrics import AnkerMetrics
+from custom_components.ankermake.transport import AnkerTransportException, WebsocketTransport
+from custom_components.ankermake.worker import IngestWorker, ReplicaAnkerData, ShadowAnkerData, WorkerPrinter
+from fake_ankerctl import start_fleet
+
+FLEET_SIZES = (1, 10, 25, 50)
+RATE = 20  # Messages per second per printer
+DURATION = 1.0  # Seconds per measurement
+PROBE_INTERVAL = 0.005  # Seconds
+FLUSH_INTERVAL = 0.25  # Seconds (worker.FLUSH_INTERVAL)
+
+
+class FleetServer:
+    """The fake ankerctl fleet, running in its own thread and event loop."""
+
+    def __init__(self, printers: int):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+        self.fleet = asyncio.run_coroutine_threadsafe(start_fleet(printers, rate=RATE), self.loop).result()
+
+    def stop(self):
+        async def stop():
+            for fake in self.fleet:
+                await fake.stop()
+            tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        asyncio.run_coroutine_threadsafe(stop(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+
+async def _probe(lateness: list[float]):
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(PROBE_INTERVAL)
+        lateness.append(time.perf_counter() - start - PROBE_INTERVAL)
+
+
+async def _on_loop(server: FleetServer) -> tuple[list[AnkerMetrics], int]:
+    """Transport, ingest queue and AnkerData.update per printer on the loop (AnkerMakeUpdateCoordinator)."""
+    tasks, all_metrics = [], []
+    for fake in server.fleet:
+        metrics = AnkerMetrics()
+        transport, queue, data = WebsocketTransport(fake.ws_url, metrics), CoalescingQueue(metrics=metrics), AnkerData()
+        events = AnkerEventTracker(data)
+
+        def on_message(message, metrics=metrics, queue=queue):
+            metrics.count_frame(message.get('commandType'))
+            queue.put(message)
+
+        async def read(transport=transport, on_message=on_message):
+            try:
+                await transport.run(on_message)
+            except AnkerTransportException:
+                pass
+
+        async def apply(queue=queue, data=data, events=events):
+            while True:
+                for message in await queue.get_batch():
+                    data.update(message)
+                    events.check()
+                await asyncio.sleep(0)
+
+        tasks += [asyncio.create_task(read()), asyncio.create_task(apply())]
+        all_metrics.append(metrics)
+    await asyncio.sleep(DURATION)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return all_metrics, sum(m.frame_rate.total for m in all_metrics)
+
+
+async def _in_worker(server: FleetServer) -> tuple[list[AnkerMetrics], int]:
+    """Transport and AnkerData.update in the worker, batches of field diffs applied on the loop."""
+    worker = IngestWorker(asyncio.get_running_loop(), flush_interval=FLUSH_INTERVAL)
+    all_metrics, deliveries = [], 0
+    for i, fake in enumerate(server.fleet):
+        metrics, replica = AnkerMetrics(), ReplicaAnkerData()
+        events = AnkerEventTracker(replica)
+
+        def deliver(fields, accumulators, replies, replica=replica, events=events):
+            nonlocal deliveries
+            deliveries += 1
+            for name, value in {**accumulators, **fields}.items():
+                setattr(replica, name, value)
+            events.check()
+
+        worker.add(WorkerPrinter(str(i), WebsocketTransport(fake.ws_url, metrics), ShadowAnkerData(), metrics, deliver,
+                                 lambda: (60, 60)))
+        all_metrics.append(metrics)
+    await asyncio.sleep(DURATION)
+    for i in range(len(server.fleet)):
+        worker.remove(str(i))
+    await asyncio.get_running_loop().run_in_executor(None, worker.stop)
+    assert worker.flushes <= DURATION / FLUSH_INTERVAL + 1
+    return all_metrics, deliveries
+
+
+async def _measure(mode, server: FleetServer) -> dict:
+    lateness = []
+    probe = asyncio.create_task(_probe(lateness))
+    metrics, applied = await mode(server)
+    probe.cancel()
+    lateness.sort()
+    return {
+        'frames': sum(m.frame_rate.total for m in metrics),
+        'printers_receiving': sum(m.frame_rate.total > 0 for m in metrics),
+        'applied': applied,  # Messages (on the loop) or field diffs (worker) applied on the event loop
+        'p50': statistics.median(lateness) * 1000,
+        'p99': lateness[int(len(lateness) * 0.99)] * 1000,
+        'max': lateness[-1] * 1000,
+    }
+
+
+@pytest.mark.benchmark
+def test_event_loop_latency_benchmark():
+    print(f"\n{'printers':>8} {'mode':>8} {'frames':>7} {'applied':>8} {'p50 ms':>7} {'p99 ms':>7} {'max ms':>7}")
+    for printers in FLEET_SIZES:
+        server = FleetServer(printers)
+        try:
+            for name, mode in (('on loop', _on_loop), ('worker', _in_worker)):
+                result = asyncio.run(_measure(mode, server))
+                print(f"{printers:>8} {name:>8} {result['frames']:>7} {result['applied']:>8} "
+                      f"{result['p50']:>7.2f} {result['p99']:>7.2f} {result['max']:>7.2f}")
+                assert result['printers_receiving'] == printers
+                if name == 'worker':
+                    # At most one diff per printer and flush, instead of one update per message
+                    assert result['applied'] <= printers * (DURATION / FLUSH_INTERVAL + 1) < result['frames']
+        finally:
+            server.stop()
@@ -0,0 +1,23 @@
+"""
+Benchmarks (tests marked with @pytest.mark.benchmark) assert timings that depend on the machine, so they are skipped
+unless pytest is run with --benchmark.
+"""
+
+import pytest
+
+
+def pytest_addoption(parser):
+    parser.addoption('--benchmark', action='store_true', default=False, help="Run the benchmarks")
+
+
+def pytest_configure(config):
+    config.addinivalue_line('markers', "benchmark: asserts machine dependent timings (run with --benchmark)")
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption('--benchmark'):
+        return
+    skip = pytest.mark.skip(reason="Benchmark, run with --benchmark")
+    for item in items:
+        if 'benchmark' in item.keywords:
+            item.add_marker(skip)
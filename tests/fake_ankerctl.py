@@ -0,0 +1,299 @@
+"""
+A self-contained stand-in for ankerctl, used for end-to-end and load testing without a printer.
+
+Each FakeAnkerctl serves the endpoints the integration uses (/ws/mqtt, /ws/ctrl, /api/ankerctl/status, /api/version,
+/api/files/local and a preview image) for one virtual printer, and streams a scripted print lifecycle on /ws/mqtt at a
+configurable rate. Run this file directly to start a fleet for a local Home Assistant instance (docker-compose.yml):
+
+    python tests/fake_ankerctl.py --printers 5 --rate 10 --port 4470
+
+FakeMqttBroker streams the same script as encrypted mqtt packets, for the direct mqtt transport.
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import random
+import threading
+import time
+from types import SimpleNamespace
+from typing import Callable, Iterator
+
+from aiohttp import web
+
+# 1x1 transparent png
+PREVIEW_PNG = base64.b64decode('iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNkYPhfDwAChwGA60e6kgAAAABJRU5ErkJggg==')
+
+API_STATUS = {
+    'possible_states': {'Running': 1, 'Stopped': 0},
+    'services': {name: {'online': True, 'state': 'Running'} for name in ['filetransfer', 'pppp', 'videoqueue',
+                                                                         'mqttqueue']},
+    'version': {'api': '0.1', 'server': '1.9.0'},
+}
+
+
+def _temps(hotend: float, hotend_target: float, bed: float, bed_target: float) -> list[dict]:
+    return [
+        {'commandType': 1003, 'currentTemp': int(hotend * 100), 'targetTemp': int(hotend_target * 100)},
+        {'commandType': 1004, 'currentTemp': int(bed * 100), 'targetTemp': int(bed_target * 100)},
+    ]
+
+
+def _schedule(name: str, progress: float, elapsed: int, remaining: int, filament_mm: float, preview: str) -> dict:
+    return {
+        'commandType': 1001, 'name': name, 'img': preview, 'progress': int(progress * 100),
+        'totalTime': elapsed, 'time': remaining, 'filamentUsed': filament_mm,
+        'aiFlag': 0, 'AISwitch': 0, 'AISensitivity': 0, 'AIPausePrint': 0, 'AIJoinImproving': 0,
+    }
+
+
+def print_lifecycle(name: str = 'benchy_PLA', layers: int = 50, ticks_per_layer: int = 4, idle_ticks: int = 5,
+                    preview: str = '') -> Iterator[dict]:
+    """
+    A realistic print: idle, preheating, printing layer by layer (with temperature noise), finished and idle again.
+
+    Every 'tick' is a burst of messages like the printer sends every few seconds (temperatures, schedule, speed).
+    """
+    hotend, bed = 25.0, 25.0
+    for _ in range(idle_ticks):
+        yield from _temps(hotend, 0, bed, 0)
+
+    # Preheating
+    while hotend < 210 or bed < 60:
+        hotend, bed = min(hotend + 20, 210), min(bed + 5, 60)
+        yield from _temps(hotend, 210, bed, 60)
+
+    total_ticks = layers * ticks_per_layer
+    yield {'commandType': 1037, 'lock': 1}
+    yield {'commandType': 1093, 'value': 0, 'nozzle_type': 0}
+    for tick in range(total_ticks):
+        if tick % ticks_per_layer == 0:
+            yield {'commandType': 1052, 'real_print_layer': tick // ticks_per_layer + 1, 'total_layer': layers}
+        progress = tick * 100 / total_ticks
+        yield from _temps(210 + random.uniform(-1, 1), 210, 60 + random.uniform(-0.3, 0.3), 60)
+        yield _schedule(name, progress, tick * 5, (total_ticks - tick) * 5, tick * 12.5, preview)
+        yield {'commandType': 1006, 'value': 250}
+
+    yield _schedule(name, 100, total_ticks * 5, 0, total_ticks * 12.5, preview)
+    yield {'commandType': 1037, 'lock': 0}
+    for _ in range(idle_ticks):
+        hotend, bed = max(hotend - 20, 25), max(bed - 5, 25)
+        yield from _temps(hotend, 0, bed, 0)
+
+
+class FakeAnkerctl:
+    def __init__(self, name: str = 'Fake M5', rate: float = 10, script: Callable[[], Iterator[dict]] = None,
+                 loop_script: bool = True):
+        """
+        rate: messages per second on /ws/mqtt (0 to send as fast as possible)
+        script: returns an iterator of mqtt messages (defaults to print_lifecycle)
+        loop_script: restart the script when it ends
+        """
+        self.name = name
+        self.rate = rate
+        self.script = script or (lambda: print_lifecycle(preview=f"{self.http_url}/preview/{self.name}.png"))
+        self.loop_script = loop_script
+
+        self.sent = 0
+        self.ctrl_messages: list[dict] = []
+        self.uploads: list[dict] = []
+        self._mqtt_clients: set[web.WebSocketResponse] = set()
+        self._runner: web.AppRunner | None = None
+        self.port = 0
+
+        self.app = web.Application(client_max_size=1024 ** 3)
+        self.app.router.add_get('/ws/mqtt', self._ws_mqtt)
+        self.app.router.add_get('/ws/ctrl', self._ws_ctrl)
+        self.app.router.add_get('/api/version', self._api_version)
+        self.app.router.add_get('/api/ankerctl/status', self._api_status)
+        self.app.router.add_get('/api/ankerctl/server/reload', self._api_reload)
+        self.app.router.add_post('/api/files/local', self._api_files_local)
+        self.app.router.add_get('/preview/{name}', self._preview)
+
+    @property
+    def http_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    @property
+    def ws_url(self) -> str:
+        return f"ws://127.0.0.1:{self.port}"
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0):
+        self._runner = web.AppRunner(self.app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        for ws in list(self._mqtt_clients):
+            await ws.close()
+        await self._runner.cleanup()
+
+    async def _broadcast(self, message: dict):
+        data = json.dumps(message)
+        for ws in list(self._mqtt_clients):
+            await ws.send_str(data)
+
+    async def _ws_mqtt(self, request):
+        ws = web.WebSocketResponse(compress=True)
+        await ws.prepare(request)
+        self._mqtt_clients.add(ws)
+        interval = 1 / self.rate if self.rate else 0
+        try:
+            while not ws.closed:
+                for message in self.script():
+                    if ws.closed:
+                        break
+                    await ws.send_str(json.dumps(message))
+                    self.sent += 1
+                    await asyncio.sleep(interval)
+                if not self.loop_script:
+                    break
+            # Keep the connection open (like ankerctl) until the client leaves
+            async for _ in ws:
+                pass
+        except ConnectionResetError:
+            pass
+        finally:
+            self._mqtt_clients.discard(ws)
+        return ws
+
+    async def _ws_ctrl(self, request):
+        ws = web.WebSocketResponse(compress=True)
+        await ws.prepare(request)
+        async for msg in ws:
+            message = json.loads(msg.data)
+            self.ctrl_messages.append(message)
+            # Gcode is acknowledged by the printer on the mqtt socket
+            if message.get('commandType') == 1043:
+                await self._broadcast({'commandType': 1043, 'resData': f"ok {message.get('cmdData')}"})
+        return ws
+
+    async def _api_version(self, request):
+        return web.json_response({'api': '0.1', 'server': '1.9.0', 'text': 'OctoPrint 1.9.0'})
+
+    async def _api_status(self, request):
+        return web.json_response(API_STATUS)
+
+    async def _api_reload(self, request):
+        return web.json_response({})
+
+    async def _api_files_local(self, request):
+        reader = await request.multipart()
+        upload = {'print': False, 'filename': None, 'size': 0}
+        async for part in reader:
+            if part.name == 'print':
+                upload['print'] = (await part.text()) == 'true'
+            elif part.name == 'file':
+                upload['filename'] = part.filename
+                while chunk := await part.read_chunk():
+                    upload['size'] += len(chunk)
+        self.uploads.append(upload)
+        return web.json_response({})
+
+    async def _preview(self, request):
+        return web.Response(body=PREVIEW_PNG, content_type='image/png')
+
+
+class FakeMqttBroker:
+    """
+    A stand-in for the AnkerMake mqtt broker, for MqttTransport (transport.py).
+
+    client() is a client_factory: it returns a paho-mqtt compatible client that, once connected and subscribed, receives
+    the encrypted packets of a scripted print (encoded with encode) from a network thread, like paho does.
+    """
+
+    def __init__(self, encode: Callable[[dict], bytes], rate: float = 10, script: Callable[[], Iterator[dict]] = None,
+                 refuse: bool = False):
+        self.encode = encode
+        self.rate = rate
+        self.script = script or print_lifecycle
+        self.refuse = refuse
+        self.published = 0
+        self.clients: list[FakeMqttClient] = []
+
+    def client(self) -> 'FakeMqttClient':
+        client = FakeMqttClient(self)
+        self.clients.append(client)
+        return client
+
+
+class FakeMqttClient:
+    def __init__(self, broker: FakeMqttBroker):
+        self.broker = broker
+        self.on_connect = self.on_message = self.on_disconnect = None
+        self.username = self.password = self.host = None
+        self.topics: list[str] = []
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self.stopped_in: int | None = None  # Thread that called loop_stop
+
+    def username_pw_set(self, username: str, password: str):
+        self.username, self.password = username, password
+
+    def tls_set(self, *args, **kwargs):
+        pass
+
+    def connect(self, host: str, port: int):
+        self.host = (host, port)
+
+    def subscribe(self, topic: str):
+        self.topics.append(topic)
+
+    def loop_start(self):
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def loop_stop(self):
+        self.stopped_in = threading.get_ident()
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def disconnect(self):
+        self._stop.set()
+
+    def _loop(self):
+        self.on_connect(self, None, {}, 5 if self.broker.refuse else 0)
+        if self.broker.refuse:
+            return
+        interval = 1 / self.broker.rate if self.broker.rate else 0
+        for message in self.broker.script():
+            if self._stop.is_set():
+                return
+            for topic in self.topics:
+                self.on_message(self, None, SimpleNamespace(topic=topic, payload=self.broker.encode(message)))
+                self.broker.published += 1
+            time.sleep(interval)
+        self.on_disconnect(self, None, 0)
+
+
+async def start_fleet(printers: int, port: int = 0, **kwargs) -> list[FakeAnkerctl]:
+    """Start one FakeAnkerctl per printer (on consecutive ports if a port is given, random ports otherwise)."""
+    fleet = []
+    for i in range(printers):
+        fake = FakeAnkerctl(name=f"Fake M5 {i + 1}", **kwargs)
+        await fake.start(port=port + i if port else 0)
+        fleet.append(fake)
+    return fleet
+
+
+async def _main(args):
+    fleet = await start_fleet(args.printers, port=args.port, rate=args.rate)
+    for fake in fleet:
+        print(f"{fake.name}: {fake.ws_url}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        for fake in fleet:
+            await fake.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--printers', type=int, default=1)
+    parser.add_argument('--rate', type=float, default=5, help='messages per second per printer')
+    parser.add_argument('--port', type=int, default=4470, help='port of the first printer')
+    asyncio.run(_main(parser.parse_args()))
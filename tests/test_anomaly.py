@@ -0,0 +1,169 @@
+import random
+import statistics
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent) + '\\custom_components')
+
+from custom_components.ankermake.ankermake_mqtt_adapter import AnkerData
+from custom_components.ankermake.anomaly import AnkerAnomalyMonitor, EwSlope, Welford
+from custom_components.ankermake.const import EVENT_ANOMALY
+
+
+def _schedule(progress):
+    return {'commandType': 1001, 'name': 'benchy_PLA', 'img': '', 'progress': progress * 100, 'totalTime': 60,
+            'time': 600, 'aiFlag': 0, 'AISwitch': 0, 'AISensitivity': 0, 'AIPausePrint': 0, 'AIJoinImproving': 0,
+            'filamentUsed': 1500}
+
+
+def _temps(a, hotend, target_hotend, bed=60, target_bed=60):
+    a.update({'commandType': 1003, 'currentTemp': hotend * 100, 'targetTemp': target_hotend * 100})
+    a.update({'commandType': 1004, 'currentTemp': bed * 100, 'targetTemp': target_bed * 100})
+
+
+def _changes(events):
+    assert all(event_type == EVENT_ANOMALY for event_type, _ in events)
+    return [(data['anomaly'], data['active']) for _, data in events]
+
+
+def test_streaming_statistics():
+    random.seed(3)
+    values = [random.gauss(0, 2) for _ in range(1000)]
+    welford = Welford()
+    for value in values:
+        welford.add(value)
+    assert abs(welford.mean - statistics.mean(values)) < 1e-9
+    assert abs(welford.stdev - statistics.stdev(values)) < 1e-9
+
+    slope = EwSlope(60)
+    assert slope.slope is None
+    for t in range(0, 300, 5):
+        slope.add(20 + 0.5 * t + random.gauss(0, 0.5), t)
+    assert abs(slope.slope - 0.5) < 0.02
+    # Recent samples dominate: the slope follows a plateau
+    for t in range(300, 600, 5):
+        slope.add(170, t)
+    assert abs(slope.slope) < 0.02
+
+
+def test_heating_failed():
+    a = AnkerData()
+    monitor = AnkerAnomalyMonitor(a)
+    now = 0
+    # Heats up, then plateaus 40°C below the target
+    for temp in list(range(25, 170, 5)) + [170] * 120:
+        _temps(a, temp, 210)
+        events = monitor.check(now)
+        now += 5
+        if events:
+            break
+    assert _changes(events) == [('heating_failed', True)]
+    assert events[0][1]['heater'] == 'hotend'
+    assert now > 300
+    assert monitor.value('heating_failed') and monitor.value('heating_failed.target') == 210
+
+    _temps(a, 170, 0)
+    assert _changes(monitor.check(now)) == [('heating_failed', False)]
+    assert not monitor.value('heating_failed') and monitor.value('heating_failed.heater') is None
+
+
+def test_slow_heating_is_not_flagged():
+    a = AnkerData()
+    monitor = AnkerAnomalyMonitor(a)
+    # The bed takes 14 minutes, but keeps heating up
+    for i in range(170):
+        _temps(a, 25, 0, 25 + i * 0.21, 60)
+        assert monitor.check(i * 5) == []
+
+
+def test_temperature_drop_and_overshoot():
+    a = AnkerData()
+    monitor = AnkerAnomalyMonitor(a)
+    a.update(_schedule(10))
+    now = 0
+    random.seed(5)
+    for _ in range(60):
+        _temps(a, round(210 + random.gauss(0, 0.5), 1), 210)
+        assert monitor.check(now) == []
+        now += 5
+
+    # A single bad reading is smoothed away, a sustained drop is not
+    _temps(a, 180, 210)
+    assert monitor.check(now) == []
+    for _ in range(10):
+        now += 5
+        events = monitor.check(now)
+        if events:
+            break
+    assert _changes(events) == [('temperature_drop', True)]
+    assert events[0][1]['job_name'] == 'benchy_PLA'
+
+    now += 60
+    _temps(a, 210, 210)
+    for _ in range(10):
+        now += 5
+        events = monitor.check(now)
+        if events:
+            break
+    assert _changes(events) == [('temperature_drop', False)]
+
+    _temps(a, 210, 210, 80, 60)
+    for _ in range(10):
+        now += 5
+        events = monitor.check(now)
+        if events:
+            break
+    assert _changes(events) == [('thermal_overshoot', True)]
+    assert monitor.value('thermal_overshoot.heater') == 'bed'
+
+
+def test_lowered_target_is_not_an_overshoot():
+    a = AnkerData()
+    monitor = AnkerAnomalyMonitor(a)
+    a.update(_schedule(10))
+    now = 0
+    for _ in range(30):
+        _temps(a, 220, 220)
+        assert monitor.check(now) == []
+        now += 5
+    # A temperature step down at a layer change: the hotend takes a while to cool down
+    for temp in range(220, 190, -1):
+        _temps(a, temp, 190)
+        assert monitor.check(now) == []
+        now += 5
+    for _ in range(30):
+        _temps(a, 190, 190)
+        assert monitor.check(now) == []
+        now += 5
+
+    # Once it got down to the new target, rising above it is an overshoot
+    _temps(a, 215, 190)
+    for _ in range(10):
+        now += 5
+        events = monitor.check(now)
+        if events:
+            break
+    assert _changes(events) == [('thermal_overshoot', True)]
+    assert monitor.value('thermal_overshoot.heater') == 'hotend'
+
+
+def test_print_stalled():
+    a = AnkerData()
+    monitor = AnkerAnomalyMonitor(a)
+    a.update(_schedule(10))
+    _temps(a, 210, 210)
+    assert monitor.check(0) == []
+    assert monitor.check(599) == []
+    assert _changes(monitor.check(601)) == [('print_stalled', True)]
+    assert monitor.value('print_stalled.stalled_for') == 601
+
+    a.update(_schedule(11))
+    assert _changes(monitor.check(602)) == [('print_stalled', False)]
+
+    # Slow layers extend the timeout
+    for layer in range(1, 8):
+        a._layer_timings.record(layer, now=layer * 400)
+    a.update({'commandType': 1052, 'real_print_layer': 8, 'total_layer': 100})
+    assert monitor.check(700) == []
+    assert monitor.check(1500) == []
+    assert _changes(monitor.check(1901)) == [('print_stalled', True)]
@@ -0,0 +1,57 @@
+import json
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent) + '\\custom_components')
+
+from custom_components.ankermake.api_status import ApiStatusTracker
+from custom_components.ankermake.sensor_manifest import api_service_description
+from tests.fake_ankerctl import API_STATUS
+
+
+def _body(status: dict) -> bytes:
+    return json.dumps(status).encode()
+
+
+def test_unchanged_status_is_skipped():
+    tracker = ApiStatusTracker()
+    assert tracker.update(_body(API_STATUS))
+    assert tracker.services == {'filetransfer', 'pppp', 'videoqueue', 'mqttqueue'}
+    assert set(tracker.revisions.values()) == {1}
+    data = tracker.data
+    assert not tracker.update(_body(API_STATUS))
+    assert tracker.unchanged == 1 and tracker.data is data
+
+
+def test_revisions_follow_their_slice():
+    tracker = ApiStatusTracker()
+    tracker.update(_body(API_STATUS))
+    status = json.loads(_body(API_STATUS))
+    status['services']['pppp'] = {'online': False, 'state': 'Stopped'}
+    status['version']['server'] = '1.9.1'  # Not part of any service
+    tracker.update(_body(status))
+    assert tracker.revisions == {'filetransfer': 1, 'pppp': 2, 'videoqueue': 1, 'mqttqueue': 1}
+
+    # The possible states are an attribute of every service
+    status['possible_states']['Starting'] = 2
+    tracker.update(_body(status))
+    assert set(tracker.revisions.values()) == {2, 3}
+
+    del status['services']['videoqueue']
+    status['services']['camera'] = {'online': True, 'state': 'Running'}
+    tracker.update(_body(status))
+    assert tracker.services == {'filetransfer', 'pppp', 'mqttqueue', 'camera'} and tracker.revisions['camera'] == 1
+    # A service that is no longer reported keeps its revision (and gets a new one, so its entity updates)
+    assert tracker.revisions['videoqueue'] == 3
+
+    status['services']['videoqueue'] = API_STATUS['services']['videoqueue']
+    tracker.update(_body(status))
+    assert 'videoqueue' in tracker.services and tracker.revisions['videoqueue'] == 4
+
+
+def test_service_descriptions_keep_their_unique_ids():
+    assert api_service_description('mqttqueue')[0].key == 'service_mqtt'
+    assert api_service_description('mqttqueue')[0].name == 'MQTT Service'
+    assert api_service_description('pppp')[0].key == 'service_pppp'
+    description, attrs = api_service_description('camera')
+    assert description.name == 'Camera Service' and attrs['state'] == '%SVC_ONLINE=camera'
@@ -0,0 +1,24 @@
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent) + '\\custom_components')
+
+from custom_components.ankermake.ankermake_mqtt_adapter import AnkerData
+from custom_components.ankermake.capture import CAPTURE_SIZE
+
+
+def test_unhandled_command_types_are_captured():
+    a = AnkerData()
+    # Unknown command types no longer raise
+    for i in range(CAPTURE_SIZE + 5):
+        a.update({'commandType': 9999, 'value': i, 'nested': {'flag': i % 2 == 0}})
+    a.update({'commandType': 9999, 'value': 'text'})
+    a.update({'commandType': 1081, 'state': 1})
+
+    captured = a._capture.as_dict()
+    assert captured[9999]['count'] == CAPTURE_SIZE + 6
+    assert len(captured[9999]['payloads']) == CAPTURE_SIZE
+    assert captured[9999]['fields'] == {'value': ['int', 'str'], 'nested.flag': ['bool']}
+    assert a._capture.value(9999, 'value') == 'text'
+    assert a._capture.value(1081, 'state') == 1
+    assert a._capture.value(1084, 'state') is None
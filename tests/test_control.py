@@ -0,0 +1,116 @@
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).parent.parent) + '\\custom_components')
+
+from custom_components.ankermake.anker_models import AnkerException
+from custom_components.ankermake.ankerctl_util import AnkerCtrlChannel, AnkerUtilException
+from custom_components.ankermake.control import OptimisticControl
+from fake_ankerctl import FakeAnkerctl
+
+
+class FakePrinter:
+    """Accepts values with a delay, optionally failing or hanging on some of them."""
+
+    def __init__(self, fail: int = 0, hang: int = 0):
+        self.fail = fail  # Number of sends that fail
+        self.hang = hang  # Number of sends that never complete
+        self.sent = []
+        self.changes = 0
+
+    async def send(self, value):
+        await asyncio.sleep(0.01)
+        if self.fail:
+            self.fail -= 1
+            raise AnkerUtilException("Connection refused")
+        if self.hang:
+            self.hang -= 1
+            await asyncio.sleep(10)
+        self.sent.append(value)
+
+    def make_control(self, timeout: float = 1, initial=False) -> OptimisticControl:
+        def on_change():
+            self.changes += 1
+
+        return OptimisticControl('light', self.send, on_change, initial=initial, timeout=timeout)
+
+
+async def _coalesce():
+    printer = FakePrinter()
+    control = printer.make_control()
+    waiters = []
+    for value in (True, False, True, False):
+        waiters.append(control.set(value))
+        assert control.state == value
+        await asyncio.sleep(0.001)
+    await asyncio.gather(*waiters)
+    return printer, control
+
+
+def test_coalesce_and_confirm():
+    printer, control = asyncio.run(_coalesce())
+    # The first toggle is in flight, the rest collapse into the final state
+    assert printer.sent == [True, False]
+    assert control.confirmed is False and not control.pending
+    assert control.latency.count == 2
+    assert control.rollbacks == 0 and printer.changes == 0
+
+
+async def _rollback(printer: FakePrinter):
+    control = printer.make_control(timeout=0.05)
+    with pytest.raises(AnkerException):
+        await control.set(True)
+    return control
+
+
+def test_rollback_when_send_fails():
+    printer = FakePrinter(fail=1)
+    control = asyncio.run(_rollback(printer))
+    assert control.state is False and control.rollbacks == 1 and printer.changes == 1
+
+
+def test_rollback_when_not_accepted_in_time():
+    printer = FakePrinter(hang=1)
+    control = asyncio.run(_rollback(printer))
+    assert control.state is False and control.rollbacks == 1 and printer.sent == []
+
+
+async def _newer_value_after_failure():
+    # The first value fails, the one set while it was in flight is sent next
+    printer = FakePrinter(fail=1)
+    control = printer.make_control(timeout=0.05, initial='SD')
+    first = control.set('HD')
+    await asyncio.sleep(0.001)
+    second = control.set('FHD')
+    results = await asyncio.gather(first, second, return_exceptions=True)
+    return printer, control, results
+
+
+def test_newer_value_is_not_rolled_back():
+    printer, control, results = asyncio.run(_newer_value_after_failure())
+    assert isinstance(results[0], AnkerException) and results[1] is None
+    assert printer.sent == ['FHD']
+    assert control.state == 'FHD' and control.confirmed == 'FHD'
+    assert control.rollbacks == 0 and printer.changes == 0
+
+
+async def _ctrl_channel():
+    fake = FakeAnkerctl(rate=0)
+    await fake.start()
+    channel = AnkerCtrlChannel(fake.ws_url)
+    try:
+        await channel.set_light(True)
+        await channel.set_light(False)
+        await asyncio.sleep(0.1)
+    finally:
+        await channel.close()
+        await fake.stop()
+    return fake
+
+
+def test_ctrl_channel_sends_state():
+    fake = asyncio.run(_ctrl_channel())
+    assert fake.ctrl_messages == [{'light': True}, {'light': False}]
@@ -0,0 +1,114 @@
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent) + '\\custom_components')
+
+from custom_components.ankermake.ankerctl_util import AnkerCtrlChannel, AnkerUtilException
+
+
+def _channel(max_in_flight: int = 16, reply_after: float | None = 0.01, fail_on: int = None):
+    """A channel without a socket: sent commands are recorded, and (optionally) replied to after reply_after."""
+    channel = AnkerCtrlChannel('ws://fake', max_in_flight=max_in_flight)
+    channel.sent = []
+    channel.max_in_flight = 0
+
+    async def send(ctrl: str):
+        if fail_on is not None and len(channel.sent) == fail_on:
+            raise AnkerUtilException("Connection refused")
+        command = json.loads(ctrl)
+        channel.sent.append(command['cmdData'])
+        in_flight = sum(not future.done() for *_, future in channel._pending)
+        channel.max_in_flight = max(channel.max_in_flight, in_flight)
+        if reply_after is not None:
+            asyncio.get_running_loop().call_later(reply_after, channel.handle_reply,
+                                                  {'commandType': 1043, 'resData': f"ok {command['cmdData']}"})
+
+    channel.send = send
+    return channel
+
+
+def test_pipelining_and_reply_matching():
+    async def run():
+        channel = _channel(max_in_flight=2)
+        results = await channel.send_gcode(['G28', 'M104 S200', 'M140 S60', 'M105'], timeout=1)
+        assert channel.sent == ['G28', 'M104 S200', 'M140 S60', 'M105']
+        assert channel.max_in_flight == 2
+        # Replies are matched in order
+        assert [r['reply']['resData'] for r in results] == ['ok G28', 'ok M104 S200', 'ok M140 S60', 'ok M105']
+        assert all(r['error'] is None and r['latency'] >= 0 for r in results)
+        assert channel.latency.count == 4 and not channel._pending
+
+    asyncio.run(run())
+
+
+def test_timeouts_free_the_window():
+    async def run():
+        channel = _channel(max_in_flight=2, reply_after=None)
+        # Longer than the window, without any reply: every command times out on its own
+        results = await asyncio.wait_for(channel.send_gcode(['G28', 'G1 X10', 'G1 Y10'], timeout=0.2), 2)
+        assert [r['error'] for r in results] == ["Timed out waiting for reply"] * 3
+        assert channel.timeouts == 3 and len(channel._pending) == 3
+        # A late reply isn't matched to an expired command
+        channel.handle_reply({'commandType': 1043})
+        assert channel.latency.count == 0 and len(channel._pending) == 2
+
+    asyncio.run(run())
+
+
+def test_late_reply_is_not_handed_to_the_next_command():
+    async def run():
+        channel = _channel(reply_after=None)
+        results = await channel.send_gcode(['G28'], timeout=0.05)
+        assert results[0]['error'] == "Timed out waiting for reply"
+        batch = asyncio.create_task(channel.send_gcode(['M104 S200', 'M105'], timeout=1))
+        await asyncio.sleep(0.01)
+        # The late reply to G28 arrives first, then the replies to the batch
+        for reply in ('ok G28', 'ok M104 S200', 'ok M105'):
+            channel.handle_reply({'commandType': 1043, 'resData': reply})
+        results = await batch
+        assert [r['reply']['resData'] for r in results] == ['ok M104 S200', 'ok M105']
+        assert not channel._pending
+
+    asyncio.run(run())
+
+
+def test_echoed_command_is_matched():
+    async def run():
+        channel = _channel(reply_after=None)
+        batch = asyncio.create_task(channel.send_gcode(['G28', 'M105'], timeout=0.2))
+        await asyncio.sleep(0.01)
+        # The printer skipped G28's reply, the echo still matches the reply to M105
+        channel.handle_reply({'commandType': 1043, 'cmdData': 'M105', 'resData': 'ok'})
+        results = await batch
+        assert results[0]['error'] == "Timed out waiting for reply"
+        assert results[1]['reply']['cmdData'] == 'M105'
+
+    asyncio.run(run())
+
+
+def test_lost_replies_are_forgotten(monkeypatch):
+    async def run():
+        channel = _channel(reply_after=None)
+        await channel.send_gcode(['G28'], timeout=0.05)
+        monkeypatch.setattr('custom_components.ankermake.ankerctl_util.LATE_REPLY_TIMEOUT', 0)
+        batch = asyncio.create_task(channel.send_gcode(['M105'], timeout=1))
+        await asyncio.sleep(0.01)
+        channel.handle_reply({'commandType': 1043, 'resData': 'ok M105'})
+        assert (await batch)[0]['reply']['resData'] == 'ok M105'
+
+    asyncio.run(run())
+
+
+def test_send_failure():
+    async def run():
+        channel = _channel(fail_on=1)
+        results = await channel.send_gcode(['G28', 'M105', 'M106'], timeout=1)
+        assert results[0]['reply']['resData'] == 'ok G28'
+        assert [r['error'] for r in results[1:]] == ["Failed to send gcode: Connection refused"] * 2
+        assert not channel._pending
+        # The window was released for the failed command
+        assert channel._window._value == 16
+
+    asyncio.run(run())
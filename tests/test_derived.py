@@ -0,0 +1,46 @@
+import sys
+from collections import Counter
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent) + '\\custom_components')
+
+from custom_components.ankermake.ankermake_mqtt_adapter import AnkerData
+from custom_components.ankermake.anker_models import FilamentType
+
+
+def test_derived_values_follow_their_fields():
+    data = AnkerData()
+    assert not data.printing
+    data.job_name = 'benchy_PETG'
+    assert data.printing
+
+    data.filament_used = 1000
+    weight, density = data.filament_weight, data.filament_density
+    assert data._derived_cache['filament_weight'] == weight
+    data.filament = FilamentType.PETG.value
+    # filament_density depends on filament_weight, so both are invalidated
+    assert 'filament_weight' not in data._derived_cache and 'filament_density' not in data._derived_cache
+    assert data.filament_weight != weight and data.filament_density != density
+
+    data.error_code = '0xFF01030001'
+    assert data.error_occurrences == 0
+    data._error_counts = Counter({'0xFF01030001': 1})
+    assert data.error_occurrences == 1
+
+    data.error_message = 'Filament broken'
+    assert data.in_error_state
+    data._remove_error()
+    assert not data.in_error_state
+
+    data._api_status = {'possible_states': {'Running': 1}}
+    assert data.api_service_possible_states == ['Running', 'Unavailable']
+    data._api_status = {'possible_states': {'Running': 1, 'Stopped': 0}}
+    assert data.api_service_possible_states == ['Running', 'Stopped', 'Unavailable']
+
+
+def test_reset_invalidates():
+    data = AnkerData()
+    data.job_name, data.progress = 'benchy', 50
+    assert data.printing
+    data._reset()
+    assert not data.printing
@@ -0,0 +1,35 @@
+import asyncio
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.append(str(Path(__file__).parent.parent) + '\\custom_components')
+
+from custom_components.ankermake.ankermake_mqtt_adapter import AnkerData
+from custom_components.ankermake.api_status import ApiStatusTracker
+from custom_components.ankermake.const import DOMAIN
+from custom_components.ankermake.diagnostics import async_get_config_entry_diagnostics
+from custom_components.ankermake.metrics import AnkerMetrics
+from fake_ankerctl import API_STATUS, print_lifecycle
+
+
+def test_whole_payload_is_redacted():
+    ankerdata = AnkerData()
+    for message in print_lifecycle(name='secret_benchy_PLA', preview='http://10.0.0.5:4470/preview.png'):
+        ankerdata._capture.capture(message['commandType'], message)
+        ankerdata.update(message)
+        if ankerdata.job_name:
+            break
+    ankerdata._api_status = {**API_STATUS, 'host': '10.0.0.5'}
+    coordinator = SimpleNamespace(ankerdata=ankerdata, api_status=ApiStatusTracker(), metrics=AnkerMetrics(),
+                                  transport=SimpleNamespace(name='websocket'))
+    hass = SimpleNamespace(data={DOMAIN: {'entry': coordinator}})
+    entry = SimpleNamespace(entry_id='entry', data={'host': 'http://10.0.0.5:4470', 'printer_name': 'M5',
+                                                    'mqtt_credentials': {'sn': 'AK7ABC', 'mqtt_key': '00ff'}})
+
+    diagnostics = asyncio.run(async_get_config_entry_diagnostics(hass, entry))
+    dump = repr(diagnostics)
+    for secret in ('10.0.0.5', 'secret_benchy', 'AK7ABC', '00ff'):
+        assert secret not in dump
+    assert diagnostics['config']['printer_name'] == 'M5'
+    assert diagnostics['ankerdata']['job_name'] == '**REDACTED**'
@@ -0,0 +1,37 @@
+import asyncio
+import sys
+from pathlib import Path
+
+import aiohttp
+
+sys.path.append(str(Path(__file__).parent.parent) + '\\custom_components')
+
+from custom_components.ankermake.discovery import candidate_hosts, discover
+from fake_ankerctl import start_fleet
+
+
+def test_candidate_hosts():
+    hosts = candidate_hosts([('192.168.1.10', 24), ('10.0.0.5', 8), ('127.0.0.1', 8)])
+    assert '192.168.1.1' in hosts and '192.168.1.254' in hosts
+    assert '192.168.1.10' not in hosts
+    # Large subnets are narrowed down to the /24 around the address
+    assert '10.0.0.1' in hosts and '10.0.1.1' not in hosts
+    assert hosts[0] == '10.0.0.1' and '127.0.0.1' in hosts
+    assert len(hosts) == 253 + 253 + 1
+
+
+async def _discover_fleet():
+    fleet = await start_fleet(3, rate=0.1)
+    try:
+        async with aiohttp.ClientSession() as session:
+            ports = [fake.port for fake in fleet] + [1]  # Nothing listens on port 1
+            return await discover(session, ['127.0.0.1'], ports, timeout=1), fleet
+    finally:
+        for fake in fleet:
+            await fake.stop()
+
+
+def test_discover():
+    found, fleet = asyncio.run(_discover_fleet())
+    assert sorted(instance['host'] for instance in found) == sorted(fake.ws_url for fake in fleet)
+    assert all(instance['version'] == '1.9.0' for instance in found)
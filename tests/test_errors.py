@@ -0,0 +1,62 @@
+import json
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent) + '\\custom_components')
+
+from custom_components.ankermake.anker_models import FILAMENT_BROKEN_CODE
+from custom_components.ankermake.ankermake_mqtt_adapter import AnkerData
+from custom_components.ankermake.errors import ErrorRegistry, parse_ext
+
+FILAMENT_BROKEN = {'commandType': 1085, 'errorCode': '0xff01030001', 'errorLevel': 'P1',
+                   'ext': '{"curFilamentType":["PLA"]}'}
+
+
+def test_registry():
+    registry = ErrorRegistry({FILAMENT_BROKEN_CODE: 'Filament Broken'})
+    info = registry.lookup('0xff01030001')
+    assert info.known and info.code == FILAMENT_BROKEN_CODE and info.message == 'Filament Broken'
+    assert (info.source, info.subsystem, info.category, info.number) == (0xFF, 1, 3, 1)
+    assert registry.lookup('0xff01030001') is info
+
+    unknown = registry.lookup('0xFF02010007')
+    assert not unknown.known and unknown.message == '0xFF02010007' and unknown.subsystem == 2
+    assert not registry.lookup('garbage').known
+
+
+def test_registry_file(tmp_path):
+    registry = ErrorRegistry({FILAMENT_BROKEN_CODE: 'Filament Broken'})
+    assert registry.load(str(tmp_path / 'missing.json')) == 0
+    path = tmp_path / 'ankermake_error_codes.json'
+    path.write_text(json.dumps({'0xFF02010007': 'Bed thermistor', '0xFF01030001': {'message': 'Out of filament'},
+                                'nope': 'Ignored'}))
+    registry.load(str(path))
+    assert len(registry) == 2
+    assert registry.lookup('0xFF02010007').message == 'Bed thermistor'
+    assert registry.lookup(FILAMENT_BROKEN_CODE).message == 'Out of filament'
+
+
+def test_parse_ext():
+    assert parse_ext('') == {}
+    assert parse_ext('{"curFilamentType":["PLA"],"nozzleTemp":[200,210]}') == {
+        'cur_filament_type': 'PLA', 'nozzle_temp': [200, 210]}
+    assert parse_ext('not json') == {'raw': 'not json'}
+
+
+def test_anker_data_errors():
+    a = AnkerData()
+    a.update(FILAMENT_BROKEN)
+    assert a.error_code == FILAMENT_BROKEN_CODE and a.error_message == 'Filament Broken'
+    assert a.error_details == {'cur_filament_type': 'PLA'} and a.error_severity == 'ERROR'
+    assert a.error_subsystem == 1 and a.error_category == 3
+    a.update(FILAMENT_BROKEN)  # Repeated until resolved
+    assert a.error_occurrences == 1
+
+    a._remove_error()
+    assert a.error_details == {} and a.error_occurrences == 0
+    a.update(FILAMENT_BROKEN)
+    a.update({'commandType': 1085, 'errorCode': '0xFF02010007', 'errorLevel': 'P0'})
+    assert a.error_message == '0xFF02010007' and a.error_details == {}
+    assert dict(a._error_counts) == {FILAMENT_BROKEN_CODE: 2, '0xFF02010007': 1}
+    a._reset()  # The counters survive the end of the job
+    assert a._error_counts[FILAMENT_BROKEN_CODE] == 2
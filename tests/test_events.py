@@ -0,0 +1,72 @@
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent) + '\\custom_components')
+
+from custom_components.ankermake.ankermake_mqtt_adapter import AnkerData
+from custom_components.ankermake.const import (EVENT_PRINT_STARTED,
+                                               EVENT_PRINT_FINISHED,
+                                               EVENT_LAYER_CHANGED,
+                                               EVENT_PRINT_ERROR,
+                                               EVENT_FILAMENT_RUNOUT)
+from custom_components.ankermake.events import AnkerEventTracker
+
+
+def _schedule(progress):
+    return {'commandType': 1001, 'name': 'benchy_PLA', 'img': '', 'progress': progress * 100, 'totalTime': 60,
+            'time': 600, 'aiFlag': 0, 'AISwitch': 0, 'AISensitivity': 0, 'AIPausePrint': 0, 'AIJoinImproving': 0,
+            'filamentUsed': 1500}
+
+
+def _types(events):
+    return [event_type for event_type, _ in events]
+
+
+def test_transition_events_fire_once():
+    a = AnkerData()
+    tracker = AnkerEventTracker(a)
+    a.update({'commandType': 1003, 'currentTemp': 21000, 'targetTemp': 21000})
+    assert tracker.check() == []
+
+    a.update(_schedule(10))
+    assert _types(tracker.check()) == [EVENT_PRINT_STARTED]
+    # Repeated schedule messages (and checks) don't fire again
+    a.update(_schedule(20))
+    assert tracker.check() == []
+    assert tracker.check() == []
+
+    a.update({'commandType': 1052, 'real_print_layer': 5, 'total_layer': 100})
+    events = tracker.check()
+    assert _types(events) == [EVENT_LAYER_CHANGED]
+    assert events[0][1]['current_layer'] == 5
+    assert tracker.check() == []
+
+    a.update({'commandType': 1085, 'errorCode': '0xFF01030001', 'errorLevel': 'P1', 'ext': ''})
+    assert _types(tracker.check()) == [EVENT_PRINT_ERROR, EVENT_FILAMENT_RUNOUT]
+    assert tracker.check() == []
+
+    a._remove_error()
+    a.update(_schedule(100))
+    assert _types(tracker.check()) == [EVENT_PRINT_FINISHED]
+    assert tracker.check() == []
+
+
+def test_restart_mid_print_doesnt_fire():
+    a = AnkerData()
+    tracker = AnkerEventTracker(a)
+    # Polled before the printer reported anything
+    assert tracker.check() == []
+
+    # Home Assistant (re)started while the printer was printing
+    a.update({'commandType': 1003, 'currentTemp': 21000, 'targetTemp': 21000})
+    a.update(_schedule(40))
+    a.update({'commandType': 1052, 'real_print_layer': 30, 'total_layer': 100})
+    assert tracker.check() == []
+    a.update(_schedule(50))
+    assert tracker.check() == []
+
+    a.update({'commandType': 1052, 'real_print_layer': 31, 'total_layer': 100})
+    assert _types(tracker.check()) == [EVENT_LAYER_CHANGED]
+    a.update(_schedule(100))
+    assert _types(tracker.check()) == [EVENT_PRINT_FINISHED]
+
@@ -0,0 +1,96 @@
+import base64
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent) + '\\custom_components')
+
+from custom_components.ankermake.ankermake_mqtt_adapter import AnkerData, FilamentType
+from custom_components.ankermake.gcode_analyzer import analyze_gcode
+
+THUMBNAIL = b'\x89PNG\r\n\x1a\n' + bytes(range(64))
+
+
+def _write_gcode(path: Path):
+    encoded = base64.b64encode(THUMBNAIL).decode()
+    lines = [
+        '; generated by AnkerMake Studio',
+        '; thumbnail begin 16x16 100',
+        '; ' + base64.b64encode(b'small').decode(),
+        '; thumbnail end',
+        '; thumbnail begin 300x300 100',
+        '; ' + encoded[:40],
+        '; ' + encoded[40:],
+        '; thumbnail end',
+        'M83',
+        ';LAYER_CHANGE',
+        'G1 X10 Y10 E1.5 F1200',
+        'G1 X20 Y10 E-0.5 ; retract',
+        ';LAYER_CHANGE',
+        'G1 X10 Y20 E2.0',
+        'M82',
+        'G92 E0',
+        'G1 X10 Y30 E3.0',
+        'G1 X10 Y40 E2.5',
+        '; filament used [mm] = 6.5',
+        '; filament_type = PETG;PLA',
+        '; estimated printing time (normal mode) = 1h 2m 3s',
+    ]
+    path.write_text('\n'.join(lines) + '\n')
+
+
+def test_analyze_gcode(tmp_path):
+    path = tmp_path / 'Benchy_PLA.gcode'
+    _write_gcode(path)
+    metadata = analyze_gcode(str(path))
+
+    assert metadata.filament == FilamentType.PETG.value
+    assert metadata.layer_count == 2
+    # Retractions and the absolute move backwards are not counted
+    assert metadata.extrusion == 6.5
+    assert metadata.estimated_time == 3723
+    assert metadata.thumbnail == THUMBNAIL
+    assert metadata.header['filament used [mm]'] == '6.5'
+
+    # Cached by file hash
+    assert analyze_gcode(str(path)) is metadata
+
+
+def test_job_metadata_prefills_ankerdata(tmp_path):
+    path = tmp_path / 'Benchy_PLA.gcode'
+    _write_gcode(path)
+
+    a = AnkerData()
+    a.register_job_metadata(str(path), analyze_gcode(str(path)))
+    a.job_name = 'benchy_PLA'
+    a._new_print_job()
+
+    # The sliced filament type wins over the one guessed from the file name
+    assert a.filament == FilamentType.PETG.value
+    assert a.total_layers == 2
+    assert a.slicer_estimated_time == 3723
+    assert a.thumbnail == THUMBNAIL
+
+    # The next job without analyzed metadata doesn't keep the previous job's values
+    a.job_name = 'cube'
+    a._new_print_job()
+    assert a.slicer_estimated_time == 0
+    assert a.thumbnail is None
+
+
+def test_malformed_thumbnail_header(tmp_path):
+    path = tmp_path / 'broken.gcode'
+    path.write_text('\n'.join([
+        '; thumbnail begin',
+        '; bm90IGEgaGVhZGVy',
+        '; thumbnail end',
+        '; thumbnail begin 300 100',
+        '; thumbnail end',
+        ';LAYER_CHANGE',
+        'G1 X10 Y10 E1.5',
+    ]) + '\n')
+    metadata = analyze_gcode(str(path))
+
+    assert metadata.thumbnail is None
+    assert metadata.layer_count == 1
+    # The thumbnail data isn't parsed as header values
+    assert metadata.header == {}
@@ -0,0 +1,44 @@
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent) + '\\custom_components')
+
+from custom_components.ankermake.ingest import CoalescingQueue
+
+
+def _batch(queue):
+    return [(m['commandType'], m.get('v')) for m in asyncio.run(queue.get_batch())]
+
+
+def test_state_messages_are_coalesced():
+    q = CoalescingQueue()
+    for i in range(10):
+        q.put({'commandType': 1003, 'v': i})
+        q.put({'commandType': 1004, 'v': i})
+    assert _batch(q) == [(1003, 9), (1004, 9)]
+    assert q.metrics.ingest_coalesced == 18
+
+
+def test_edge_messages_are_kept_in_order():
+    q = CoalescingQueue()
+    q.put({'commandType': 1001, 'v': 1})
+    q.put({'commandType': 1008})
+    q.put({'commandType': 1008})
+    q.put({'commandType': 1001, 'v': 2})
+    q.put({'commandType': 1068})
+    q.put({'commandType': 1001, 'v': 3})
+    q.put({'commandType': 1001, 'v': 4})
+    # The schedule before the stop (1068) must not be replaced by one that arrived after it
+    assert _batch(q) == [(1001, 1), (1008, None), (1008, None), (1001, 2), (1068, None), (1001, 4)]
+
+
+def test_bounded():
+    q = CoalescingQueue(maxsize=3)
+    q.put({'commandType': 1003, 'v': 1})
+    q.put({'commandType': 1085, 'v': 1})
+    q.put({'commandType': 1085, 'v': 2})
+    q.put({'commandType': 1085, 'v': 3})  # Drops the temperature first
+    q.put({'commandType': 1085, 'v': 4})  # Then the oldest edge message
+    assert _batch(q) == [(1085, 2), (1085, 3), (1085, 4)]
+    assert q.metrics.ingest_dropped == 2
@@ -0,0 +1,93 @@
+import asyncio
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.append(str(Path(__file__).parent.parent) + '\\custom_components')
+
+from custom_components.ankermake.ankermake_mqtt_adapter import AnkerData
+from custom_components.ankermake.jobs import JobStore, OUTCOME_CANCELLED, OUTCOME_FINISHED, hourly_statistics
+
+
+def _schedule(progress, filament_used=1500, elapsed=600):
+    return {'commandType': 1001, 'name': 'benchy_PLA', 'img': '', 'progress': progress * 100, 'totalTime': elapsed,
+            'time': 600, 'aiFlag': 0, 'AISwitch': 0, 'AISensitivity': 0, 'AIPausePrint': 0, 'AIJoinImproving': 0,
+            'filamentUsed': filament_used}
+
+
+def _job(end, duration=3600, filament_used=2.0, filament_weight=6.0):
+    return {'end': end, 'duration': duration, 'filament_used': filament_used, 'filament_weight': filament_weight}
+
+
+class FakeStore:
+    def __init__(self):
+        self.saved = None
+
+    def async_delay_save(self, data_func, delay):
+        self.saved = data_func()
+
+    async def async_save(self, data):
+        self.saved = data
+
+
+def test_hourly_statistics():
+    jobs = [
+        _job('2024-03-01T10:15:00+00:00'),
+        _job('2024-03-01T10:45:00+00:00', duration=1800),
+        _job('2024-03-01T13:05:00+01:00', filament_used=1.5),  # 12:05 UTC
+    ]
+    rows, last, before_last = hourly_statistics(jobs, None, {})
+    assert [row['start'].hour for row in rows['jobs']] == [10, 12]
+    assert [row['sum'] for row in rows['jobs']] == [2, 3]
+    assert [row['sum'] for row in rows['print_time']] == [1.5, 2.5]
+    assert [row['sum'] for row in rows['filament_used']] == [4.0, 5.5]
+    assert last == datetime(2024, 3, 1, 12, tzinfo=timezone.utc)
+    assert before_last == {'jobs': 2, 'print_time': 1.5, 'filament_used': 4.0, 'filament_weight': 12.0}
+
+    # The next import rewrites the last hour (with the jobs that ended since) and continues the sums
+    jobs.append(_job('2024-03-01T12:30:00+00:00'))
+    jobs.append(_job('2024-03-02T08:00:00+00:00'))
+    rows, last, before_last = hourly_statistics(jobs, last, before_last)
+    assert [row['start'] for row in rows['jobs']] == [datetime(2024, 3, 1, 12, tzinfo=timezone.utc),
+                                                      datetime(2024, 3, 2, 8, tzinfo=timezone.utc)]
+    assert [row['sum'] for row in rows['jobs']] == [4, 5]
+    assert before_last['jobs'] == 4
+
+    # Nothing pending
+    rows, same, _ = hourly_statistics([], last, before_last)
+    assert rows['jobs'] == [] and same == last
+
+
+def test_job_summaries():
+    hass = SimpleNamespace(config=SimpleNamespace(components=set()))
+    jobs = JobStore(hass, 'entry', 'AnkerMake M5')
+    jobs._store = FakeStore()
+    assert jobs.statistic_prefix == 'ankermake:ankermake_m5'
+
+    a = AnkerData()
+    a.update(_schedule(10, filament_used=500, elapsed=300))
+    jobs.start(a)
+    a.update(_schedule(50, filament_used=2500, elapsed=1200))
+    jobs.sample(a)
+    jobs.error()
+    summary = jobs.finish(OUTCOME_FINISHED, a)
+    assert summary.job_name == 'benchy_PLA'
+    assert summary.duration == 1200 and summary.filament_used == 2.5 and summary.filament_weight > 0
+    assert summary.outcome == OUTCOME_FINISHED and summary.errors == 1
+    assert not jobs.active and jobs.finish(OUTCOME_FINISHED) is None
+    assert jobs._store.saved['jobs'][0]['job_name'] == 'benchy_PLA'
+
+    # A stopped job resets the fields, the summary keeps the last values seen
+    jobs.start(a)
+    a.update(_schedule(70, filament_used=3000, elapsed=1500))
+    jobs.sample(a)
+    a._reset()
+    summary = jobs.finish(OUTCOME_CANCELLED, a)
+    assert summary.outcome == OUTCOME_CANCELLED and summary.filament_used == 3.0
+
+    # Without the recorder the jobs stay pending
+    asyncio.run(jobs.async_import_statistics())
+    assert jobs.imported_hour is None
+    rows, _, _ = jobs.pending_statistics()
+    assert rows['jobs'][-1]['sum'] == 2
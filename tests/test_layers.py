@@ -0,0 +1,58 @@
+import random
+import statistics
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent) + '\\custom_components')
+
+from custom_components.ankermake.ankermake_mqtt_adapter import AnkerData
+from custom_components.ankermake.layers import LayerTimings, P2Quantile
+
+
+def test_p2_quantile():
+    random.seed(1)
+    values = [random.lognormvariate(3, 0.5) for _ in range(5000)]
+    p50, p95 = P2Quantile(0.5), P2Quantile(0.95)
+    for value in values:
+        p50.add(value)
+        p95.add(value)
+    exact = statistics.quantiles(values, n=100)
+    assert abs(p50.value - exact[49]) / exact[49] < 0.02
+    assert abs(p95.value - exact[94]) / exact[94] < 0.05
+
+    few = P2Quantile(0.5)
+    assert few.value is None
+    for value in (3, 1, 2):
+        few.add(value)
+    assert few.value == 2
+
+
+def test_layer_timings():
+    timings = LayerTimings(slowest=3)
+    now = 1_700_000_000.0
+    durations = {1: 60, 2: 30, 3: 31, 4: 90, 5: 29, 6: 45}
+    for layer in range(1, 8):
+        timings.record(layer, 'benchy_PLA', now=now)
+        timings.record(layer, 'benchy_PLA', now=now + 1)  # Repeated messages are ignored
+        now += durations.get(layer, 0)
+
+    assert timings.layers.tolist() == list(range(1, 8))
+    assert timings.durations.tolist() == list(durations.values())
+    assert timings.value('count') == 6 and timings.value('last') == 45
+    assert timings.value('mean') == round(sum(durations.values()) / 6, 1)
+    assert timings.slowest == [{'layer': 4, 'duration': 90}, {'layer': 1, 'duration': 60},
+                               {'layer': 6, 'duration': 45}]
+    result = timings.as_dict()
+    assert result['job_name'] == 'benchy_PLA' and len(result['start_times']) == 7
+
+    # A lower layer starts a new job
+    timings.record(1, 'cube_PLA', now=now)
+    assert timings.layers.tolist() == [1] and timings.job_name == 'cube_PLA' and timings.value('mean') is None
+
+
+def test_layers_from_messages():
+    data = AnkerData()
+    for layer in (1, 1, 2, 3):
+        data.update({'commandType': 1052, 'real_print_layer': layer, 'total_layer': 10})
+    assert data._layer_timings.layers.tolist() == [1, 2, 3]
+    assert data._layer_timings.value('count') == 2
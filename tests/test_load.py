@@ -0,0 +1,144 @@
+"""
+Load test: runs the integration's ingest path (AnkerMakeUpdateCoordinator's reader and applier, with the transport,
+the ingest queue, AnkerData, the event and anomaly trackers, telemetry and the job store) for a fleet of virtual printers
+served by fake_ankerctl. Both transports are tested: ankerctl's websocket and direct mqtt (against FakeMqttBroker).
+
+Every printer must receive its messages and fire its events. The CPU and memory used per printer are printed (run with
+-s), and only checked against the budgets with --benchmark (they depend on the machine).
+"""
+
+import asyncio
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+from homeassistant.core import CoreState
+
+sys.path.append(str(Path(__file__).parent.parent) + '\\custom_components')
+
+from custom_components.ankermake import AnkerMakeUpdateCoordinator
+from custom_components.ankermake.transport import MqttTransport, encode_packet
+from fake_ankerctl import FakeMqttBroker, start_fleet
+
+PRINTERS = 10
+RATE = 100  # Messages per second per printer
+DURATION = 3  # Seconds
+
+# Budgets per printer
+MAX_CPU_PER_MESSAGE = 0.001  # Seconds spent decoding and applying a single message (mean)
+MAX_CPU_SHARE = 0.25  # Share of a core per printer, including the fake ankerctl running in the same process
+MAX_MEMORY = 512 * 1024  # Bytes
+
+
+class FakeHass:
+    """Just enough of Home Assistant to run a coordinator's ingest path, events fired on the bus are recorded."""
+
+    def __init__(self, config_dir: Path):
+        self.loop = asyncio.get_running_loop()
+        self.data = {}
+        self.state = CoreState.running
+        self.fired = []
+        self.config = SimpleNamespace(path=lambda *parts: str(config_dir.joinpath(*parts)), components=set())
+        self.bus = SimpleNamespace(async_fire=lambda event_type, data: self.fired.append((event_type, data)),
+                                   async_listen_once=lambda event_type, listener: lambda: None)
+
+    def async_add_executor_job(self, target, *args):
+        return self.loop.run_in_executor(None, target, *args)
+
+    def async_create_task(self, target, *args, **kwargs):
+        return self.loop.create_task(target)
+
+    async_create_background_task = async_create_task
+
+
+def _coordinator(hass: FakeHass, name: str, host: str) -> AnkerMakeUpdateCoordinator:
+    entry = SimpleNamespace(entry_id=name, data={'host': host, 'printer_name': name}, options={})
+    return AnkerMakeUpdateCoordinator(hass, entry)
+
+
+async def _run_fleet(config_dir: Path, coordinator_factories: list) -> tuple[list, float, int]:
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    cpu_start = time.process_time()
+
+    hass = FakeHass(config_dir)
+    # The coordinators start their reader and applier tasks
+    coordinators = [factory(hass, f'printer{i}') for i, factory in enumerate(coordinator_factories)]
+    await asyncio.sleep(DURATION)
+    for coordinator in coordinators:
+        await coordinator.async_shutdown()
+
+    cpu = time.process_time() - cpu_start
+    memory = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+    return [(c, [e for e in hass.fired if e[1]['entry_id'] == c.entry.entry_id]) for c in coordinators], cpu, memory
+
+
+async def _run_websocket_fleet(config_dir: Path):
+    fleet = await start_fleet(PRINTERS, rate=RATE)
+    try:
+        return await _run_fleet(config_dir, [lambda hass, name, fake=fake: _coordinator(hass, name, fake.ws_url)
+                                             for fake in fleet])
+    finally:
+        for fake in fleet:
+            await fake.stop()
+
+
+async def _run_mqtt_fleet(config_dir: Path):
+    factories = []
+    for i in range(PRINTERS):
+        credentials = {'sn': f'AK7FAKE{i:09}', 'mqtt_key': f'{i:032x}', 'user_id': 'fake', 'email': 'fake@example.com'}
+        key = bytes.fromhex(credentials['mqtt_key'])
+        broker = FakeMqttBroker(lambda message, key=key: encode_packet(message, key), rate=RATE)
+
+        def factory(hass, name, credentials=credentials, broker=broker):
+            coordinator = _coordinator(hass, name, 'http://127.0.0.1:1')
+            # Replaced before the reader task gets to run
+            coordinator.transport = MqttTransport(credentials, coordinator.metrics, client_factory=broker.client)
+            return coordinator
+
+        factories.append(factory)
+    return await _run_fleet(config_dir, factories)
+
+
+def _check_ingest(printers: list, cpu: float, memory: int) -> dict:
+    """Checks that every printer was ingested, returns (and prints) the usage per printer."""
+    for coordinator, fired in printers:
+        # Every printer received (most of) its messages and made it into preheating/printing
+        assert coordinator.metrics.frame_rate.total > RATE * DURATION * 0.5
+        assert fired
+
+    usage = {
+        'cpu_per_message': max((c.metrics.decode_time.total + c.metrics.apply_time.total) / c.metrics.frame_rate.total
+                               for c, _ in printers),
+        'cpu_share': cpu / (PRINTERS * DURATION),
+        'memory': memory / PRINTERS,
+    }
+    print(f"\n{PRINTERS} printers at {RATE} messages/s: {usage['cpu_per_message'] * 1000:.3f} ms per message "
+          f"(budget {MAX_CPU_PER_MESSAGE * 1000} ms), {usage['cpu_share']:.1%} of a core per printer "
+          f"(budget {MAX_CPU_SHARE:.0%}), {usage['memory'] / 1024:.0f} KiB per printer "
+          f"(budget {MAX_MEMORY // 1024} KiB)")
+    return usage
+
+
+def _check_budgets(usage: dict):
+    assert usage['cpu_per_message'] < MAX_CPU_PER_MESSAGE
+    assert usage['cpu_share'] < MAX_CPU_SHARE
+    assert usage['memory'] < MAX_MEMORY
+
+
+def test_fleet_load(tmp_path):
+    _check_ingest(*asyncio.run(_run_websocket_fleet(tmp_path)))
+
+
+def test_fleet_load_mqtt(tmp_path):
+    _check_ingest(*asyncio.run(_run_mqtt_fleet(tmp_path)))
+
+
+@pytest.mark.benchmark
+def test_fleet_load_budgets(tmp_path):
+    _check_budgets(_check_ingest(*asyncio.run(_run_websocket_fleet(tmp_path))))
+    _check_budgets(_check_ingest(*asyncio.run(_run_mqtt_fleet(tmp_path))))
@@ -0,0 +1,88 @@
+import sys
+from pathlib import Path
+from unittest.mock import patch
+
+sys.path.append(str(Path(__file__).parent.parent) + '\\custom_components')
+
+from custom_components.ankermake.metrics import MAX_FRAME_TYPES, AnkerMetrics, Histogram, RateMeter
+
+
+def test_histogram():
+    h = Histogram(bounds=(0.001, 0.01, 0.1))
+    assert h.mean == 0 and h.percentile(95) == 0
+
+    for value in (0.0005, 0.001, 0.005, 0.005, 0.05, 2):
+        h.observe(value)
+
+    # Bucket bounds are inclusive, the last bucket catches everything above
+    assert h.counts == [2, 2, 1, 1]
+    assert h.count == 6 and h.max == 2
+    assert abs(h.mean - 2.0615 / 6) < 1e-9
+    assert h.percentile(50) == 0.01
+    assert h.percentile(80) == 0.1
+    assert h.percentile(100) == 2
+    d = h.as_dict()
+    assert d['count'] == 6 and d['max_ms'] == 2000
+    assert d['buckets'] == {'le_0.001': 2, 'le_0.01': 2, 'le_0.1': 1, 'inf': 1}
+
+
+def test_histogram_percentile_is_capped_at_max():
+    h = Histogram(bounds=(0.001, 1))
+    h.observe(0.2)
+    assert h.percentile(50) == 0.2
+
+
+def test_rate_meter():
+    now = [1000.0]
+    with patch('custom_components.ankermake.metrics.time.monotonic', lambda: now[0]):
+        meter = RateMeter(window=10)
+        meter.mark()
+        meter.mark(4)
+        now[0] += 1
+        meter.mark(5)
+        assert meter.total == 10
+        assert meter.rate == 1.0
+
+        # The slot of a second is reused when the window wraps around
+        now[0] += 10
+        meter.mark(2)
+        assert meter.rate == 0.2
+        assert meter.total == 12
+
+        # Slots older than the window are not counted
+        now[0] += 20
+        assert meter.rate == 0
+
+
+def test_value():
+    metrics = AnkerMetrics()
+    metrics.count_frame(1000)
+    metrics.count_frame(1000)
+    metrics.count_frame(1001)
+    metrics.apply_time.observe(0.002)
+    metrics.ws_reconnects = 3
+    metrics.traffic['mqtt'].received(100)
+    metrics.traffic['api'].received(50)
+    metrics.traffic['ctrl'].sent(10)
+
+    assert metrics.value('frames_total') == 3
+    assert metrics.value('ws_reconnects') == 3
+    assert metrics.value('apply_time.count') == 1
+    assert metrics.value('apply_time.max_ms') == 2
+    assert metrics.value('traffic.mqtt.bytes_in') == 100
+    assert metrics.value('traffic.total.bytes_in') == 150
+    assert metrics.value('traffic.total.bytes_out') == 10
+
+    # A copy, so the entity's written attributes don't change with the counts
+    frames = metrics.value('frames')
+    assert frames == {1000: 2, 1001: 1}
+    metrics.count_frame(1001)
+    assert frames == {1000: 2, 1001: 1}
+
+
+def test_frame_types_are_capped():
+    metrics = AnkerMetrics()
+    for command_type in range(MAX_FRAME_TYPES + 5):
+        metrics.count_frame(command_type)
+    assert len(metrics.frames) == MAX_FRAME_TYPES + 1
+    assert metrics.frames['other'] == 5
@@ -0,0 +1,47 @@
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.append(str(Path(__file__).parent.parent) + '\\custom_components')
+
+from homeassistant.helpers import entity_registry as er
+
+import custom_components.ankermake as integration
+from custom_components.ankermake.sensor_manifest import ANOMALY_BINARY_SENSOR_DESCRIPTIONS, SENSOR_DESCRIPTIONS
+
+
+def _registry(disabled: dict[str, bool]) -> list:
+    """Registry entries of a config entry ({entity_id: disabled})."""
+    return [SimpleNamespace(domain=entity_id.split('.')[0], disabled=value) for entity_id, value in disabled.items()]
+
+
+def test_enabled_platforms(monkeypatch):
+    entry = SimpleNamespace(entry_id='m5')
+    monkeypatch.setattr(er, 'async_get', lambda hass: None)
+
+    def platforms(entries):
+        monkeypatch.setattr(er, 'async_entries_for_config_entry', lambda registry, entry_id: entries)
+        return [platform.value for platform in integration.enabled_platforms(None, entry)]
+
+    # First setup: every platform registers its entities
+    assert platforms([]) == [p.value for p in integration.PLATFORMS]
+    # The video quality select is disabled by default
+    defaults = _registry({'sensor.m5_3d_printer': False, 'binary_sensor.m5_ai_detection': True,
+                          'binary_sensor.m5_heating_failed': False, 'light.m5_light': False,
+                          'select.m5_video_quality': True, 'image.m5_print_preview': False,
+                          'button.m5_reload_ankerctl': False})
+    assert platforms(defaults) == ['sensor', 'binary_sensor', 'light', 'image', 'button']
+    # Enabling it forwards the platform
+    enabled = _registry({'sensor.m5_3d_printer': False, 'select.m5_video_quality': False})
+    assert 'select' in platforms(enabled)
+
+    # Platforms with entities that are enabled by default are forwarded even if all registered ones were disabled,
+    # so entities added in a new version are created
+    disabled = _registry({'sensor.m5_3d_printer': True, 'light.m5_light': True, 'select.m5_video_quality': True})
+    assert platforms(disabled) == ['sensor', 'binary_sensor', 'light', 'image', 'button']
+
+
+def test_default_enabled_platforms():
+    assert any(description.entity_registry_enabled_default for description in SENSOR_DESCRIPTIONS)
+    assert any(description.entity_registry_enabled_default for description, _ in ANOMALY_BINARY_SENSOR_DESCRIPTIONS)
+    assert integration.DEFAULT_ENABLED_PLATFORMS <= set(integration.PLATFORMS)
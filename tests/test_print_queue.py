@@ -0,0 +1,171 @@
+import asyncio
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.append(str(Path(__file__).parent.parent) + '\\custom_components')
+
+from custom_components.ankermake.ankermake_mqtt_adapter import AnkerData
+from custom_components.ankermake.const import (EVENT_PRINT_STARTED,
+                                               EVENT_PRINT_FINISHED,
+                                               EVENT_UPLOAD_PROGRESS,
+                                               EVENT_QUEUE_DISPATCHED)
+from custom_components.ankermake.print_queue import (DISPATCH_TIMEOUT, PrintQueue, QueuedJob, STATE_DISPATCHED,
+                                                     STATE_FAILED, STATE_FINISHED, STATE_PRINTING, STATE_QUEUED)
+
+
+class FakeStore:
+    def __init__(self, data=None):
+        self.data = data
+
+    async def async_load(self):
+        return self.data
+
+    def async_delay_save(self, data_func, delay):
+        self.data = data_func()
+
+
+class FakeBus:
+    def __init__(self):
+        self.listeners = {}
+        self.fired = []
+
+    def async_listen(self, event_type, listener):
+        self.listeners.setdefault(event_type, []).append(listener)
+        return lambda: self.listeners[event_type].remove(listener)
+
+    def async_fire(self, event_type, data):
+        self.fired.append((event_type, data))
+        for listener in self.listeners.get(event_type, []):
+            listener(SimpleNamespace(event_type=event_type, data=data))
+
+
+class FakeCoordinator:
+    def __init__(self, entry_id, filament='PLA'):
+        self.entry = SimpleNamespace(entry_id=entry_id)
+        self.config = {'printer_name': entry_id.upper()}
+        self.ankerdata = AnkerData()
+        self.ankerdata.update({'commandType': 1003, 'currentTemp': 2500, 'targetTemp': 0})  # Online and idle
+        self.ankerdata.filament = filament
+        self.upload_task = None
+        self.uploads = []
+
+    def async_add_listener(self, listener):
+        return lambda: None
+
+    def start_upload(self, path, start_print=False):
+        self.uploads.append(path)
+        self.upload_task = SimpleNamespace(done=lambda: False)
+
+    def upload_done(self):
+        self.upload_task = SimpleNamespace(done=lambda: True)
+
+
+def _printing(coordinator):
+    coordinator.ankerdata.update({'commandType': 1001, 'name': 'benchy_PLA', 'img': '', 'progress': 1000, 'totalTime': 60,
+                                  'time': 600, 'aiFlag': 0, 'AISwitch': 0, 'AISensitivity': 0, 'AIPausePrint': 0,
+                                  'AIJoinImproving': 0, 'filamentUsed': 0})
+
+
+def _queue(data=None):
+    hass = SimpleNamespace(bus=FakeBus())
+    queue = PrintQueue(hass)
+    queue._store = FakeStore(data)
+    asyncio.run(queue.async_load())
+    return queue, hass.bus
+
+
+def test_dispatch_by_priority_and_constraints():
+    queue, bus = _queue()
+    m5, m5c = FakeCoordinator('m5', 'PLA'), FakeCoordinator('m5c', 'PETG')
+    queue.add_printer(m5)
+    queue.add_printer(m5c)
+    _printing(m5)
+
+    low = queue.add(QueuedJob(path='/gcode/low.gcode', filament='pla'))
+    abs_job = queue.add(QueuedJob(path='/gcode/abs.gcode', filament='ABS', priority=5))
+    high = queue.add(QueuedJob(path='/gcode/high.gcode', priority=10, printer='m5'))
+    any_job = queue.add(QueuedJob(path='/gcode/any.gcode', priority=1))
+    assert [job.id for job in queue.jobs] == [high.id, abs_job.id, any_job.id, low.id]
+    # m5c (PETG) gets the highest priority job it matches
+    assert m5c.uploads == ['/gcode/any.gcode'] and any_job.state == STATE_DISPATCHED and any_job.assigned == 'm5c'
+    assert bus.fired[-1][0] == EVENT_QUEUE_DISPATCHED and bus.fired[-1][1]['job_id'] == any_job.id
+
+    # m5 finishes its own print and becomes idle
+    m5.ankerdata._reset()
+    queue.schedule()
+    assert m5.uploads == ['/gcode/high.gcode'] and high.state == STATE_DISPATCHED
+    assert low.state == abs_job.state == STATE_QUEUED
+    assert queue.value('m5', 'length') == 2
+
+    # The printers report the job's progress
+    _printing(m5)
+    bus.async_fire(EVENT_PRINT_STARTED, {'entry_id': 'm5', 'job_name': 'high'})
+    assert high.state == STATE_PRINTING
+    bus.async_fire(EVENT_PRINT_FINISHED, {'entry_id': 'm5', 'job_name': 'high'})
+    assert high.state == STATE_FINISHED and high in queue.history and high not in queue.jobs
+    m5.upload_done()
+    m5.ankerdata._reset()  # The filament of the job is remembered
+    queue.schedule()
+    # The PLA job, the ABS job waits for a printer with ABS
+    assert m5.uploads[-1] == '/gcode/low.gcode' and abs_job.state == STATE_QUEUED
+    assert queue.wait_stats()['count'] == 3
+
+
+def test_failed_uploads_are_retried():
+    queue, bus = _queue()
+    m5 = FakeCoordinator('m5')
+    queue.add_printer(m5)
+    job = queue.add(QueuedJob(path='/gcode/benchy.gcode'))
+    for attempt in range(1, 4):
+        assert job.attempts == attempt and len(m5.uploads) == attempt
+        m5.upload_done()
+        bus.async_fire(EVENT_UPLOAD_PROGRESS, {'entry_id': 'm5', 'path': job.path, 'state': 'failed', 'error': 'x'})
+    assert job.state == STATE_FAILED and job.error == 'x'
+    assert queue.jobs == [] and len(m5.uploads) == 3
+
+
+def test_dispatch_timeout_per_attempt():
+    queue, bus = _queue()
+    m5 = FakeCoordinator('m5')
+    queue.add_printer(m5)
+    job = queue.add(QueuedJob(path='/gcode/benchy.gcode'))
+    # The first attempt was dispatched long ago and its upload failed
+    job.dispatched = job.attempt_dispatched = time.time() - DISPATCH_TIMEOUT * 2
+    m5.upload_done()
+    bus.async_fire(EVENT_UPLOAD_PROGRESS, {'entry_id': 'm5', 'path': job.path, 'state': 'failed', 'error': 'x'})
+    assert job.attempts == 2 and job.state == STATE_DISPATCHED
+    # The retry just started, it isn't timed out because of the first attempt
+    m5.upload_done()
+    queue.schedule()
+    assert job.state == STATE_DISPATCHED
+    assert job.attempt_dispatched > job.dispatched
+
+    job.attempt_dispatched -= DISPATCH_TIMEOUT + 1
+    queue.schedule()
+    assert job.state == STATE_FAILED and job.error == "The print did not start"
+
+
+def test_queue_persists():
+    queue, _ = _queue()
+    job = queue.add(QueuedJob(path='/gcode/benchy.gcode', filament='TPU'))
+    queue.utilization['m5'] = {'busy': 30.0, 'total': 120.0}
+    restored, _ = _queue(queue._store.data)
+    assert restored.jobs[0].id == job.id and restored.jobs[0].filament == 'TPU'
+    assert restored.value('m5', 'utilization') == 25.0
+    assert restored.filaments == {}
+    assert restored.remove(job.id) and not restored.remove(job.id)
+
+
+def test_utilization():
+    queue, _ = _queue()
+    m5 = FakeCoordinator('m5')
+    queue.add_printer(m5)
+    now = time.monotonic()
+    queue._tick('m5', 'Idle', now)
+    queue._tick('m5', 'Printing', now + 30)
+    queue._tick('m5', 'Printing', now + 60)
+    queue._tick('m5', 'Idle', now + 3600)  # Gaps are capped
+    assert queue.utilization['m5'] == {'busy': 60.0, 'total': 120.0}
+    assert queue.value('m5', 'utilization') == 50.0
@@ -0,0 +1,151 @@
+import asyncio
+import os
+import sys
+import threading
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.append(str(Path(__file__).parent.parent) + '\\custom_components')
+
+from homeassistant.exceptions import ServiceValidationError
+
+from custom_components.ankermake.profiler import PROFILER, HotPathProfiler, write_profile
+from custom_components.ankermake.services import SERVICE_PROFILE, async_setup_services
+
+
+def hot_path(n: int) -> int:
+    return sum(i * i for i in range(n))
+
+
+def nested_path() -> int:
+    return hot_path(10)
+
+
+def _profiled(profiler: HotPathProfiler, func, *args):
+    if profiler.active:
+        profiler.start()
+    result = func(*args)
+    if profiler.active:
+        profiler.stop()
+    return result
+
+
+def _functions(profile) -> set[str]:
+    profile.create_stats()
+    return {name for _, _, name in profile.stats}
+
+
+def test_session():
+    profiler = HotPathProfiler()
+    # Not profiled without a session
+    _profiled(profiler, hot_path, 10)
+    assert not profiler.active
+
+    profiler.begin()
+    assert profiler.active
+    with pytest.raises(RuntimeError):
+        profiler.begin()
+    _profiled(profiler, hot_path, 10)
+    profile = profiler.end()
+    assert not profiler.active
+    assert 'hot_path' in _functions(profile)
+
+    # A new session can be started after the previous one ended
+    profiler.begin()
+    assert profiler.end() is not profile
+
+
+def test_nested_start_stop():
+    profiler = HotPathProfiler()
+    profiler.begin()
+    profiler.start()
+    _profiled(profiler, nested_path)
+    # Still profiled after the inner path stopped
+    hot_path(20)
+    profiler.stop()
+    # An unbalanced stop is ignored
+    profiler.stop()
+    profile = profiler.end()
+
+    profile.create_stats()
+    stats = {name: calls for (_, _, name), (_, calls, *_) in profile.stats.items()}
+    assert stats['nested_path'] == 1
+    assert stats['hot_path'] == 2
+
+
+def test_other_threads_are_not_profiled():
+    profiler = HotPathProfiler()
+    profiler.begin()
+    thread = threading.Thread(target=_profiled, args=(profiler, hot_path, 10))
+    thread.start()
+    thread.join()
+    profiler.start()
+    nested_path()
+    profile = profiler.end()  # Ends a session that is still started
+    assert profiler._depth == 0
+    functions = _functions(profile)
+    assert 'nested_path' in functions
+    assert '_profiled' not in functions
+
+
+def test_write_profile(tmp_path):
+    profiler = HotPathProfiler()
+    profiler.begin()
+    _profiled(profiler, hot_path, 1000)
+    path = str(tmp_path / 'hot.pstats')
+    top = write_profile(profiler.end(), path, top=3, sort='tottime')
+
+    assert os.path.getsize(path) > 0
+    with open(f'{path}.txt') as file:
+        assert 'function calls' in file.read()
+    assert len(top) == 3
+    assert set(top[0]) == {'function', 'calls', 'tottime_ms', 'cumtime_ms'}
+    assert top[0]['tottime_ms'] >= top[1]['tottime_ms'] >= top[2]['tottime_ms']
+
+    # Nothing recorded
+    profiler.begin()
+    with pytest.raises(ValueError):
+        write_profile(profiler.end(), str(tmp_path / 'empty.pstats'))
+
+
+def test_profile_service(tmp_path):
+    services = {}
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        hass = SimpleNamespace(
+            services=SimpleNamespace(async_register=lambda domain, name, handler, **kwargs: services.update(
+                {name: handler})),
+            config=SimpleNamespace(path=lambda name: str(tmp_path / name)),
+            async_add_executor_job=lambda func, *args: loop.run_in_executor(None, func, *args),
+        )
+        await async_setup_services(hass)
+        profile = services[SERVICE_PROFILE]
+        call = SimpleNamespace(data={'duration': 0.2, 'top': 5, 'sort': 'cumulative'})
+
+        async def traffic():
+            while True:
+                _profiled(PROFILER, nested_path)
+                await asyncio.sleep(0.01)
+
+        task = asyncio.create_task(traffic())
+        result = await profile(call)
+        # Only one session at a time
+        second = asyncio.create_task(profile(call))
+        await asyncio.sleep(0)
+        with pytest.raises(ServiceValidationError):
+            await profile(call)
+        await second
+        task.cancel()
+
+        # A session without any hot path activity
+        with pytest.raises(ServiceValidationError):
+            await profile(call)
+        return result
+
+    result = asyncio.run(run())
+    assert not PROFILER.active
+    assert os.path.exists(result['path']) and os.path.exists(result['summary_path'])
+    assert any('nested_path' in row['function'] for row in result['top'])
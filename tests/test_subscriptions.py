@@ -0,0 +1,58 @@
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent) + '\\custom_components')
+
+from custom_components.ankermake.ankermake_mqtt_adapter import AnkerData
+from custom_components.ankermake.subscriptions import AnkerDataBroadcaster
+
+
+def _temps(a, hotend, target):
+    a.update({'commandType': 1003, 'currentTemp': hotend * 100, 'targetTemp': target * 100})
+
+
+def test_snapshot_and_coalesced_deltas():
+    async def run():
+        a = AnkerData()
+        broadcaster = AnkerDataBroadcaster(a, frame_interval=0.01)
+        first, second = [], []
+        broadcaster.changed()  # Nobody is subscribed, nothing is scheduled
+        assert broadcaster._flush_handle is None
+
+        unsubscribe_first = broadcaster.subscribe(first.append, 1)
+        broadcaster.subscribe(second.append, 7)
+        snapshot = json.loads(first[0])
+        assert snapshot['id'] == 1 and snapshot['type'] == 'event'
+        assert snapshot['event']['snapshot']['hotend_temp'] == 0
+        assert 'status' in snapshot['event']['snapshot'] and 'thumbnail' not in snapshot['event']['snapshot']
+        assert json.loads(second[0])['id'] == 7
+
+        # A burst of messages within a frame is a single delta with the last values
+        for temp in (100, 150, 200):
+            _temps(a, temp, 210)
+            broadcaster.changed()
+        await asyncio.sleep(0.05)
+        assert len(first) == len(second) == 2
+        delta = json.loads(first[1])['event']['delta']
+        assert delta['hotend_temp'] == 200 and delta['target_hotend_temp'] == 210
+        assert 'bed_temp' not in delta
+        # Serialized once, only the message id differs
+        assert first[1].replace('"id":1', '"id":7') == second[1]
+
+        # Nothing changed, nothing is sent
+        broadcaster.changed()
+        await asyncio.sleep(0.05)
+        assert len(first) == 2
+
+        unsubscribe_first()
+        _temps(a, 195, 210)
+        broadcaster.changed()
+        await asyncio.sleep(0.05)
+        assert len(first) == 2 and len(second) == 3
+        assert json.loads(second[2])['event']['delta'] == {'hotend_temp': 195}
+        broadcaster.close()
+        assert len(broadcaster) == 0
+
+    asyncio.run(run())
@@ -0,0 +1,82 @@
+import asyncio
+import os
+import sys
+import zlib
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent) + '\\custom_components')
+
+from custom_components.ankermake.ankermake_mqtt_adapter import AnkerData
+from custom_components.ankermake.telemetry import (COLUMNS, TelemetryRecorder, decode_chunk, encode_chunk,
+                                                   read_telemetry)
+from fake_ankerctl import print_lifecycle
+
+
+def test_chunk_roundtrip():
+    columns = [[0, 5000, 10000, 15000], [21012, 20990, -3, 2 ** 40], [0, 0, 0, 0]]
+    chunk = encode_chunk(columns)
+    assert decode_chunk(zlib.decompress(chunk[4:]), 3) == columns
+
+
+async def _record_job(directory: str):
+    async def executor(func, *args):
+        return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+    recorder = TelemetryRecorder(directory, executor, interval=5, chunk_samples=50)
+    data = AnkerData()
+    path = recorder.start('benchy_PLA', {'printer_name': 'Fake M5'})
+    # One message every second (the layout of a real job), sampled every 5 seconds
+    for second, message in enumerate(print_lifecycle(layers=100)):
+        data.update(message)
+        recorder.sample(data, now=recorder._started + second)
+    await recorder.close()
+    return path, second
+
+
+def test_record_and_load(tmp_path):
+    path, seconds = asyncio.run(_record_job(str(tmp_path / 'printer')))
+    job = read_telemetry(path)
+    assert job['header']['job_name'] == 'benchy_PLA' and job['header']['printer_name'] == 'Fake M5'
+    times = job['columns']['time']
+    assert len(times) == seconds // 5 + 1 and times[1] - times[0] == 5
+    assert set(job['columns']) == {'time'} | {name for name, _ in COLUMNS}
+    assert max(job['columns']['current_layer']) == 100
+    assert 205 < max(job['columns']['hotend_temp']) < 212
+    # Far smaller than the samples as recorder rows
+    assert os.path.getsize(path) < len(times) * len(COLUMNS)
+
+    only = read_telemetry(path, ['bed_temp'])
+    assert set(only['columns']) == {'time', 'bed_temp'}
+
+
+def test_truncated_file(tmp_path):
+    path, _ = asyncio.run(_record_job(str(tmp_path)))
+    complete = read_telemetry(path)['columns']['time']
+    with open(path, 'r+b') as f:
+        f.truncate(os.path.getsize(path) - 10)
+    # Only the samples of the last chunk are lost
+    assert read_telemetry(path)['columns']['time'] == complete[:len(complete) // 50 * 50]
+
+
+async def _record_failing_writes(directory: str, written: list):
+    async def executor(func, path, data, create):
+        if not create:
+            raise OSError(28, "No space left on device")
+        written.append(data)
+        return await asyncio.get_running_loop().run_in_executor(None, func, path, data, create)
+
+    recorder = TelemetryRecorder(directory, executor, interval=5, chunk_samples=2)
+    data = AnkerData()
+    recorder.start('benchy_PLA')
+    for second in range(0, 30, 5):
+        recorder.sample(data, now=recorder._started + second)
+    # Doesn't raise on unload
+    await recorder.close()
+
+
+def test_failed_writes_are_logged(tmp_path, caplog):
+    written = []
+    asyncio.run(_record_failing_writes(str(tmp_path), written))
+    assert len(written) == 1
+    errors = [r for r in caplog.records if 'Failed to write telemetry' in r.getMessage()]
+    assert len(errors) == 3
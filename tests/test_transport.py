@@ -0,0 +1,139 @@
+import asyncio
+import json
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).parent.parent) + '\\custom_components')
+
+from custom_components.ankermake.profiler import PROFILER
+from custom_components.ankermake.transport import (AnkerTransportException, MqttTransport, Transport,
+                                                   WebsocketTransport, create_transport, decode_packet, encode_packet,
+                                                   load_ankerctl_credentials)
+from fake_ankerctl import FakeAnkerctl, FakeMqttBroker
+
+CREDENTIALS = {'sn': 'AK7ABC0123401234', 'mqtt_key': '00112233445566778899aabbccddeeff', 'user_id': 'abc123',
+               'email': 'user@example.com', 'region': 'us'}
+KEY = bytes.fromhex(CREDENTIALS['mqtt_key'])
+
+
+def test_packet_roundtrip():
+    message = {'commandType': 1003, 'currentTemp': 21012, 'targetTemp': 21000}
+    packet = encode_packet(message, KEY, device_guid='guid')
+    assert packet[:2] == b'MA' and (len(packet) - 64 - 1) % 16 == 0
+    assert decode_packet(packet, KEY) == [message]
+    assert decode_packet(encode_packet([message, message], KEY), KEY) == [message, message]
+
+    with pytest.raises(ValueError):
+        decode_packet(packet[:-1] + bytes([packet[-1] ^ 1]), KEY)  # Checksum
+    with pytest.raises(ValueError):
+        decode_packet(packet[:-2], KEY)  # Size
+    with pytest.raises(ValueError):
+        decode_packet(encode_packet(message, bytes(16)), KEY)  # Key
+
+
+def test_load_ankerctl_credentials(tmp_path):
+    path = tmp_path / 'default.json'
+    path.write_text(json.dumps({
+        'account': {'user_id': 'abc123', 'email': 'user@example.com', 'region': 'us', 'auth_token': 'secret'},
+        'printers': [{'sn': 'AK7ABC0123401234', 'mqtt_key': CREDENTIALS['mqtt_key'], 'name': 'M5'}],
+    }))
+    assert load_ankerctl_credentials(str(path)) == CREDENTIALS
+    with pytest.raises(ValueError):
+        load_ankerctl_credentials(str(path), serial='unknown')
+
+
+def test_transport_is_abstract():
+    with pytest.raises(TypeError):
+        Transport()
+
+
+def test_create_transport():
+    assert isinstance(create_transport({'host': 'ws://localhost:4470'}), WebsocketTransport)
+    transport = create_transport({'host': 'ws://localhost:4470', 'transport': 'mqtt', 'mqtt_credentials': CREDENTIALS})
+    assert isinstance(transport, MqttTransport)
+    assert transport.broker == 'make-mqtt.ankermake.com' and transport.topic == f"/phone/maker/{CREDENTIALS['sn']}/notice"
+
+
+async def _receive(transport, on_message):
+    try:
+        await transport.run(on_message)
+    except AnkerTransportException as e:
+        return e
+
+
+def test_mqtt_transport():
+    broker = FakeMqttBroker(lambda message: encode_packet(message, KEY), rate=0)
+    transport = MqttTransport(CREDENTIALS, client_factory=broker.client)
+    received = []
+    # The broker disconnects once the script ends
+    assert isinstance(asyncio.run(_receive(transport, received.append)), AnkerTransportException)
+
+    client = broker.clients[0]
+    assert client.username == 'eufy_abc123' and client.topics == [transport.topic]
+    assert len(received) == broker.published and transport.metrics.decode_time.count == len(received)
+    assert {m['commandType'] for m in received} >= {1001, 1003, 1004, 1052}
+    # Stopping joins the network thread, which must not block the event loop
+    assert client.stopped_in is not None and client.stopped_in != threading.get_ident()
+
+
+def test_mqtt_decoding_is_profiled():
+    broker = FakeMqttBroker(lambda message: encode_packet(message, KEY), rate=0)
+    transport = MqttTransport(CREDENTIALS, client_factory=broker.client)
+    PROFILER.begin()
+    try:
+        asyncio.run(_receive(transport, lambda message: None))
+    finally:
+        profile = PROFILER.end()
+    # Decrypted on the event loop, not in the client's network thread
+    profile.create_stats()
+    assert any(name == 'decode_packet' for _, _, name in profile.stats)
+
+
+def test_mqtt_transport_drops_invalid_packets():
+    def corrupt(message: dict) -> bytes:
+        packet = encode_packet(message, KEY)
+        return packet[:-1] + bytes([packet[-1] ^ 1])
+
+    broker = FakeMqttBroker(corrupt, rate=0)
+    transport = MqttTransport(CREDENTIALS, client_factory=broker.client)
+    received = []
+    asyncio.run(_receive(transport, received.append))
+    assert not received and transport.invalid_packets == broker.published
+
+
+def test_mqtt_transport_refused():
+    broker = FakeMqttBroker(lambda message: b'', refuse=True)
+    error = asyncio.run(_receive(MqttTransport(CREDENTIALS, client_factory=broker.client), print))
+    assert 'refused' in str(error)
+
+
+async def _websocket():
+    fake = FakeAnkerctl(rate=0, loop_script=False)
+    await fake.start()
+    received = []
+    transport = WebsocketTransport(fake.ws_url)
+    task = asyncio.create_task(transport.run(received.append))
+    PROFILER.begin()
+    try:
+        while fake.sent < 100:
+            await asyncio.sleep(0.01)
+    finally:
+        profile = PROFILER.end()
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    await fake.stop()
+    return received, transport.metrics.traffic['mqtt'], profile
+
+
+def test_websocket_transport():
+    received, traffic, profile = asyncio.run(_websocket())
+    # Decoding is profiled
+    profile.create_stats()
+    assert any(name == 'loads' for _, _, name in profile.stats)
+    assert len(received) >= 100 and all('commandType' in message for message in received)
+    # permessage-deflate was negotiated, and the traffic on the wire is counted
+    assert traffic.bytes_out > 0 and traffic.bytes_in > 0
+    assert traffic.compression_ratio > 1.5
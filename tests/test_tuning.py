@@ -0,0 +1,37 @@
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent) + '\\custom_components')
+
+from custom_components.ankermake.ankermake_mqtt_adapter import AnkerData
+from custom_components.ankermake.const import CONF_PROFILE, CONF_CAPTURED_FIELDS
+from custom_components.ankermake.tuning import PROFILES, Tuning
+
+
+def test_profiles():
+    assert Tuning.from_options({}) == Tuning()
+    assert Tuning.from_options({CONF_CAPTURED_FIELDS: ['1000.x']}) == PROFILES['balanced']
+    assert Tuning.from_options({CONF_PROFILE: 'low_power'}).poll_interval == 15
+    assert Tuning.from_options({CONF_PROFILE: 'removed'}) == PROFILES['balanced']
+    # Leftover custom values are ignored by presets
+    assert Tuning.from_options({CONF_PROFILE: 'realtime', 'poll_interval': 60}).poll_interval == 2
+    custom = Tuning.from_options({CONF_PROFILE: 'custom', 'poll_interval': 60, 'bed_deadband': 4})
+    assert custom.poll_interval == 60 and custom.bed_deadband == 4 and custom.liveness_timeout == 30
+
+
+def test_tuned_anker_data():
+    a = AnkerData()
+    a.update({'commandType': 1003, 'currentTemp': 20600, 'targetTemp': 21000})
+    assert a.status == 'Idle'
+    a._hotend_deadband = 3
+    a.update({'commandType': 1003, 'currentTemp': 20600, 'targetTemp': 21000})  # Idle reset the temperatures
+    assert a.status == 'Preheating'
+
+    a._last_heartbeat = datetime.now() - timedelta(seconds=45)
+    assert not a.online
+    a._liveness_timeout = 60
+    assert a.online
+    # Tuning survives the reset of a job
+    a._reset()
+    assert a._liveness_timeout == 60 and a._hotend_deadband == 3
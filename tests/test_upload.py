@@ -0,0 +1,82 @@
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent) + '\\custom_components')
+
+from custom_components.ankermake.ankerctl_util import AnkerUtilException, counting_session, upload_gcode
+from custom_components.ankermake.metrics import ByteCounter
+from fake_ankerctl import FakeAnkerctl
+
+SIZE = 100 * 1024
+CHUNK = 16 * 1024
+
+
+async def _fake() -> FakeAnkerctl:
+    fake = FakeAnkerctl()
+    await fake.start()
+    return fake
+
+
+def test_upload_streams_with_progress(tmp_path):
+    path = tmp_path / 'benchy.gcode'
+    path.write_bytes(b'G1 X1\n' * (SIZE // 6))
+    size = path.stat().st_size
+
+    async def run():
+        fake = await _fake()
+        counter = ByteCounter()
+        session = counting_session(counter)
+        progress = []
+        try:
+            await upload_gcode(fake.ws_url, str(path), start_print=True, on_progress=lambda *p: progress.append(p),
+                               chunk_size=CHUNK, session=session)
+        finally:
+            await session.close()
+            await fake.stop()
+        assert fake.uploads == [{'print': True, 'filename': 'benchy.gcode', 'size': size}]
+        # Streamed in chunks, reported after each one
+        assert len(progress) == -(-size // CHUNK) and progress[-1] == (size, size)
+        assert all(a[0] < b[0] for a, b in zip(progress, progress[1:]))
+        # The traffic went through the given session
+        assert counter.bytes_out > size
+
+    asyncio.run(run())
+
+
+def test_upload_cancellation(tmp_path):
+    path = tmp_path / 'big.gcode'
+    path.write_bytes(b'G1 X1\n' * (SIZE // 6))
+
+    async def run():
+        fake = await _fake()
+        progress = []
+        task = None
+
+        def on_progress(sent, total):
+            progress.append(sent)
+            task.cancel()  # Abort after the first chunk
+
+        try:
+            task = asyncio.create_task(upload_gcode(fake.ws_url, str(path), on_progress=on_progress, chunk_size=CHUNK))
+            try:
+                await task
+                cancelled = False
+            except asyncio.CancelledError:
+                cancelled = True
+        finally:
+            await fake.stop()
+        assert cancelled and progress == [CHUNK]
+        assert fake.uploads == [] or fake.uploads[0]['size'] < path.stat().st_size
+
+    asyncio.run(run())
+
+
+def test_upload_missing_file(tmp_path):
+    async def run():
+        try:
+            await upload_gcode('ws://127.0.0.1:1', str(tmp_path / 'missing.gcode'))
+        except AnkerUtilException as e:
+            return str(e)
+
+    assert 'Failed to upload gcode' in asyncio.run(run())
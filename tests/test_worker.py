@@ -0,0 +1,125 @@
+import asyncio
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent) + '\\custom_components')
+
+from custom_components.ankermake.metrics import AnkerMetrics
+from custom_components.ankermake.transport import Transport
+from custom_components.ankermake.worker import IngestWorker, ReplicaAnkerData, ShadowAnkerData, WorkerPrinter
+
+FLUSH = 0.02
+
+
+class ScriptedTransport(Transport):
+    name = 'scripted'
+
+    def __init__(self, messages: list[dict]):
+        super().__init__()
+        self.messages = messages
+
+    async def run(self, on_message):
+        for message in self.messages:
+            on_message(message)
+        await asyncio.Event().wait()  # Stays connected
+
+
+def _temp(hotend: float) -> dict:
+    return {'commandType': 1003, 'currentTemp': int(hotend * 100), 'targetTemp': 21000}
+
+
+async def _ingest(messages: list[dict]):
+    replica = ReplicaAnkerData()
+    batches = []
+    worker = IngestWorker(asyncio.get_running_loop(), flush_interval=FLUSH)
+    replica._on_reset = lambda method: worker.call('m5', 'mirror', method)
+
+    def deliver(fields, accumulators, replies):
+        batches.append((fields, accumulators, replies))
+        for name, value in {**accumulators, **fields}.items():
+            setattr(replica, name, value)
+
+    shadow = ShadowAnkerData()
+    worker.add(WorkerPrinter('m5', ScriptedTransport(messages), shadow, AnkerMetrics(), deliver, lambda: (1, 1)))
+    await asyncio.sleep(FLUSH * 5)
+    return worker, shadow, replica, batches
+
+
+def test_field_diffs_are_batched():
+    async def run():
+        messages = [_temp(t) for t in range(180, 200)]
+        messages += [{'commandType': 1085, 'errorCode': '0xFF01030001', 'errorLevel': 'P1'},
+                     {'commandType': 1043, 'reply': 'ok'}, {'commandType': 1052, 'real_print_layer': 3},
+                     {'commandType': 9999, 'unknown': 1}]
+        worker, shadow, replica, batches = await _ingest(messages)
+        try:
+            # One batch with the latest value of every assigned field
+            assert len(batches) == 1
+            fields, accumulators, replies = batches[0]
+            assert fields['hotend_temp'] == 199 and fields['target_hotend_temp'] == 210
+            assert '_last_heartbeat' in fields and replies == [{'commandType': 1043, 'reply': 'ok'}]
+            assert set(accumulators) == {'_layer_timings', '_capture'}
+            assert fields['_error_counts'] == {'0xFF01030001': 1}
+            assert accumulators['_capture'] is not shadow._capture  # A copy, the shadow is used by the worker
+            assert replica.hotend_temp == 199 and replica.error_message == 'Filament Broken'
+            assert replica.online and replica._capture.counts[9999] == 1
+
+            # Resets on the event loop are made in the shadow, without being sent back
+            replica._remove_error()
+            await asyncio.sleep(FLUSH * 3)
+            assert shadow.error_code == '' and len(batches) == 1
+        finally:
+            worker.remove('m5')
+            worker.stop()
+        assert not worker.running
+
+    asyncio.run(run())
+
+
+def test_mirror_drops_reset_fields():
+    shadow = ShadowAnkerData()
+    shadow.record()
+    shadow.job_name = 'benchy'
+    shadow.hotend_temp = 200
+    shadow.error_code = '0xFF01030001'
+    # Reset on the event loop before these were flushed, they must not undo it
+    shadow.mirror('_remove_error')
+    assert shadow.error_code == ''
+    fields = shadow.take()
+    assert 'error_code' not in fields and fields['job_name'] == 'benchy'
+
+    shadow.job_name = 'cube'
+    shadow.hotend_temp = 210
+    shadow.mirror('_reset')
+    assert shadow.take() == {}
+    # Recorded again after the reset
+    shadow.hotend_temp = 215
+    assert shadow.take() == {'hotend_temp': 215}
+
+
+def test_metrics_read_while_the_worker_writes():
+    metrics = AnkerMetrics()
+    stop = threading.Event()
+
+    def write():
+        command_type = 0
+        while not stop.is_set():
+            command_type = (command_type + 1) % 100
+            metrics.count_frame(command_type)
+            metrics.apply_time.observe(0.001)
+            metrics.traffic['mqtt'].received(100)
+
+    thread = threading.Thread(target=write)
+    thread.start()
+    try:
+        deadline = time.monotonic() + 0.2
+        while time.monotonic() < deadline:
+            metrics.as_dict()
+            metrics.value('frames')
+            metrics.value('apply_time.p95_ms')
+    finally:
+        stop.set()
+        thread.join()
+    assert metrics.frame_rate.total == sum(metrics.frames.values()) == metrics.apply_time.count